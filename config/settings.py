@@ -51,14 +51,15 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    # 静态文件要在会话、认证之前直接返回，不走后面的中间件
+    'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',  
+    'training.middleware.ContentCacheMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
-    'django.middleware.security.SecurityMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',  
 ]
 
 ROOT_URLCONF = 'config.urls'
@@ -84,12 +85,57 @@ WSGI_APPLICATION = 'config.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# 默认 SQLite；设置环境变量 DB_ENGINE=postgres 切换到 PostgreSQL (需安装 psycopg[binary,pool])。
+# 从旧的 db.sqlite3 / data.json 搬数据到新库见 python manage.py transfer_data
+DB_ENGINE = os.environ.get('DB_ENGINE', 'sqlite')
+
+if DB_ENGINE == 'postgres':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('DB_NAME', 'training'),
+            'USER': os.environ.get('DB_USER', 'training'),
+            'PASSWORD': os.environ.get('DB_PASSWORD', ''),
+            'HOST': os.environ.get('DB_HOST', '127.0.0.1'),
+            'PORT': os.environ.get('DB_PORT', '5432'),
+            # 复用连接前先检查是否还活着 (数据库重启后不会拿到断开的连接)
+            'CONN_HEALTH_CHECKS': True,
+        }
+    }
+    if os.environ.get('DB_POOL', '1') == '1':
+        # 进程内连接池 (psycopg_pool)：每个 worker 进程最多 DB_POOL_MAX 个连接，请求之间复用
+        DATABASES['default']['OPTIONS'] = {'pool': {
+            'min_size': 1,
+            'max_size': int(os.environ.get('DB_POOL_MAX', '10')),
+            'timeout': 10,
+        }}
+    else:
+        # 前面已有 PgBouncer 之类的连接池时关掉进程内连接池，改为持久连接
+        DATABASES['default']['CONN_MAX_AGE'] = int(os.environ.get('DB_CONN_MAX_AGE', '60'))
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('DB_NAME', BASE_DIR / 'db.sqlite3'),
+            'OPTIONS': {
+                # 事务一开始就拿写锁，避免两个请求都先读后写时互相死锁报 "database is locked"
+                'transaction_mode': 'IMMEDIATE',
+                # 等锁最多 20 秒 (busy_timeout)，而不是立即报错
+                'timeout': 20,
+                # 每次建立连接时执行：WAL 模式下读不阻塞写、写不阻塞读；
+                # WAL 下 synchronous=NORMAL 不会损坏数据库 (断电最多丢最后几个事务)，少一半 fsync；
+                # 用 256MB 内存映射读文件，临时表放内存
+                'init_command': (
+                    'PRAGMA journal_mode=WAL;'
+                    'PRAGMA synchronous=NORMAL;'
+                    'PRAGMA mmap_size=268435456;'
+                    'PRAGMA temp_store=MEMORY'
+                ),
+            },
+            # 测试库使用文件而不是内存共享缓存，多线程并发测试时才会按 busy timeout 等锁
+            'TEST': {'NAME': BASE_DIR / 'test_db.sqlite3'},
+        }
     }
-}
 
 
 # Password validation
@@ -131,6 +177,14 @@ STATIC_URL = '/static/'
 
 STATIC_ROOT = os.path.join(BASE_DIR, 'static')
 
+# collectstatic 时给文件名加内容哈希 (recorder.3f2a….js)，并预先生成 .gz / .br 压缩版本；
+# WhiteNoise 对带哈希的文件返回一年有效的 immutable 缓存头，文件内容变了文件名随之改变。
+# 部署时需要运行 python manage.py collectstatic
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'whitenoise.storage.CompressedManifestStaticFilesStorage'},
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -163,6 +217,30 @@ CKEDITOR_CONFIGS = {
     },
 }
 
+# 后台任务队列：生产环境用 `python manage.py run_jobs` 起 worker；
+# 设为 True 时任务在请求里同步执行 (没有 worker 的开发环境)
+JOB_QUEUE_EAGER = False
+
+# 缓存：页面数据的失效代号、练习目录版本号、公告已读计数都放在这里，
+# 必须是多个 worker 进程共享、incr 是原子操作的后端，所以默认用 Redis (需安装 redis)。
+# LocMemCache 每个进程各一份，只适合单进程的开发服务器 (CACHE_BACKEND=locmem)；
+# 文件缓存的 incr 是先读后写，而且每次写入都要列一遍缓存目录，不再使用。
+CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'redis')
+
+if CACHE_BACKEND == 'locmem':
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ.get('REDIS_URL', 'redis://127.0.0.1:6379/1'),
+        }
+    }
+
 # 设置登录和跳转地址
 LOGIN_URL = 'login'                  # 未登录时跳转到哪里
 LOGIN_REDIRECT_URL = 'student_dashboard' # 登录成功后跳转到哪里
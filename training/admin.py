@@ -1,7 +1,8 @@
 from django.contrib import admin
 from .models import (
     Exercise, PracticeRecord, DailyCheckIn, Announcement, ReadRecord,
-    StudentProfile, Achievement, StudentAchievement, BuddyPair, Encouragement
+    StudentProfile, Achievement, StudentAchievement, BuddyPair, Encouragement,
+    DailyPracticeStat, Job
 )
 
 # 1. 练习管理
@@ -22,11 +23,19 @@ class PracticeRecordInline(admin.TabularInline):
 # 3. 每日打卡管理 (老师批改主界面)
 @admin.register(DailyCheckIn)
 class DailyCheckInAdmin(admin.ModelAdmin):
-    list_display = ('date', 'student', 'is_submitted', 'created_at')
+    list_display = ('date', 'student', 'is_submitted', 'like_count', 'created_at')
     list_filter = ('is_submitted', 'date', 'student')
     inlines = [PracticeRecordInline] # 把录音嵌进去
     ordering = ('-date',)
 
+    def save_formset(self, request, form, formset, change):
+        if formset.model is not PracticeRecord:
+            return super().save_formset(request, form, formset, change)
+        # 内联里只改点评：按改动的字段保存，完整 save() 会把提交时间和练习日期改成今天
+        formset.save(commit=False)
+        for record, changed_fields in formset.changed_objects:
+            record.save(update_fields=changed_fields)
+
 # 4. 公告管理
 @admin.register(Announcement)
 class AnnouncementAdmin(admin.ModelAdmin):
@@ -78,3 +87,26 @@ class EncouragementAdmin(admin.ModelAdmin):
     list_display = ('sender', 'pair', 'message', 'created_at', 'is_read')
     list_filter = ('is_read', 'pair')
 
+
+
+# ==========================================
+# 7. 统计汇总
+# ==========================================
+
+@admin.register(DailyPracticeStat)
+class DailyPracticeStatAdmin(admin.ModelAdmin):
+    list_display = ('date', 'student', 'recordings', 'exercise_count', 'advanced_count', 'is_submitted')
+    list_filter = ('is_submitted', 'date')
+    search_fields = ('student__username',)
+    ordering = ('-date',)
+
+
+# ==========================================
+# 8. 后台任务
+# ==========================================
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'kind', 'owner', 'status', 'attempts', 'run_after', 'updated_at')
+    list_filter = ('status', 'kind')
+    readonly_fields = ('payload', 'result', 'last_error')
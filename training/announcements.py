@@ -0,0 +1,219 @@
+import atexit
+import logging
+import threading
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import DatabaseError, connection, transaction
+from django.db.models import Count, Exists, OuterRef
+
+from .models import Announcement, ReadRecord
+
+logger = logging.getLogger(__name__)
+
+# ==========================================
+# 公告阅读记录 (缓冲后批量写入)
+# ==========================================
+#
+# 学员每次打开公告都查 / 写一次阅读记录，高峰时全班都在抢 SQLite 的写锁。
+# 现在先看缓存里"这个学员读过哪些公告"，已读过的直接跳过，不碰数据库；
+# 新的阅读事件 (所在事务提交后) 放进进程内缓冲，攒够 FLUSH_SIZE 条立即写入，
+# 否则由定时器在 FLUSH_INTERVAL 秒内写入，都是一条 bulk_create(ignore_conflicts=True)。
+# 缓冲在哪个进程里就只能由哪个进程写入，所以定时器跑在本进程的后台线程里，
+# 进程被强杀时最多丢 FLUSH_INTERVAL 秒的阅读事件；正常退出时写入剩余的缓冲。
+# 首页的未读角标 = 全部公告 ID - 学员已读 ID，两个集合都在缓存里，不扫阅读记录表。
+
+FLUSH_SIZE = 50
+FLUSH_INTERVAL = 5
+READ_SET_TIMEOUT = 24 * 60 * 60
+
+_ANNOUNCEMENT_IDS_KEY = 'ann:ids'
+
+# 待写入的 (公告 ID, 学员 ID)
+_pending = set()
+_lock = threading.Lock()
+# 等待写入缓冲的定时器 (有缓冲时才有)
+_timer = None
+
+
+def _read_set_key(student_id):
+    return f'ann:read:{student_id}'
+
+
+def read_announcement_ids(student_id):
+    """学员已读的公告 ID 集合 (缓存；未命中时按学员查一次阅读记录，加上本进程还没写入的)"""
+    key = _read_set_key(student_id)
+    ids = cache.get(key)
+    if ids is None:
+        ids = set(ReadRecord.objects.filter(student_id=student_id).values_list('announcement_id', flat=True))
+        with _lock:
+            ids |= {ann_id for ann_id, sid in _pending if sid == student_id}
+        cache.set(key, ids, READ_SET_TIMEOUT)
+    return ids
+
+
+def published_announcement_ids():
+    """全部公告 ID (缓存，公告新增 / 删除时由 signals 清掉)"""
+    ids = cache.get(_ANNOUNCEMENT_IDS_KEY)
+    if ids is None:
+        ids = set(Announcement.objects.values_list('id', flat=True))
+        cache.set(_ANNOUNCEMENT_IDS_KEY, ids, None)
+    return ids
+
+
+def forget_announcement_ids():
+    # 同 caching._invalidate：事务提交后清掉
+    transaction.on_commit(lambda: cache.delete(_ANNOUNCEMENT_IDS_KEY))
+
+
+def unread_announcement_count(student):
+    return len(published_announcement_ids() - read_announcement_ids(student.id))
+
+
+def record_read(announcement_id, student):
+    """学员打开公告。第一次阅读时记入缓冲、已读人数加一，返回是否是第一次阅读"""
+    ids = read_announcement_ids(student.id)
+    if announcement_id in ids:
+        return False
+    cache.set(_read_set_key(student.id), ids | {announcement_id}, READ_SET_TIMEOUT)
+    try:
+        cache.incr(_read_count_key(announcement_id))
+    except ValueError:
+        # 缓存里还没有这条公告的计数，下次读取时按数据库统计
+        pass
+
+    # 事务回滚 (如同一请求里出错) 时不记这次阅读
+    transaction.on_commit(lambda: _buffer_read(announcement_id, student.id))
+    return True
+
+
+def _schedule_flush():
+    """FLUSH_INTERVAL 秒后写入缓冲 (已有定时器时不重复建；调用方持有 _lock)"""
+    global _timer
+    if _timer is None:
+        _timer = threading.Timer(FLUSH_INTERVAL, _flush_in_thread)
+        _timer.daemon = True
+        _timer.start()
+
+
+def _buffer_read(announcement_id, student_id):
+    with _lock:
+        _pending.add((announcement_id, student_id))
+        full = len(_pending) >= FLUSH_SIZE
+        if not full:
+            _schedule_flush()
+    if full:
+        flush_reads()
+
+
+def _flush_in_thread():
+    try:
+        flush_reads()
+    except Exception:
+        logger.exception("定时写入阅读记录失败")
+    finally:
+        # 定时器线程自己的数据库连接，用完关掉
+        connection.close()
+
+
+def flush_reads():
+    """把本进程缓冲的阅读事件写入数据库，返回写入的条数"""
+    global _timer
+    with _lock:
+        batch = list(_pending)
+        _pending.clear()
+        if _timer is not None:
+            _timer.cancel()
+            _timer = None
+    if not batch:
+        return 0
+
+    try:
+        with transaction.atomic():
+            # 缓冲期间公告或学员可能已被删除，跳过这些事件
+            announcement_ids = set(Announcement.objects.filter(
+                id__in={ann_id for ann_id, _ in batch}
+            ).order_by().values_list('id', flat=True))
+            student_ids = set(User.objects.filter(
+                id__in={sid for _, sid in batch}
+            ).values_list('id', flat=True))
+            rows = [
+                ReadRecord(announcement_id=ann_id, student_id=sid)
+                for ann_id, sid in batch if ann_id in announcement_ids and sid in student_ids
+            ]
+            ReadRecord.objects.bulk_create(rows, ignore_conflicts=True)
+    except DatabaseError:
+        # 数据库忙时放回缓冲，等下一次定时写入
+        logger.warning("阅读记录写入失败，%s 条留待下次写入", len(batch), exc_info=True)
+        with _lock:
+            _pending.update(batch)
+            _schedule_flush()
+        return 0
+    return len(rows)
+
+
+def _flush_at_exit():
+    try:
+        flush_reads()
+    except Exception:
+        logger.exception("退出时写入阅读记录失败")
+
+
+atexit.register(_flush_at_exit)
+
+
+# ==========================================
+# 公告阅读统计
+# ==========================================
+#
+# 已读 / 未读名单：学员查询上加一个 Exists(阅读记录) 标记，一条查询分出两组。
+# 老师首页列出的每条公告的已读人数存在缓存里 (按公告一个键)：
+# 学员第一次打开公告时计数加一，缓存里没有的公告用一条 GROUP BY 补齐。
+# 补齐前先写入本进程缓冲的阅读记录，否则刚读过、还在缓冲里的学员不会被算进去；
+# 多个 worker 时看不到其他进程的缓冲：计数不在缓存里时，别的进程最近 FLUSH_INTERVAL 秒内
+# 的新阅读会少算，这些学员再打开时已在已读集合里、不会再加一，要等 READ_COUNT_TIMEOUT 过期重算
+# (或老师打开统计页，read_status 用精确人数校正)。
+# 记录被级联删除 (删学员) 时计数不会减，同样靠过期后重算纠正。
+
+READ_COUNT_TIMEOUT = 60 * 60
+
+
+def _read_count_key(announcement_id):
+    return f'ann:reads:{announcement_id}'
+
+
+def _student_reads(announcement_ids):
+    return ReadRecord.objects.filter(announcement_id__in=announcement_ids, student__is_staff=False)
+
+
+def get_read_counts(announcement_ids):
+    """{公告 ID: 已读学员数}，缓存未命中的公告先写入本进程缓冲，再一条 GROUP BY 查询补齐"""
+    keys = {_read_count_key(ann_id): ann_id for ann_id in announcement_ids}
+    counts = {keys[key]: count for key, count in cache.get_many(keys).items()}
+    missing = [ann_id for ann_id in announcement_ids if ann_id not in counts]
+    if missing:
+        flush_reads()
+        rows = dict(_student_reads(missing).values('announcement_id').annotate(
+            n=Count('id')
+        ).values_list('announcement_id', 'n').order_by())
+        fresh = {ann_id: rows.get(ann_id, 0) for ann_id in missing}
+        cache.set_many({_read_count_key(ann_id): n for ann_id, n in fresh.items()}, READ_COUNT_TIMEOUT)
+        counts.update(fresh)
+    return counts
+
+
+def read_status(announcement):
+    """
+    全部学员按是否读过分成 (已读名单, 未读名单)，一条查询。
+    先写入本进程缓冲的阅读记录；其他进程缓冲中的记录最多 FLUSH_INTERVAL 秒后写入。
+    """
+    flush_reads()
+    students = User.objects.filter(is_staff=False).annotate(
+        has_read=Exists(ReadRecord.objects.filter(announcement=announcement, student=OuterRef('pk')))
+    ).order_by('username')
+    read_list, unread_list = [], []
+    for student in students:
+        (read_list if student.has_read else unread_list).append(student)
+    # 顺便用精确人数校正缓存的计数
+    cache.set(_read_count_key(announcement.id), len(read_list), READ_COUNT_TIMEOUT)
+    return read_list, unread_list
@@ -1,210 +1,263 @@
+import datetime
+import functools
+import json
+import logging
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth import aauthenticate, alogin
+from django.contrib.auth.models import User
 from django.http import JsonResponse
 from django.utils import timezone
-from .models import Exercise, DailyCheckIn, PracticeRecord
-from django.contrib.auth.models import User
 from django.views.decorators.csrf import csrf_exempt
-from django.contrib.auth import authenticate, login
-import json
+
+from .caching import CATALOG, USER
+from .catalog import aget_exercise_catalog
+from .history import history_page, serialize_page, InvalidCursor, PAGE_SIZE, MAX_PAGE_SIZE
+from .middleware import content_cache
+from .models import Exercise, DailyCheckIn, PracticeRecord
+from .stats import latest_records, mark_daily_submitted, submitted_since
+from .views import save_practice_upload
 
 # ==========================================
-#  小程序后端接口 (API Views)
+#  JSON 接口 v1 (网页 JS 和小程序共用，异步视图，部署在 ASGI 下)
 # ==========================================
+#
+# 路由见 urls.py 的 api/v1/；旧的 api/xxx 地址指向同样的视图，返回格式保持兼容。
+# 数据库读写用 Django 的异步 ORM (aget / afirst / async for)；
+# 保存上传文件、同步的统计函数用 sync_to_async 放到线程里执行，不阻塞事件循环。
 
-@csrf_exempt
-def mp_login(request):
-    """
-    小程序登录接口
-    """
-    if request.method == 'POST':
+
+logger = logging.getLogger(__name__)
+
+
+def _error(msg, **extra):
+    return JsonResponse({'status': 'error', 'msg': msg, **extra})
+
+
+def _json_errors(view):
+    """写操作接口出现意外异常时仍返回 {'status': 'error', 'msg': ...}，小程序按这个格式提示，而不是拿到 HTML 500"""
+    @functools.wraps(view)
+    async def wrapper(request, *args, **kwargs):
         try:
-            # 兼容处理：小程序传来的可能是 JSON body
-            data = json.loads(request.body)
-            username = data.get('username')
-            password = data.get('password')
-        except:
-            # 或者是表单数据
-            username = request.POST.get('username')
-            password = request.POST.get('password')
+            return await view(request, *args, **kwargs)
+        except Exception as e:
+            logger.exception("接口 %s 出错", request.path)
+            return _error(str(e))
+    return wrapper
+
+
+def _absolute(request, field_file):
+    return request.build_absolute_uri(field_file.url) if field_file else ''
 
-        user = authenticate(username=username, password=password)
 
-        if user is not None:
-            login(request, user)  # 关键：这会创建 Session 并返回 Cookie
-            return JsonResponse({
-                'status': 'success',
-                'user': {'id': user.id, 'username': user.username}
-            })
-        else:
-            return JsonResponse({'status': 'error', 'msg': '账号密码错误'})
+def _week_start(today):
+    return today - datetime.timedelta(days=today.weekday())
 
-    return JsonResponse({'status': 'error', 'msg': '仅支持POST'})
+
+async def ping(request):
+    return JsonResponse({'status': 'success'})
 
 
 @csrf_exempt
-def dashboard_data(request):
+async def login_view(request):
+    """登录 (JSON 或表单)，成功后通过 Session Cookie 保持登录"""
+    if request.method != 'POST':
+        return _error('仅支持POST')
+    try:
+        data = json.loads(request.body)
+    except ValueError:
+        data = await sync_to_async(lambda: request.POST)()
+
+    user = await aauthenticate(request, username=data.get('username'), password=data.get('password'))
+    if user is None:
+        return _error('账号密码错误')
+    await alogin(request, user)
+    return JsonResponse({
+        'status': 'success',
+        'msg': 'OK',
+        'is_staff': user.is_staff,
+        'user': {'id': user.id, 'username': user.username},
+    })
+
+
+async def dashboard(request):
     """
-    小程序首页数据接口
+    首页数据：今日练习列表和完成情况 (与网页首页一致，打卡只计普通练习，进阶练习单独统计)。
+    练习列表来自进程内目录，每次请求只查打卡单和当天录音的练习 ID 两条 SQL，与练习数量无关。
     """
-    # 1. 权限检查 (不再使用 ID=2 测试)
-    if not request.user.is_authenticated:
-        return JsonResponse({'status': 'error', 'msg': '请先登录'})
-
-    student = request.user
-
-    # 2. 获取或创建今天的打卡单
-    today = timezone.now().date()
-    checkin, created = DailyCheckIn.objects.get_or_create(
-        student=student,
-        date=today
-    )
-
-    # 3. 获取所有练习，按 order 排序
-    exercises = Exercise.objects.all().order_by('order')
-
-    # 4. 获取已完成的练习记录 ID
-    completed_records = PracticeRecord.objects.filter(daily_checkin=checkin)
-    completed_ids = set(record.exercise.id for record in completed_records)
-
-    # 5. 构建练习列表数据
-    exercises_data = []
-    for ex in exercises:
-        is_done = ex.id in completed_ids
-        exercises_data.append({
-            'id': ex.id,
-            'title': ex.title,
-            'isDone': is_done
-        })
+    student = await request.auser()
+    if not student.is_authenticated:
+        return _error('请先登录')
+
+    today = timezone.localdate()
+    catalog = await aget_exercise_catalog()
+    checkin, _ = await DailyCheckIn.objects.aget_or_create(student=student, date=today)
+
+    completed_ids = {
+        exercise_id async for exercise_id in PracticeRecord.objects.filter(
+            daily_checkin=checkin
+        ).values_list('exercise_id', flat=True)
+    }
 
-    # 6. 计算进度
-    total_count = exercises.count()
-    completed_count = len(completed_ids)
-    all_done = (completed_count >= total_count) and (total_count > 0)
+    def items(exercises):
+        return [
+            {'id': ex.id, 'title': ex.title, 'isAdvanced': ex.is_advanced, 'isDone': ex.id in completed_ids}
+            for ex in exercises
+        ]
 
-    # 7. 返回 JSON 数据包
-    data = {
+    normal, advanced = items(catalog.normal), items(catalog.advanced)
+    total_count = len(normal)
+    completed_count = sum(ex['isDone'] for ex in normal)
+    return JsonResponse({
         'status': 'success',
         'studentName': student.username,
         'todayDate': today.strftime("%Y.%m.%d"),
         'totalCount': total_count,
         'completedCount': completed_count,
-        'allDone': all_done,
+        'advancedTotalCount': len(advanced),
+        'advancedCompletedCount': sum(ex['isDone'] for ex in advanced),
+        'allDone': completed_count >= total_count and total_count > 0,
         'isSubmitted': checkin.is_submitted,
-        'exercises': exercises_data
-    }
-
-    return JsonResponse(data)
+        'exercises': items(catalog.exercises),
+        'normalExercises': normal,
+        'advancedExercises': advanced,
+    })
+
+
+@content_cache(CATALOG)
+async def exercise_list(request):
+    """练习列表 (响应由 ContentCacheMiddleware 缓存，带 ETag)"""
+    catalog = await aget_exercise_catalog()
+    data = [
+        {
+            'id': ex.id,
+            'title': ex.title,
+            'demo_audio': _absolute(request, ex.demo_audio),
+            'updated_at': ex.updated_at.isoformat(),
+        }
+        for ex in catalog.exercises
+    ]
+    return JsonResponse({'status': 'success', 'data': data})
 
 
-@csrf_exempt
-def exercise_detail(request, exercise_id):
+@content_cache(CATALOG, USER)
+async def exercise_detail(request, exercise_id):
     """
-    小程序：获取单个练习的详情
+    练习详情；登录后附带本周最佳录音和老师点评。
+    练习或学员数据变化前，重复请求由 ContentCacheMiddleware 直接返回 (带 ETag，可 304)。
     """
-    # 1. 权限检查
-    if not request.user.is_authenticated:
-        return JsonResponse({'status': 'error', 'msg': '请先登录'})
+    exercise = await Exercise.objects.filter(id=exercise_id).afirst()
+    if exercise is None:
+        return _error('练习不存在')
 
-    student = request.user
-
-    try:
-        # 2. 获取练习对象
-        exercise = Exercise.objects.get(id=exercise_id)
-
-        # 3. 获取今天的打卡单
-        today = timezone.now().date()
-        checkin, _ = DailyCheckIn.objects.get_or_create(student=student, date=today)
-
-        # 4. 获取该练习的记录
-        record = PracticeRecord.objects.filter(daily_checkin=checkin, exercise=exercise).first()
-
-        # 5. 准备返回的数据
-        data = {
-            'status': 'success',
-            'id': exercise.id,
-            'title': exercise.title,
-            'content': exercise.content,
-            'demo_audio': exercise.demo_audio.url if exercise.demo_audio else '',
-            'student_audio': record.student_audio.url if (record and record.student_audio) else '',
-            'is_finished': True if (record and record.student_audio) else False,
-            'teacher_text': record.teacher_comment_text if record else '',
-            'teacher_audio': record.teacher_comment_audio.url if (record and record.teacher_comment_audio) else ''
-        }
-        return JsonResponse(data)
+    data = {
+        'id': exercise.id,
+        'title': exercise.title,
+        'content': exercise.content,
+        'demo_audio': _absolute(request, exercise.demo_audio),
+        'updated_at': exercise.updated_at.isoformat(),
+    }
 
-    except Exercise.DoesNotExist:
-        return JsonResponse({'status': 'error', 'msg': '练习不存在'})
-    except Exception as e:
-        return JsonResponse({'status': 'error', 'msg': str(e)})
+    student = await request.auser()
+    if student.is_authenticated:
+        record = await latest_records(
+            _week_start(timezone.localdate()), student=student, exercise=exercise
+        ).afirst()
+        has_audio = bool(record and record.student_audio)
+        data.update({
+            'student_audio': request.build_absolute_uri(record.playback_url) if has_audio else '',
+            'is_finished': has_audio,
+            'teacher_text': (record.teacher_comment_text or '') if record else '',
+            'teacher_audio': _absolute(request, record.teacher_comment_audio) if record else '',
+        })
+    return JsonResponse({'status': 'success', 'data': data})
 
 
 @csrf_exempt
-def upload_recording(request, exercise_id):
+@_json_errors
+async def upload_recording(request, exercise_id=None):
     """
-    小程序：接收录音文件上传
+    上传录音 (本周最佳)。练习 ID 可以在地址里，也可以是表单字段 exercise_id；
+    文件字段 audio_file (网页) 或 audio (小程序)。
     """
     if request.method != 'POST':
-        return JsonResponse({'status': 'error', 'msg': '仅支持POST请求'})
+        return _error('仅支持POST请求')
+    student = await request.auser()
+    if not student.is_authenticated:
+        return _error('请先登录')
 
-    # 1. 权限检查
-    if not request.user.is_authenticated:
-        return JsonResponse({'status': 'error', 'msg': '请先登录'})
+    # 解析 multipart 会读写临时文件，放到线程里
+    post, files = await sync_to_async(lambda: (request.POST, request.FILES))()
+    audio_file = files.get('audio_file') or files.get('audio')
+    exercise_id = exercise_id or post.get('exercise_id')
+    if not audio_file or not exercise_id:
+        return _error('参数缺失')
 
-    student = request.user
+    exercise = (await aget_exercise_catalog()).get(exercise_id)
+    if exercise is None:
+        return _error('练习不存在')
 
-    try:
-        # 2. 获取文件
-        audio_file = request.FILES.get('audio')
-        if not audio_file:
-            return JsonResponse({'status': 'error', 'msg': '未上传文件'})
-
-        # 3. 获取相关对象
-        exercise = Exercise.objects.get(id=exercise_id)
-        today = timezone.now().date()
-        checkin, _ = DailyCheckIn.objects.get_or_create(student=student, date=today)
-
-        # 4. 保存或更新练习记录
-        record, created = PracticeRecord.objects.get_or_create(
-            daily_checkin=checkin,
-            exercise=exercise,
-            defaults={'student': student}
-        )
-
-        # 更新录音文件
-        record.student_audio = audio_file
-        record.submitted_at = timezone.now()
-        record.save()
-
-        return JsonResponse({'status': 'success', 'url': record.student_audio.url})
-
-    except Exception as e:
-        return JsonResponse({'status': 'error', 'msg': str(e)})
+    # 保存文件 + 写库 + 排队结算都是同步代码
+    result = await sync_to_async(save_practice_upload)(student, exercise, audio_file)
+    return JsonResponse(result)
 
 
 @csrf_exempt
-def submit_daily(request):
+@_json_errors
+async def submit_daily(request):
+    """提交本周作业给老师 (本周至少有一条录音)"""
+    if request.method != 'POST':
+        return _error('仅支持POST请求')
+    student = await request.auser()
+    if not student.is_authenticated:
+        return _error('请先登录')
+
+    today = timezone.localdate()
+    has_records = await PracticeRecord.objects.filter(
+        student=student, **submitted_since(_week_start(today))
+    ).aexists()
+    if not has_records:
+        return _error('本周还没有上传任何练习哦')
+
+    checkin, _ = await DailyCheckIn.objects.aget_or_create(student=student, date=today)
+    checkin.is_submitted = True
+    await checkin.asave()
+    await sync_to_async(mark_daily_submitted)(student, today)
+    return JsonResponse({'status': 'success', 'msg': '本周作业已同步给老师！'})
+
+
+async def checkin_list(request):
+    """我的打卡记录"""
+    student = await request.auser()
+    if not student.is_authenticated:
+        return _error('请先登录')
+    data = [
+        {'date': ci['date'], 'is_submitted': ci['is_submitted']}
+        async for ci in DailyCheckIn.objects.filter(student=student).order_by('-date').values('date', 'is_submitted')
+    ]
+    return JsonResponse({'status': 'success', 'data': data})
+
+
+async def history(request, student_id=None):
     """
-    小程序：提交今日打卡（通知老师）
+    历史录音 (游标分页)：?cursor= 传上一页返回的 next_cursor，?limit= 每页条数。
+    不带 student_id 是自己的录音；老师可以查看指定学员的录音。
     """
-    if request.method != 'POST':
-        return JsonResponse({'status': 'error', 'msg': '仅支持POST请求'})
-
-    # 1. 权限检查
-    if not request.user.is_authenticated:
-        return JsonResponse({'status': 'error', 'msg': '请先登录'})
-
-    student = request.user
+    user = await request.auser()
+    if not user.is_authenticated:
+        return _error('请先登录')
+    if student_id is None:
+        student = user
+    else:
+        if not user.is_staff:
+            return _error('无权查看')
+        student = await User.objects.filter(id=student_id, is_staff=False).afirst()
+        if student is None:
+            return _error('学员不存在')
 
     try:
-        today = timezone.now().date()
-        checkin = DailyCheckIn.objects.filter(student=student, date=today).first()
-
-        if not checkin:
-            return JsonResponse({'status': 'error', 'msg': '今日尚未开始练习'})
-
-        checkin.is_submitted = True
-        checkin.save()
-
-        return JsonResponse({'status': 'success', 'msg': '提交成功'})
-
-    except Exception as e:
-        return JsonResponse({'status': 'error', 'msg': str(e)})
\ No newline at end of file
+        limit = min(max(int(request.GET.get('limit', PAGE_SIZE)), 1), MAX_PAGE_SIZE)
+        page = await sync_to_async(history_page)(student, request.GET.get('cursor') or None, limit)
+    except (ValueError, InvalidCursor):
+        return _error('参数错误')
+    return JsonResponse({'status': 'success', **serialize_page(page)})
@@ -4,3 +4,11 @@ from django.apps import AppConfig
 class TrainingConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'training'
+
+    def ready(self):
+        # 注册后台任务处理函数
+        from . import tasks  # noqa: F401
+        # 页面缓存失效
+        from . import signals  # noqa: F401
+        # 部署检查
+        from . import checks  # noqa: F401
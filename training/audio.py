@@ -0,0 +1,148 @@
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+import wave
+
+from django.conf import settings
+from django.core.files import File
+
+from .models import PracticeRecord
+
+# ==========================================
+# 录音处理：探测参数 + 转码成统一的播放版本
+# ==========================================
+
+# 播放版本：单声道 AAC 64kbps (.m4a)，所有浏览器和小程序都能播放；
+# 统一响度，moov 放到文件头便于边下边播
+RENDITION_EXT = '.m4a'
+RENDITION_ARGS = [
+    '-vn', '-ac', '1', '-ar', '44100',
+    '-af', 'loudnorm=I=-16:TP=-1.5:LRA=11',
+    '-c:a', 'aac', '-b:a', '64k',
+    '-movflags', '+faststart',
+]
+TIMEOUT = 120
+
+
+class AudioProcessingError(Exception):
+    pass
+
+
+def ffmpeg_binary():
+    return getattr(settings, 'AUDIO_FFMPEG_BINARY', 'ffmpeg')
+
+
+def ffprobe_binary():
+    return getattr(settings, 'AUDIO_FFPROBE_BINARY', 'ffprobe')
+
+
+def has_ffmpeg():
+    return shutil.which(ffmpeg_binary()) is not None
+
+
+def _probe_wav(path):
+    """没有 ffprobe 时，WAV 文件用标准库读取参数"""
+    try:
+        with wave.open(path, 'rb') as wav:
+            frames, rate = wav.getnframes(), wav.getframerate()
+            channels, width = wav.getnchannels(), wav.getsampwidth()
+    except (wave.Error, EOFError):
+        return None
+    return {
+        'duration': frames / rate if rate else 0.0,
+        'codec': f'pcm_s{width * 8}le',
+        'bitrate': rate * channels * width * 8,
+        'sample_rate': rate,
+        'channels': channels,
+    }
+
+
+def probe_audio(path):
+    """
+    读取音频时长、编码、码率等参数。
+    优先用 ffprobe；没有安装时只能识别 WAV，其余格式返回 None。
+    """
+    if shutil.which(ffprobe_binary()) is None:
+        return _probe_wav(path)
+
+    try:
+        output = subprocess.run(
+            [ffprobe_binary(), '-v', 'error', '-print_format', 'json',
+             '-show_format', '-show_streams', '-select_streams', 'a:0', path],
+            capture_output=True, check=True, timeout=TIMEOUT,
+        ).stdout
+        info = json.loads(output)
+    except (subprocess.SubprocessError, ValueError) as e:
+        raise AudioProcessingError(f"无法读取音频参数: {e}")
+
+    streams = info.get('streams') or []
+    if not streams:
+        raise AudioProcessingError("文件中没有音频流")
+    stream, fmt = streams[0], info.get('format', {})
+    duration = stream.get('duration') or fmt.get('duration')
+    bitrate = stream.get('bit_rate') or fmt.get('bit_rate')
+    return {
+        'duration': float(duration) if duration not in (None, 'N/A') else None,
+        'codec': stream.get('codec_name', ''),
+        'bitrate': int(bitrate) if bitrate not in (None, 'N/A') else None,
+        'sample_rate': int(stream['sample_rate']) if stream.get('sample_rate') else None,
+        'channels': stream.get('channels'),
+    }
+
+
+def transcode(src_path, dest_path):
+    """转码为播放版本，失败抛 AudioProcessingError"""
+    try:
+        subprocess.run(
+            [ffmpeg_binary(), '-y', '-v', 'error', '-i', src_path, *RENDITION_ARGS, dest_path],
+            capture_output=True, check=True, timeout=TIMEOUT,
+        )
+    except subprocess.CalledProcessError as e:
+        raise AudioProcessingError(f"转码失败: {e.stderr.decode(errors='ignore')[-500:]}")
+    except subprocess.SubprocessError as e:
+        raise AudioProcessingError(f"转码失败: {e}")
+
+
+def process_record_audio(record):
+    """
+    处理一条录音：记录参数并生成播放版本。
+    用 update() 写回，避免 auto_now 的 submitted_at 被改掉。
+    """
+    src_path = record.student_audio.path
+    info = probe_audio(src_path) or {}
+    fields = {
+        'audio_duration': info.get('duration'),
+        'audio_codec': info.get('codec', ''),
+        'audio_bitrate': info.get('bitrate'),
+    }
+
+    transcoded = False
+    if has_ffmpeg():
+        fd, tmp_path = tempfile.mkstemp(suffix=RENDITION_EXT)
+        os.close(fd)
+        try:
+            transcode(src_path, tmp_path)
+            if record.playback_audio:
+                record.playback_audio.delete(save=False)
+            with open(tmp_path, 'rb') as fh:
+                record.playback_audio.save(f'rec_{record.id}{RENDITION_EXT}', File(fh), save=False)
+            fields['playback_audio'] = record.playback_audio.name
+            transcoded = True
+        finally:
+            os.remove(tmp_path)
+
+    PracticeRecord.objects.filter(pk=record.pk).update(**fields)
+    for name, value in fields.items():
+        if name != 'playback_audio':
+            setattr(record, name, value)
+
+    return {
+        'duration': fields['audio_duration'],
+        'codec': fields['audio_codec'],
+        'bitrate': fields['audio_bitrate'],
+        'original_size': os.path.getsize(src_path),
+        'playback_size': record.playback_audio.size if transcoded else None,
+        'transcoded': transcoded,
+    }
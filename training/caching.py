@@ -0,0 +1,116 @@
+import functools
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Q
+
+from .models import BuddyPair
+
+# ==========================================
+# 页面数据缓存 (按学员 / 全班分代失效)
+# ==========================================
+#
+# 缓存键里带着"代号"：学员或全班的数据有变化时只需要把代号加一，
+# 旧代号下的所有缓存 (不管是哪个页面的) 自然失效，不用逐个删除。
+
+DEFAULT_TIMEOUT = 10 * 60
+
+USER = 'user'
+CLASS = 'class'
+# 练习目录 (见 catalog.py)
+CATALOG = 'catalog'
+
+
+def _generation_key(scope, user_id=None):
+    return f'ctx:gen:{scope}:{user_id}' if scope == USER else f'ctx:gen:{scope}'
+
+
+def _new_generation():
+    # 代号被淘汰后重新初始化时不能回到旧值，用毫秒时间戳
+    return int(time.time() * 1000)
+
+
+def get_generation(scope, user_id=None):
+    key = _generation_key(scope, user_id)
+    generation = cache.get(key)
+    if generation is None:
+        cache.add(key, _new_generation(), None)
+        generation = cache.get(key)
+    return generation
+
+
+async def aget_generation(scope, user_id=None):
+    key = _generation_key(scope, user_id)
+    generation = await cache.aget(key)
+    if generation is None:
+        await cache.aadd(key, _new_generation(), None)
+        generation = await cache.aget(key)
+    return generation
+
+
+def _bump(keys):
+    for key in keys:
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, _new_generation(), None)
+
+
+def _invalidate(keys):
+    # 事务提交后代号加一 (只加一次)：提交前读到旧数据的请求写在旧代号下，提交后没人再读；
+    # 不在事务里时立即执行。incr 在共享缓存 (Redis) 里是原子的，多个 worker 同时失效不会丢
+    transaction.on_commit(lambda: _bump(keys))
+
+
+def invalidate_users(*user_ids):
+    _invalidate([_generation_key(USER, user_id) for user_id in set(user_ids) if user_id])
+
+
+def invalidate_class():
+    _invalidate([_generation_key(CLASS)])
+
+
+def invalidate_catalog():
+    _invalidate([_generation_key(CATALOG)])
+
+
+def buddy_ids(user_id):
+    """有效配对中的伙伴 (伙伴首页会显示自己的进度和档案)"""
+    pairs = BuddyPair.objects.filter(
+        Q(student_a_id=user_id) | Q(student_b_id=user_id), is_active=True
+    ).values_list('student_a_id', 'student_b_id')
+    return [a if b == user_id else b for a, b in pairs]
+
+
+def invalidate_student(user_id):
+    """学员自己的数据变了：自己和伙伴的缓存都失效"""
+    invalidate_users(user_id, *buddy_ids(user_id))
+
+
+def cached_context(section, scope=USER, timeout=DEFAULT_TIMEOUT):
+    """
+    缓存返回页面数据 (字典) 的函数。
+    scope=USER 时第一个参数是学员，按学员分代；scope=CLASS 时按全班分代。
+    其余参数 (如日期) 拼进缓存键，跨天自然换键。
+
+        @cached_context('dashboard')
+        def dashboard_user_context(user, today): ...
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args):
+            if scope == USER:
+                generation = get_generation(USER, args[0].pk)
+                parts = [str(args[0].pk), *map(str, args[1:])]
+            else:
+                generation = get_generation(CLASS)
+                parts = list(map(str, args))
+            key = f"ctx:{section}:{scope}:{generation}:{':'.join(parts)}"
+            data = cache.get(key)
+            if data is None:
+                data = func(*args)
+                cache.set(key, data, timeout)
+            return data
+        return wrapper
+    return decorator
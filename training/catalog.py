@@ -0,0 +1,68 @@
+from .caching import get_generation, aget_generation, CATALOG
+from .models import Exercise
+
+# ==========================================
+# 练习目录 (进程内缓存 + 共享缓存里的版本号)
+# ==========================================
+# 练习只在后台偶尔修改，却在每个首页 / 上传 / 接口里都要用到。
+# 每个进程在内存里保留一份目录，同时记下读取时的版本号；
+# 练习保存或删除时在共享缓存里换一个新版本号 (见 signals)，
+# 各个 worker 进程下次访问时发现版本变了就重新加载，多进程部署也不会读到旧数据。
+# 内存中只保留最新一个版本，且不加载富文本 content，占用与练习数成正比。
+
+CATALOG_FIELDS = ('id', 'title', 'order', 'is_advanced', 'demo_audio', 'updated_at')
+
+
+class ExerciseCatalog:
+    """某一版本的练习目录：有序列表、普通 / 进阶分组、按 ID 查找"""
+
+    def __init__(self, version, exercises):
+        self.version = version
+        self.exercises = tuple(exercises)
+        self.normal = tuple(ex for ex in self.exercises if not ex.is_advanced)
+        self.advanced = tuple(ex for ex in self.exercises if ex.is_advanced)
+        self._by_id = {ex.id: ex for ex in self.exercises}
+
+    @property
+    def count(self):
+        return len(self.exercises)
+
+    @property
+    def normal_count(self):
+        return len(self.normal)
+
+    @property
+    def advanced_count(self):
+        return len(self.advanced)
+
+    def get(self, exercise_id):
+        """按 ID 查找，ID 不合法或不存在时返回 None"""
+        try:
+            return self._by_id.get(int(exercise_id))
+        except (TypeError, ValueError):
+            return None
+
+
+_catalog = None
+
+
+def _queryset():
+    # 富文本 content 不进目录，需要时 (练习详情) 单独查询
+    return Exercise.objects.only(*CATALOG_FIELDS).order_by('order', 'id')
+
+
+def get_exercise_catalog():
+    global _catalog
+    # 先取版本号再加载：加载途中有修改时，记下的是旧版本号，下次访问会再加载一次
+    version = get_generation(CATALOG)
+    if _catalog is None or _catalog.version != version:
+        _catalog = ExerciseCatalog(version, _queryset())
+    return _catalog
+
+
+async def aget_exercise_catalog():
+    global _catalog
+    version = await aget_generation(CATALOG)
+    if _catalog is None or _catalog.version != version:
+        _catalog = ExerciseCatalog(version, [ex async for ex in _queryset()])
+    return _catalog
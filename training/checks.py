@@ -0,0 +1,26 @@
+from django.conf import settings
+from django.core.checks import Error, Tags, register
+
+# ==========================================
+# 部署检查 (python manage.py check --deploy)
+# ==========================================
+
+# 每个进程各一份或 incr 不是原子操作的缓存后端
+PROCESS_LOCAL_CACHES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.filebased.FileBasedCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+@register(Tags.caches, deploy=True)
+def check_shared_cache(app_configs, **kwargs):
+    """缓存失效靠共享缓存里的代号 (caching.py)：多 worker 部署必须用 Redis / Memcached"""
+    backend = settings.CACHES['default']['BACKEND']
+    if backend in PROCESS_LOCAL_CACHES:
+        return [Error(
+            f"默认缓存 {backend} 不能在多个 worker 进程间共享，或 incr 不是原子操作，页面缓存会读到旧数据。",
+            hint="设置 REDIS_URL 并去掉 CACHE_BACKEND=locmem。",
+            id='training.E001',
+        )]
+    return []
@@ -0,0 +1,109 @@
+import datetime
+import os
+import re
+import zipfile
+
+from .models import PracticeRecord
+from .stats import submitted_between
+
+# ==========================================
+# 录音打包导出 (ZIP 边生成边下发，不在内存里攒整个文件)
+# ==========================================
+
+CHUNK_SIZE = 64 * 1024
+
+# 文件名里不能出现的字符 (Windows 资源管理器最挑剔，按它来)
+UNSAFE_CHARS = re.compile(r'[\\/:*?"<>|\x00-\x1f]+')
+
+
+def safe_name(text, default='未命名'):
+    text = UNSAFE_CHARS.sub('_', str(text or '')).strip(' .')
+    return text[:60] or default
+
+
+class _ZipStream:
+    """
+    只能追加写的"文件"：zipfile 写进来的字节先攒着，由生成器取走下发。
+    不支持 seek，zipfile 会自动改用数据描述符 (data descriptor) 记录大小和 CRC。
+    """
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def pop(self):
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def iter_zip(entries):
+    """
+    按 (压缩包内路径, 本地文件路径) 逐个写入 ZIP 并分块产出字节。
+    录音本身已是压缩格式，用 STORED 不再压缩，省 CPU。
+    """
+    stream = _ZipStream()
+    with zipfile.ZipFile(stream, 'w', compression=zipfile.ZIP_STORED, allowZip64=True) as archive:
+        for arcname, path in entries:
+            try:
+                src = open(path, 'rb')
+            except OSError:
+                # 文件已被删掉：跳过，不让整个导出失败
+                continue
+            with src:
+                info = zipfile.ZipInfo.from_file(path, arcname)
+                info.compress_type = zipfile.ZIP_STORED
+                with archive.open(info, 'w', force_zip64=info.file_size > zipfile.ZIP64_LIMIT) as dest:
+                    while True:
+                        chunk = src.read(CHUNK_SIZE)
+                        if not chunk:
+                            break
+                        dest.write(chunk)
+                        data = stream.pop()
+                        if data:
+                            yield data
+            data = stream.pop()
+            if data:
+                yield data
+    yield stream.pop()
+
+
+def record_entries(records):
+    """
+    录音 -> 压缩包条目，路径为 学员/日期_练习名.扩展名。
+    优先打包转码后的播放版本；同名时追加序号。
+    """
+    entries, used = [], set()
+    for record in records:
+        audio = record.playback_file
+        if not audio:
+            continue
+        try:
+            path = audio.path
+        except (NotImplementedError, ValueError):
+            continue
+        ext = os.path.splitext(audio.name)[1] or '.webm'
+        date = record.practice_date.isoformat()
+        base = f"{safe_name(record.student.username)}/{date}_{safe_name(record.exercise.title)}"
+        arcname, n = f"{base}{ext}", 2
+        while arcname in used:
+            arcname, n = f"{base}_{n}{ext}", n + 1
+        used.add(arcname)
+        entries.append((arcname, path))
+    return entries
+
+
+def week_records(start_of_week, student=None):
+    """某一周 (周一起) 的录音，可按学员过滤"""
+    records = PracticeRecord.objects.filter(
+        **submitted_between(start_of_week, start_of_week + datetime.timedelta(days=7))
+    ).exclude(student_audio='').select_related('student', 'exercise')
+    if student is not None:
+        records = records.filter(student=student)
+    return records.order_by('student__username', 'submitted_at')
@@ -0,0 +1,86 @@
+import time
+import uuid
+
+from django.core.cache import cache
+from django.utils import timezone
+
+from .caching import get_generation, CLASS
+from .models import PracticeRecord, DailyPracticeStat, Announcement
+from .stats import submitted_on
+
+# ==========================================
+# 全班今日动态 (所有学员共用，一段时间或有新录音时才重算)
+# ==========================================
+
+# 没有新录音时最长多久重算一次 (兜底，防止有写入没有发信号)
+FEED_INTERVAL = 60
+# 重算锁：同一时刻只让一个请求查数据库，其余请求先用上一份
+LOCK_TIMEOUT = 10
+# 还没有上一份 (如当天第一次) 时，等正在重算的请求最多多少秒，再每隔多久看一次
+LOCK_WAIT = 2
+LOCK_POLL = 0.05
+LATEST_COUNT = 8
+
+
+def _feed_key(day):
+    return f'class_feed:{day}'
+
+
+def build_class_feed(day):
+    """直接查数据库得到当天的全班动态"""
+    return {
+        # 当天有练习的学员数 (读每日汇总)
+        'total_today_checkins': DailyPracticeStat.objects.filter(
+            date=day,
+            exercise_count__gt=0
+        ).count(),
+        'latest_records': list(PracticeRecord.objects.filter(
+            **submitted_on(day)
+        ).select_related('student', 'exercise').order_by('-submitted_at')[:LATEST_COUNT]),
+        'latest_announcement': Announcement.objects.first(),
+    }
+
+
+def get_class_feed(day=None):
+    """
+    全班动态：打卡人数、最新录音、最新公告。
+    有新录音 / 公告时全班缓存代号会变 (见 signals)，下一次请求重算；
+    否则最多 FEED_INTERVAL 秒重算一次。重算期间其他请求继续拿旧数据，早高峰不会一起打到数据库。
+    """
+    day = day or timezone.localdate()
+    key = _feed_key(day)
+    generation = get_generation(CLASS)
+    feed = cache.get(key)
+    if feed is not None and feed['generation'] == generation and time.time() - feed['computed_at'] < FEED_INTERVAL:
+        return feed['data']
+
+    # 锁的值是本请求的随机令牌：只释放自己拿到的锁 (重算超过 LOCK_TIMEOUT 时锁可能已经归了别人)
+    lock_key = f'{key}:lock'
+    token = uuid.uuid4().hex
+    if not cache.add(lock_key, token, LOCK_TIMEOUT):
+        if feed is not None:
+            return feed['data']
+        feed = _wait_for_feed(key)
+        if feed is not None:
+            return feed['data']
+        # 等不到 (重算的请求出错或太慢)：自己查一次，不拿锁也不释放别人的锁
+        return build_class_feed(day)
+    try:
+        data = build_class_feed(day)
+        cache.set(key, {'data': data, 'generation': generation, 'computed_at': time.time()}, FEED_INTERVAL * 10)
+    finally:
+        # 先读再删不是原子的，只在锁恰好此刻过期又被别人拿到时才会误删，最坏多一次重算
+        if cache.get(lock_key) == token:
+            cache.delete(lock_key)
+    return data
+
+
+def _wait_for_feed(key):
+    """别的请求正在重算且没有上一份可用：等它写入缓存，最多 LOCK_WAIT 秒"""
+    deadline = time.monotonic() + LOCK_WAIT
+    while time.monotonic() < deadline:
+        time.sleep(LOCK_POLL)
+        feed = cache.get(key)
+        if feed is not None:
+            return feed
+    return None
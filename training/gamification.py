@@ -0,0 +1,179 @@
+import datetime
+
+from django.db import transaction, IntegrityError
+from django.db.models import F, Case, When, Value, IntegerField, FloatField
+from django.db.models.functions import Cast, Floor, Least, Sqrt
+from django.utils import timezone
+
+from .caching import invalidate_student
+from .models import StudentProfile, Achievement, StudentAchievement
+
+# ==========================================
+# 成就评估
+# ==========================================
+
+# 条件类型 -> 取档案数值的函数
+# "首次完成" 只要有一条录音就解锁，不看条件值 (见 _threshold)
+CONDITION_GETTERS = {
+    'streak': lambda profile: profile.streak_days,
+    'total_days': lambda profile: profile.total_practice_days,
+    'exp': lambda profile: profile.experience_points,
+    'recordings': lambda profile: profile.total_recordings,
+    'level': lambda profile: profile.level,
+    'first': lambda profile: profile.total_recordings,
+}
+
+
+def _threshold(achievement):
+    if achievement.condition_type == 'first':
+        return 1
+    return achievement.condition_value
+
+
+def index_achievements(achievements):
+    """按条件类型建立索引，每个类型内按门槛从低到高排序"""
+    index = {}
+    for achievement in achievements:
+        index.setdefault(achievement.condition_type, []).append(achievement)
+    for items in index.values():
+        items.sort(key=_threshold)
+    return index
+
+
+def _earned_ids(user):
+    return set(StudentAchievement.objects.filter(student=user).values_list('achievement_id', flat=True))
+
+
+def check_achievements(user, profile):
+    """
+    检查并解锁成就。
+    已获得集合只查一次，条件在内存中比对，
+    新成就一次 bulk_create，经验奖励和新等级合并成一次档案写入。
+    两个请求同时评估同一学员时，已获得集合可能都没有对方刚写入的成就：
+    写入时忽略唯一约束冲突，只给这次真正写入的成就加经验，返回的也只是这些成就。
+    """
+    index = index_achievements(Achievement.objects.all())
+    earned_ids = _earned_ids(user)
+
+    unlocked = []
+    for condition_type, achievements in index.items():
+        getter = CONDITION_GETTERS.get(condition_type)
+        if getter is None:
+            continue
+        current = getter(profile)
+        for achievement in achievements:
+            # 门槛已排序，达不到就不用再往后看
+            if current < _threshold(achievement):
+                break
+            if achievement.id not in earned_ids:
+                unlocked.append(achievement)
+
+    if not unlocked:
+        return []
+
+    unlocked.sort(key=lambda a: (a.order, a.id))
+    rows = StudentAchievement.objects.bulk_create([
+        StudentAchievement(student=user, achievement=achievement)
+        for achievement in unlocked
+    ], ignore_conflicts=True)
+    # 忽略冲突时拿不到写入了哪些行：获得时间由本次写入填好 (auto_now_add)，
+    # 库里的获得时间和本次填的一致，才是这次写入的
+    stamps = {row.achievement_id: row.earned_at for row in rows}
+    inserted_ids = {
+        achievement_id
+        for achievement_id, earned_at in StudentAchievement.objects.filter(
+            student=user, achievement_id__in=stamps,
+        ).values_list('achievement_id', 'earned_at')
+        if earned_at == stamps[achievement_id]
+    }
+    unlocked = [a for a in unlocked if a.id in inserted_ids]
+
+    # 成就奖励经验 (数据库端累加，避免并发时覆盖)，等级按累加后的经验在同一条 UPDATE 里算
+    reward = sum(a.exp_reward for a in unlocked)
+    if reward:
+        new_exp = F('experience_points') + reward
+        StudentProfile.objects.filter(pk=profile.pk).update(
+            experience_points=new_exp, level=_level_for(new_exp),
+        )
+        profile.refresh_from_db(fields=['experience_points', 'level'])
+
+    return unlocked
+
+
+# ==========================================
+# 档案记账：经验 / 录音数 / 连续天数
+# ==========================================
+
+STREAK_BONUS_PER_DAY = 5
+STREAK_BONUS_MAX = 50
+
+
+def streak_bonus_for(streak_days):
+    """连续天数奖励经验 (最高50)"""
+    return min(streak_days * STREAK_BONUS_PER_DAY, STREAK_BONUS_MAX)
+
+
+def _level_for(exp):
+    """经验值表达式对应的等级表达式：floor(sqrt(exp / 100)) + 1，与 StudentProfile.calculate_level 一致"""
+    return Cast(Floor(Sqrt(Cast(exp, FloatField()) / 100.0)), IntegerField()) + 1
+
+
+def _practice_update(exp_amount, new_recording, today):
+    """
+    一次练习对应的 UPDATE 表达式。
+    SET 中所有表达式都基于更新前的行计算，所以新连续天数、连续奖励和新等级可以写在同一条语句里。
+    """
+    yesterday = today - datetime.timedelta(days=1)
+
+    # 今天已经练习过 -> 不变；昨天练习过 -> +1；首次或断了 -> 重新从1开始
+    new_streak = Case(
+        When(last_practice_date=today, then=F('streak_days')),
+        When(last_practice_date=yesterday, then=F('streak_days') + 1),
+        default=Value(1),
+        output_field=IntegerField(),
+    )
+    practice_days = Case(
+        When(last_practice_date=today, then=F('total_practice_days')),
+        default=F('total_practice_days') + 1,
+        output_field=IntegerField(),
+    )
+    streak_bonus = Least(new_streak * STREAK_BONUS_PER_DAY, Value(STREAK_BONUS_MAX))
+    new_exp = F('experience_points') + exp_amount + streak_bonus
+
+    return {
+        'streak_days': new_streak,
+        'total_practice_days': practice_days,
+        'last_practice_date': Value(today),
+        'experience_points': new_exp,
+        'level': _level_for(new_exp),
+        'total_recordings': F('total_recordings') + (1 if new_recording else 0),
+    }
+
+
+def record_practice(user, exp_amount, new_recording=False, today=None):
+    """
+    记录一次练习：经验、录音数、连续天数在一条 UPDATE 中由数据库原子完成，
+    多端同时上传不会丢失累加。连续天数奖励同样在数据库端算出。
+    today 为练习发生的日期 (后台任务延迟执行时传入上传当天)。
+    返回 (最新档案, 连续天数奖励)。
+    """
+    today = today or timezone.localdate()
+    values = _practice_update(exp_amount, new_recording, today)
+
+    with transaction.atomic():
+        updated = StudentProfile.objects.filter(user=user).update(**values)
+        if not updated:
+            # 首次练习还没有档案：先建档再记账
+            try:
+                with transaction.atomic():
+                    StudentProfile.objects.create(user=user)
+            except IntegrityError:
+                pass
+            StudentProfile.objects.filter(user=user).update(**values)
+
+        profile = StudentProfile.objects.get(user=user)
+        check_achievements(user, profile)
+
+    # UPDATE 和 bulk_create 不发信号，首页缓存在这里失效
+    invalidate_student(user.id)
+    return profile, streak_bonus_for(profile.streak_days)
@@ -0,0 +1,104 @@
+import base64
+import datetime
+import itertools
+
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from .models import PracticeRecord
+
+# ==========================================
+# 历史录音分页 (学员 / 老师两个页面和 JSON 接口共用)
+# ==========================================
+#
+# 按 (submitted_at, id) 倒序做游标分页：下一页从上一页最后一条之后开始，
+# 走 (student, submitted_at) 索引，翻到多深都只读一页的数据，不用 OFFSET。
+# 每天的录音条数由数据库按 practice_date 分组统计，一天的录音跨两页时条数也是全天的。
+
+PAGE_SIZE = 30
+MAX_PAGE_SIZE = 100
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def history_records(student):
+    return PracticeRecord.objects.filter(student=student, student_audio__isnull=False)
+
+
+def encode_cursor(record):
+    raw = f'{record.submitted_at.isoformat()}|{record.id}'
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        submitted_at, record_id = raw.rsplit('|', 1)
+        return datetime.datetime.fromisoformat(submitted_at), int(record_id)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise InvalidCursor(f"无效的分页参数: {cursor}") from e
+
+
+def day_counts(student, dates):
+    """指定日期的全天录音条数 (一条 GROUP BY)"""
+    rows = history_records(student).filter(practice_date__in=dates).values('practice_date').annotate(
+        count=Count('id')
+    )
+    return {row['practice_date']: row['count'] for row in rows}
+
+
+def history_page(student, cursor=None, limit=None):
+    """
+    取一页历史录音，按日期分组：
+    {'days': [{'date', 'count', 'records'}], 'next_cursor', 'total'}。
+    total (全部录音数) 只在第一页计算，翻页时为 None。
+    """
+    limit = limit or PAGE_SIZE
+    records = history_records(student).select_related('exercise').order_by('-submitted_at', '-id')
+    if cursor:
+        submitted_at, record_id = decode_cursor(cursor)
+        records = records.filter(
+            Q(submitted_at__lt=submitted_at) | Q(submitted_at=submitted_at, id__lt=record_id)
+        )
+    rows = list(records[:limit + 1])
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    counts = day_counts(student, {record.practice_date for record in rows}) if rows else {}
+    days = [
+        {'date': date, 'count': counts.get(date, 0), 'records': list(group)}
+        for date, group in itertools.groupby(rows, key=lambda record: record.practice_date)
+    ]
+    return {
+        'days': days,
+        'next_cursor': encode_cursor(rows[-1]) if has_more else None,
+        'total': None if cursor else history_records(student).count(),
+    }
+
+
+def serialize_page(page):
+    """接口返回的 JSON 结构"""
+    return {
+        'days': [
+            {
+                'date': day['date'].isoformat(),
+                'count': day['count'],
+                'records': [
+                    {
+                        'id': record.id,
+                        'exercise_title': record.exercise.title,
+                        'submitted_at': record.submitted_at.isoformat(),
+                        'time': timezone.localtime(record.submitted_at).strftime('%H:%M'),
+                        'playback_url': record.playback_url,
+                        'peaks_url': record.audio_peaks_url,
+                    }
+                    for record in day['records']
+                ],
+            }
+            for day in page['days']
+        ],
+        'next_cursor': page['next_cursor'],
+        'total': page['total'],
+    }
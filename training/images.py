@@ -0,0 +1,204 @@
+import io
+import re
+from urllib.parse import unquote
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.utils import timezone
+from django.utils.html import escape
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from .caching import invalidate_catalog, invalidate_class
+from .models import Exercise, Announcement
+
+# ==========================================
+# 富文本图片：多尺寸派生图 + srcset
+# ==========================================
+#
+# 老师在编辑器里上传的原图常有几 MB。保存练习 / 公告后，后台任务为正文里引用的
+# 每张上传图片生成几个宽度的 WebP 和 JPEG 版本，并把 <img> 改写为
+# <picture> + srcset，浏览器按屏幕宽度挑合适的一张，手机上不再下载原图。
+# 派生图跟着原图文件名走 (image_variants/<原图路径>.w480.webp)，已存在就跳过。
+
+VARIANTS_DIR = 'image_variants'
+# 派生宽度 (不超过原图宽度；原图更窄时按原宽度重新压缩一份)
+IMAGE_WIDTHS = (480, 960, 1600)
+# (扩展名, Pillow 格式, MIME)
+VARIANT_FORMATS = (('webp', 'WEBP', 'image/webp'), ('jpg', 'JPEG', 'image/jpeg'))
+QUALITY = 80
+# 正文区域最宽 800px (公告、练习详情页)
+SIZES = '(max-width: 800px) 100vw, 800px'
+
+# 正文含图片的模型: kind -> 模型
+IMAGE_CONTENT_SOURCES = {
+    'exercise': Exercise,
+    'announcement': Announcement,
+}
+
+_IMG_RE = re.compile(r'<img\b[^>]*>', re.IGNORECASE)
+_SRC_RE = re.compile(r'\bsrc\s*=\s*(["\'])(.*?)\1', re.IGNORECASE | re.DOTALL)
+_SRCSET_RE = re.compile(r'\bsrcset\s*=', re.IGNORECASE)
+
+
+class ImageProcessingError(Exception):
+    pass
+
+
+def variant_name(name, width, ext):
+    return f'{VARIANTS_DIR}/{name}.w{width}.{ext}'
+
+
+def target_widths(original_width):
+    return sorted({min(width, original_width) for width in IMAGE_WIDTHS})
+
+
+def is_upload_name(name):
+    """编辑器上传的原图 (不含 pillow 后端生成的 _thumb 缩略图)"""
+    upload_path = settings.CKEDITOR_UPLOAD_PATH
+    return name.startswith(upload_path) and '_thumb.' not in name.rsplit('/', 1)[-1]
+
+
+def upload_name_from_src(src):
+    """<img src> -> 存储中的文件名；不是编辑器上传的图片返回 None"""
+    path = unquote(re.sub(r'^https?://[^/]+', '', src.split('?', 1)[0]))
+    if not path.startswith(settings.MEDIA_URL):
+        return None
+    name = path[len(settings.MEDIA_URL):]
+    return name if is_upload_name(name) else None
+
+
+def _encode(image, fmt):
+    buffer = io.BytesIO()
+    if fmt == 'JPEG' and image.mode != 'RGB':
+        # JPEG 没有透明通道，铺白底
+        background = Image.new('RGB', image.size, 'white')
+        rgba = image.convert('RGBA')
+        background.paste(rgba, mask=rgba.getchannel('A'))
+        image = background
+    elif fmt == 'WEBP' and image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA')
+    image.save(buffer, fmt, quality=QUALITY, optimize=fmt == 'JPEG')
+    return buffer.getvalue()
+
+
+def derive_image(name, force=False):
+    """
+    为一张原图生成所有派生图，返回可用的宽度列表 (已存在的直接跳过，force 重新生成)。
+    动图不处理 (缩放会丢帧)，返回空列表。
+    """
+    try:
+        with default_storage.open(name, 'rb') as fh:
+            image = Image.open(fh)
+            if getattr(image, 'is_animated', False):
+                return []
+            widths = target_widths(image.width)
+            missing = [
+                (width, ext, fmt) for width in widths for ext, fmt, _ in VARIANT_FORMATS
+                if force or not default_storage.exists(variant_name(name, width, ext))
+            ]
+            if not missing:
+                return widths
+            # 按 EXIF 方向摆正后再缩放
+            image = ImageOps.exif_transpose(image)
+            image.load()
+    except (OSError, UnidentifiedImageError, Image.DecompressionBombError) as e:
+        raise ImageProcessingError(f"{name}: {e}")
+
+    resized = {}
+    for width, ext, fmt in missing:
+        if width not in resized:
+            height = max(1, round(image.height * width / image.width))
+            resized[width] = image if width == image.width else image.resize((width, height), Image.LANCZOS)
+        target = variant_name(name, width, ext)
+        if default_storage.exists(target):
+            default_storage.delete(target)
+        default_storage.save(target, ContentFile(_encode(resized[width], fmt)))
+    return widths
+
+
+def _srcset(name, widths, ext):
+    return ', '.join(f'{default_storage.url(variant_name(name, width, ext))} {width}w' for width in widths)
+
+
+def rewrite_content(html, derive=derive_image):
+    """
+    把正文里编辑器上传的 <img> 改写成 <picture>：WebP 的 <source> + 带 JPEG srcset 的 <img>。
+    已有 srcset 的图片 (改写过的) 和外链图片保持不变。返回 (新正文, 改写的图片数)。
+    """
+    changed = 0
+
+    def replace(match):
+        nonlocal changed
+        tag = match.group(0)
+        src = _SRC_RE.search(tag)
+        if _SRCSET_RE.search(tag) or src is None:
+            return tag
+        name = upload_name_from_src(src.group(2))
+        if name is None:
+            return tag
+        try:
+            widths = derive(name)
+        except ImageProcessingError:
+            return tag
+        if not widths:
+            return tag
+
+        sources = ''.join(
+            f'<source type="{mime}" srcset="{escape(_srcset(name, widths, ext))}" sizes="{SIZES}">'
+            for ext, _, mime in VARIANT_FORMATS if ext != 'jpg'
+        )
+        end = '/>' if tag.endswith('/>') else '>'
+        img = (
+            f'{tag[:-len(end)].rstrip()} srcset="{escape(_srcset(name, widths, "jpg"))}" '
+            f'sizes="{SIZES}" loading="lazy" decoding="async" {end}'
+        )
+        changed += 1
+        return f'<picture>{sources}{img}</picture>'
+
+    return _IMG_RE.sub(replace, html or ''), changed
+
+
+def needs_rewrite(html):
+    """正文里还有未改写的上传图片"""
+    for tag in _IMG_RE.findall(html or ''):
+        src = _SRC_RE.search(tag)
+        if src and not _SRCSET_RE.search(tag) and upload_name_from_src(src.group(2)):
+            return True
+    return False
+
+
+def optimize_content_images(kind, obj_id):
+    """
+    生成正文图片的派生图并改写正文。
+    用 update() 按旧正文条件写回：处理期间老师又改了正文时不覆盖，由新保存触发的任务处理。
+    update() 不发信号，缓存失效自己做。
+    """
+    model = IMAGE_CONTENT_SOURCES[kind]
+    content = model.objects.filter(id=obj_id).values_list('content', flat=True).first()
+    if content is None:
+        return 0
+    new_content, changed = rewrite_content(content)
+    if changed and model.objects.filter(id=obj_id, content=content).update(
+        content=new_content, updated_at=timezone.now()
+    ):
+        if model is Exercise:
+            invalidate_catalog()
+        else:
+            invalidate_class()
+    return changed
+
+
+def iter_upload_names(path=None):
+    """遍历存储中编辑器上传的原图"""
+    path = settings.CKEDITOR_UPLOAD_PATH.rstrip('/') if path is None else path
+    try:
+        dirs, files = default_storage.listdir(path)
+    except FileNotFoundError:
+        return
+    for filename in files:
+        name = f'{path}/{filename}'
+        if is_upload_name(name):
+            yield name
+    for dirname in dirs:
+        yield from iter_upload_names(f'{path}/{dirname}')
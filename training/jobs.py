@@ -0,0 +1,106 @@
+import datetime
+import logging
+import traceback
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+# ==========================================
+# 后台任务队列 (数据库表实现，进程内执行)
+# ==========================================
+
+# 任务类型 -> 处理函数
+HANDLERS = {}
+
+# 第 n 次失败后等待 RETRY_DELAY * 2^(n-1) 秒再重试
+RETRY_DELAY = 30
+# 执行中超过这么久还没结束，视为 worker 已崩溃，重新排队
+STALE_AFTER = datetime.timedelta(minutes=10)
+
+
+def job_handler(kind):
+    """注册任务处理函数，处理函数接收 payload 作为关键字参数，返回值存为 result"""
+    def decorator(func):
+        HANDLERS[kind] = func
+        return func
+    return decorator
+
+
+def enqueue(kind, payload=None, owner=None, max_attempts=3):
+    """
+    加入任务队列。
+    settings.JOB_QUEUE_EAGER 为 True 时当场执行 (开发环境没有起 worker 时使用)。
+    """
+    job = Job.objects.create(kind=kind, payload=payload or {}, owner=owner, max_attempts=max_attempts)
+    if getattr(settings, 'JOB_QUEUE_EAGER', False):
+        run_job(job)
+    return job
+
+
+def claim_next():
+    """取出一个到期任务并标记为执行中；多个 worker 同时取时用条件 UPDATE 保证只有一个成功"""
+    while True:
+        job = Job.objects.filter(
+            status=Job.PENDING, run_after__lte=timezone.now()
+        ).order_by('run_after', 'id').first()
+        if job is None:
+            return None
+        claimed = Job.objects.filter(id=job.id, status=Job.PENDING).update(
+            status=Job.RUNNING, attempts=F('attempts') + 1, updated_at=timezone.now()
+        )
+        if claimed:
+            job.refresh_from_db()
+            return job
+
+
+def run_job(job):
+    """
+    执行任务。处理函数和结果写入在同一个事务里，
+    失败时处理函数的数据库改动一并回滚，重试不会重复记账。
+    """
+    handler = HANDLERS.get(job.kind)
+    if job.status == Job.PENDING:
+        job.attempts += 1
+    try:
+        if handler is None:
+            raise LookupError(f"未注册的任务类型: {job.kind}")
+        with transaction.atomic():
+            job.result = handler(**job.payload)
+            job.status = Job.DONE
+            job.last_error = ""
+            job.save()
+    except Exception:
+        job.last_error = traceback.format_exc()
+        if job.attempts < job.max_attempts and handler is not None:
+            job.status = Job.PENDING
+            job.run_after = timezone.now() + datetime.timedelta(seconds=RETRY_DELAY * 2 ** (job.attempts - 1))
+        else:
+            job.status = Job.FAILED
+            logger.error("任务 #%s (%s) 执行失败: %s", job.id, job.kind, job.last_error)
+        job.save()
+    return job
+
+
+def run_pending(limit=None):
+    """执行所有到期任务，返回执行的个数"""
+    count = 0
+    while limit is None or count < limit:
+        job = claim_next()
+        if job is None:
+            break
+        run_job(job)
+        count += 1
+    return count
+
+
+def requeue_stale():
+    """把长时间卡在执行中的任务放回队列"""
+    return Job.objects.filter(
+        status=Job.RUNNING, updated_at__lt=timezone.now() - STALE_AFTER
+    ).update(status=Job.PENDING, updated_at=timezone.now())
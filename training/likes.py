@@ -0,0 +1,56 @@
+from django.db import IntegrityError, transaction
+from django.db.models import Count, Exists, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import DailyCheckIn
+
+# ==========================================
+# 打卡点赞
+# ==========================================
+#
+# 点赞数冗余在 DailyCheckIn.like_count 上：展示时直接读字段，不用每张卡片数一次关联表。
+# 点赞 / 取消走 toggle_like，删除或插入关联行后用 F() 原子地加减计数；
+# 其他途径 (后台、likes.add / remove / clear) 改关联表时由 signals 调 refresh_like_counts 重算。
+# "我是否点过赞" 按一批打卡一次查出 (liked_checkin_ids / with_liked)。
+
+Like = DailyCheckIn.likes.through
+
+
+def refresh_like_counts(checkin_ids):
+    """按关联表重算指定打卡的点赞数 (一条 UPDATE)"""
+    counts = Like.objects.filter(dailycheckin=OuterRef('pk')).values('dailycheckin').annotate(
+        n=Count('id')
+    ).values('n')
+    DailyCheckIn.objects.filter(id__in=checkin_ids).update(like_count=Coalesce(Subquery(counts), 0))
+
+
+def toggle_like(checkin_id, user):
+    """点赞 / 取消点赞，返回 (是否已点赞, 最新点赞数)"""
+    with transaction.atomic():
+        removed, _ = Like.objects.filter(dailycheckin_id=checkin_id, user=user).delete()
+        liked = not removed
+        if liked:
+            try:
+                with transaction.atomic():
+                    Like.objects.create(dailycheckin_id=checkin_id, user=user)
+            except IntegrityError:
+                # 同一用户的另一个请求刚点过赞，计数已经加过
+                return True, DailyCheckIn.objects.values_list('like_count', flat=True).get(id=checkin_id)
+        DailyCheckIn.objects.filter(id=checkin_id).update(like_count=F('like_count') + (1 if liked else -1))
+        return liked, DailyCheckIn.objects.values_list('like_count', flat=True).get(id=checkin_id)
+
+
+def liked_checkin_ids(user, checkins):
+    """一批打卡里当前用户点过赞的 ID 集合 (一条查询；未登录为空)"""
+    if not user.is_authenticated:
+        return set()
+    ids = [checkin.id for checkin in checkins]
+    return set(Like.objects.filter(user=user, dailycheckin_id__in=ids).values_list('dailycheckin_id', flat=True))
+
+
+def with_liked(queryset, user):
+    """给打卡查询加上 is_liked 标记 (当前用户是否点过赞)，和打卡在同一条查询里取回"""
+    return queryset.annotate(is_liked=Exists(Like.objects.filter(
+        dailycheckin=OuterRef('pk'),
+        user_id=user.id if user.is_authenticated else None,
+    )))
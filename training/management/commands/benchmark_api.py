@@ -0,0 +1,144 @@
+import os
+import socket
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from training.models import Exercise
+
+# 被测服务器：名称 -> 启动命令 (端口、worker 数由参数填入)
+SERVERS = {
+    'WSGI': lambda port, options: [
+        sys.executable, '-m', 'gunicorn', 'config.wsgi:application',
+        '--bind', f'127.0.0.1:{port}', '--workers', str(options['workers']),
+        '--worker-class', 'gthread', '--threads', str(options['threads']),
+        '--log-level', 'warning',
+    ],
+    'ASGI': lambda port, options: [
+        sys.executable, '-m', 'uvicorn', 'config.asgi:application',
+        '--host', '127.0.0.1', '--port', str(port), '--workers', str(options['workers']),
+        '--log-level', 'warning',
+    ],
+}
+STARTUP_TIMEOUT = 30
+
+
+class Command(BaseCommand):
+    help = (
+        "压测 JSON 接口：分别启动 gunicorn (WSGI，gthread 线程 worker) 和 uvicorn (ASGI) 服务器，"
+        "用同样的并发发 HTTP 请求，比较首页数据和练习详情接口的吞吐量。"
+        "接口是 async 视图：WSGI 下 Django 为每个请求用 async_to_sync 跑一次，ASGI 下直接在事件循环里执行，"
+        "比较的就是这两种部署方式。服务器沿用本进程的数据库和缓存配置，需安装 gunicorn 和 uvicorn。"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--username', required=True, help="以该学员身份请求")
+        parser.add_argument('--requests', type=int, default=200, help="每个接口每种服务器的请求数 (默认 200)")
+        parser.add_argument('--concurrency', type=int, default=20, help="并发数 (默认 20)")
+        parser.add_argument('--workers', type=int, default=2, help="服务器 worker 进程数 (默认 2)")
+        parser.add_argument('--threads', type=int, default=8, help="gunicorn 每个 worker 的线程数 (默认 8)")
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['username'])
+        except User.DoesNotExist:
+            raise CommandError(f"用户不存在: {options['username']}")
+        exercise = Exercise.objects.order_by('order').first()
+        if exercise is None:
+            raise CommandError("还没有练习，无法压测练习详情接口")
+
+        # 登录会话存在数据库里，服务器进程用同一个库，直接带上会话 Cookie
+        with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+            login_client = Client()
+            login_client.force_login(user)
+        cookies = {key: morsel.value for key, morsel in login_client.cookies.items()}
+
+        endpoints = [
+            ('dashboard', reverse('api_v1_dashboard')),
+            ('exercise', reverse('api_v1_exercise_detail', args=[exercise.id])),
+        ]
+        total, concurrency = options['requests'], options['concurrency']
+
+        self.stdout.write(f"{'接口':<12}{'服务器':<8}{'请求数':>8}{'耗时(秒)':>12}{'请求/秒':>10}")
+        for mode, command in SERVERS.items():
+            with self.server(command, options) as base_url:
+                for name, path in endpoints:
+                    elapsed = self.run_load(base_url + path, total, concurrency, cookies)
+                    self.stdout.write(f"{name:<12}{mode:<8}{total:>8}{elapsed:>12.3f}{total / elapsed:>10.1f}")
+
+    def server_env(self):
+        """服务器子进程用和本进程相同的数据库、缓存 (如测试库、进程内缓存)"""
+        env = {**os.environ, 'DJANGO_SETTINGS_MODULE': os.environ.get('DJANGO_SETTINGS_MODULE', 'config.settings')}
+        env['DB_NAME'] = str(connection.settings_dict['NAME'])
+        if settings.CACHES['default']['BACKEND'].endswith('LocMemCache'):
+            env['CACHE_BACKEND'] = 'locmem'
+        return env
+
+    def server(self, command, options):
+        port = _free_port()
+        return _Server(command(port, options), port, self.server_env())
+
+    def run_load(self, url, total, concurrency, cookies):
+        """concurrency 个线程各用一个 HTTP 会话发请求，返回全部完成的耗时 (先预热一次)"""
+        def worker(count):
+            with requests.Session() as session:
+                session.cookies.update(cookies)
+                for _ in range(count):
+                    self.ensure_ok(session.get(url, timeout=30))
+
+        worker(1)
+        counts = [total // concurrency + (1 if i < total % concurrency else 0) for i in range(concurrency)]
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            for future in [pool.submit(worker, n) for n in counts if n]:
+                future.result()
+        return time.perf_counter() - start
+
+    def ensure_ok(self, response):
+        if response.status_code != 200 or response.json().get('status') != 'success':
+            raise CommandError(f"请求失败: {response.status_code} {response.content[:200]!r}")
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+class _Server:
+    """启动服务器子进程，等到能响应 ping 后返回地址；退出时结束进程"""
+
+    def __init__(self, args, port, env):
+        self.args, self.port, self.env = args, port, env
+
+    def __enter__(self):
+        base_url = f'http://127.0.0.1:{self.port}'
+        self.process = subprocess.Popen(self.args, env=self.env, cwd=settings.BASE_DIR)
+        deadline = time.monotonic() + STARTUP_TIMEOUT
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise CommandError(f"服务器启动失败: {' '.join(self.args[2:4])}")
+            try:
+                requests.get(base_url + reverse('api_v1_ping'), timeout=1)
+                return base_url
+            except requests.ConnectionError:
+                time.sleep(0.2)
+        self.__exit__(None, None, None)
+        raise CommandError(f"服务器 {STARTUP_TIMEOUT} 秒内没有启动")
+
+    def __exit__(self, *exc):
+        self.process.terminate()
+        try:
+            self.process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            self.process.wait()
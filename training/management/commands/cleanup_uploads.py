@@ -0,0 +1,24 @@
+import datetime
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from training.models import UploadSession
+from training.uploads import discard_temp_file
+
+
+class Command(BaseCommand):
+    help = "清理超时未完成的分片上传会话及其临时文件"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hours', type=int, default=24, help="超过多少小时未更新视为中断 (默认 24)")
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - datetime.timedelta(hours=options['hours'])
+        stale = UploadSession.objects.filter(updated_at__lt=cutoff)
+        count = 0
+        for session in stale:
+            discard_temp_file(session)
+            count += 1
+        stale.delete()
+        self.stdout.write(self.style.SUCCESS(f"已清理 {count} 个上传会话"))
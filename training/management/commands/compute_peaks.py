@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+
+from training.peaks import PEAK_SOURCES, generate_peaks_batch
+
+
+class Command(BaseCommand):
+    help = "批量为学员录音、老师语音点评 / 周点评、示范音频和公告语音生成波形峰值"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100, help="每批处理的条数 (默认 100)")
+        parser.add_argument('--force', action='store_true', help="已有峰值文件也重新生成")
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        total = 0
+        for kind, (model, field_name) in PEAK_SOURCES.items():
+            objects = model.objects.exclude(**{field_name: ''}).exclude(**{f'{field_name}__isnull': True})
+            batch = []
+            for obj in objects.only('id', field_name).iterator(chunk_size=batch_size):
+                batch.append(getattr(obj, field_name))
+                if len(batch) >= batch_size:
+                    total += self.run_batch(kind, batch, options['force'])
+                    batch = []
+            if batch:
+                total += self.run_batch(kind, batch, options['force'])
+        self.stdout.write(self.style.SUCCESS(f"共生成 {total} 个波形"))
+
+    def run_batch(self, kind, batch, force):
+        done, errors = generate_peaks_batch(batch, force=force)
+        for name, error in errors:
+            self.stderr.write(f"{name}: {error}")
+        self.stdout.write(f"[{kind}] 本批 {done}/{len(batch)}")
+        return done
@@ -0,0 +1,58 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from training.images import (
+    IMAGE_CONTENT_SOURCES, ImageProcessingError, derive_image, iter_upload_names, optimize_content_images
+)
+
+
+def _init_worker():
+    # spawn 方式启动的子进程需要重新初始化 Django；fork 时为空操作
+    django.setup()
+
+
+def _derive(args):
+    name, force = args
+    try:
+        return name, len(derive_image(name, force=force)), None
+    except ImageProcessingError as e:
+        return name, 0, str(e)
+
+
+class Command(BaseCommand):
+    help = "为编辑器已上传的图片批量生成多尺寸 WebP / JPEG 版本 (多进程)，并把练习和公告正文改写为 srcset"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="进程数 (默认 CPU 核数)")
+        parser.add_argument('--force', action='store_true', help="已有派生图也重新生成")
+        parser.add_argument('--skip-content', action='store_true', help="只生成图片，不改写正文")
+
+    def handle(self, *args, **options):
+        names = list(iter_upload_names())
+        self.stdout.write(f"共 {len(names)} 张上传图片，{options['workers']} 个进程处理")
+
+        # 子进程不用数据库，fork 前关掉连接，避免子进程继承同一个连接
+        connections.close_all()
+        done = failed = 0
+        with ProcessPoolExecutor(max_workers=max(1, options['workers']), initializer=_init_worker) as pool:
+            jobs = ((name, options['force']) for name in names)
+            for name, widths, error in pool.map(_derive, jobs, chunksize=8):
+                if error:
+                    failed += 1
+                    self.stderr.write(error)
+                else:
+                    done += 1
+        self.stdout.write(f"图片处理完成 {done} 张，失败 {failed} 张")
+
+        if options['skip_content']:
+            return
+        # 派生图已经生成，改写正文只需检查文件是否存在
+        rewritten = 0
+        for kind, model in IMAGE_CONTENT_SOURCES.items():
+            for obj_id in model.objects.filter(content__icontains='<img').values_list('id', flat=True):
+                rewritten += optimize_content_images(kind, obj_id)
+        self.stdout.write(self.style.SUCCESS(f"正文中改写了 {rewritten} 张图片"))
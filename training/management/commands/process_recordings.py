@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from training.audio import process_record_audio, has_ffmpeg, AudioProcessingError
+from training.models import PracticeRecord
+
+
+class Command(BaseCommand):
+    help = "为已有录音探测参数并生成播放版本 (默认只处理还没有播放版本的录音)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help="重新处理所有录音")
+
+    def handle(self, *args, **options):
+        if not has_ffmpeg():
+            self.stderr.write("未找到 ffmpeg，只能记录 WAV 录音的参数，不会生成播放版本")
+
+        records = PracticeRecord.objects.exclude(student_audio='').exclude(student_audio__isnull=True)
+        if not options['all']:
+            records = records.filter(Q(playback_audio__isnull=True) | Q(playback_audio=''))
+
+        done = failed = 0
+        for record in records.iterator():
+            try:
+                process_record_audio(record)
+                done += 1
+            except (AudioProcessingError, OSError) as e:
+                failed += 1
+                self.stderr.write(f"录音 #{record.id} 处理失败: {e}")
+        self.stdout.write(self.style.SUCCESS(f"处理完成 {done} 条，失败 {failed} 条"))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from training.stats import rebuild_daily_stats
+
+
+class Command(BaseCommand):
+    help = "从录音和打卡记录全量重建每日练习汇总表"
+
+    def handle(self, *args, **options):
+        count = rebuild_daily_stats()
+        self.stdout.write(self.style.SUCCESS(f"已重建 {count} 条每日练习汇总"))
@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from training.jobs import run_pending, requeue_stale
+
+
+class Command(BaseCommand):
+    help = "启动后台任务 worker (游戏化结算、音频处理等)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="执行完当前到期任务后退出")
+        parser.add_argument('--sleep', type=float, default=1.0, help="队列为空时的轮询间隔秒数 (默认 1)")
+
+    def handle(self, *args, **options):
+        requeued = requeue_stale()
+        if requeued:
+            self.stdout.write(f"重新排队 {requeued} 个中断的任务")
+
+        while True:
+            count = run_pending()
+            if count:
+                self.stdout.write(f"执行了 {count} 个任务")
+            if options['once']:
+                break
+            if not count:
+                time.sleep(options['sleep'])
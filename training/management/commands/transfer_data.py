@@ -0,0 +1,126 @@
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+from contextlib import closing
+
+from django.apps import apps
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.contrib.auth.models import User
+from django.db import connections
+from django.db.utils import ConnectionDoesNotExist, load_backend
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from training.models import PracticeRecord
+from training.stats import rebuild_daily_stats
+
+SOURCE_ALIAS = 'transfer_source'
+
+# 目标库 migrate 时会自动生成的表，不从旧库搬 (主键可能不同，外键改用自然键引用)
+DERIVED_MODELS = ['contenttypes', 'auth.permission']
+
+
+class Command(BaseCommand):
+    help = (
+        "把旧的 SQLite 数据库或 dumpdata 导出的 JSON 搬到当前配置的数据库 (例如 PostgreSQL)。"
+        "旧数据先在临时 SQLite 里迁移到当前表结构，再用自然键导出、导入目标库，原文件不会被修改。"
+    )
+
+    def add_arguments(self, parser):
+        source = parser.add_mutually_exclusive_group(required=True)
+        source.add_argument('--from-sqlite', metavar='PATH', help="旧的 SQLite 数据库文件 (如 db.sqlite3)")
+        source.add_argument('--from-fixture', metavar='PATH', help="dumpdata 导出的 JSON (如 data.json)")
+
+    def handle(self, *args, **options):
+        source_path = options['from_sqlite'] or options['from_fixture']
+        if not os.path.exists(source_path):
+            raise CommandError(f"文件不存在: {source_path}")
+
+        call_command('migrate', interactive=False, verbosity=0)
+        if User.objects.exists():
+            raise CommandError("目标数据库里已经有用户数据，为避免覆盖，请换一个空库再导入")
+
+        workdir = tempfile.mkdtemp()
+        try:
+            self.open_source(os.path.join(workdir, 'source.sqlite3'))
+            if options['from_sqlite']:
+                copy_sqlite(source_path, connections[SOURCE_ALIAS].settings_dict['NAME'])
+                # 旧库按迁移升级到当前结构，数据迁移 (如回填练习日期) 一并执行
+                call_command('migrate', database=SOURCE_ALIAS, interactive=False, verbosity=0)
+            else:
+                self.load_fixture(source_path, workdir)
+
+            dump_path = os.path.join(workdir, 'dump.json')
+            call_command(
+                'dumpdata', database=SOURCE_ALIAS, output=dump_path,
+                natural_foreign=True, natural_primary=True, exclude=DERIVED_MODELS, verbosity=0,
+            )
+            call_command('loaddata', dump_path, verbosity=0)
+        finally:
+            self.close_source()
+            shutil.rmtree(workdir, ignore_errors=True)
+
+        # 汇总表是派生数据，按导入后的录音重算
+        rebuild_daily_stats()
+        self.stdout.write(self.style.SUCCESS(
+            f"导入完成：{User.objects.count()} 个用户，{PracticeRecord.objects.count()} 条录音"
+        ))
+
+    def open_source(self, path):
+        # 临时建一个数据库连接 (不写进 settings.DATABASES)，migrate / dumpdata 用 database= 指定它
+        settings_dict = connections.configure_settings({
+            **connections.settings,
+            SOURCE_ALIAS: {'ENGINE': 'django.db.backends.sqlite3', 'NAME': path},
+        })[SOURCE_ALIAS]
+        connections[SOURCE_ALIAS] = load_backend(settings_dict['ENGINE']).DatabaseWrapper(settings_dict, SOURCE_ALIAS)
+
+    def close_source(self):
+        try:
+            connection = connections[SOURCE_ALIAS]
+        except ConnectionDoesNotExist:
+            return
+        connection.close()
+        del connections[SOURCE_ALIAS]
+
+    def load_fixture(self, fixture_path, workdir):
+        """
+        JSON 可能是旧版本导出的：先建最新结构的临时库，忽略已删除的字段导入；
+        导出时的内容类型 / 权限主键与新库对不上，跳过它们和引用它们的后台操作日志。
+        """
+        call_command('migrate', database=SOURCE_ALIAS, interactive=False, verbosity=0)
+        upgraded_path = os.path.join(workdir, 'fixture.json')
+        with open(fixture_path, encoding='utf-8') as src, open(upgraded_path, 'w', encoding='utf-8') as dst:
+            json.dump(fill_timestamps(json.load(src)), dst, ensure_ascii=False)
+        call_command(
+            'loaddata', upgraded_path, database=SOURCE_ALIAS, ignorenonexistent=True,
+            exclude=[*DERIVED_MODELS, 'admin.logentry'], verbosity=0,
+        )
+        # 导入不经过 save()，新增的练习日期字段按提交时间补齐 (同迁移 0016)
+        PracticeRecord.objects.using(SOURCE_ALIAS).update(practice_date=TruncDate('submitted_at'))
+
+
+def copy_sqlite(source_path, dest_path):
+    """用 SQLite 的备份接口复制：WAL 模式下还没写回主文件的数据 (-wal 文件) 也会带上"""
+    with closing(sqlite3.connect(source_path)) as src, closing(sqlite3.connect(dest_path)) as dst:
+        src.backup(dst)
+
+
+def fill_timestamps(objects):
+    """
+    导入时不会自动填 auto_now / auto_now_add 字段 (如后来新增的 updated_at)，
+    旧 JSON 里没有这些字段时填当前时间，其余缺少的字段由模型默认值补上。
+    """
+    now = timezone.now().isoformat()
+    for obj in objects:
+        try:
+            model = apps.get_model(obj['model'])
+        except LookupError:
+            continue
+        for field in model._meta.concrete_fields:
+            if (getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False)) \
+                    and field.name not in obj['fields']:
+                obj['fields'][field.name] = now
+    return objects
@@ -0,0 +1,110 @@
+import hashlib
+import json
+
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import cc_delim_re, get_conditional_response, patch_cache_control
+from django.utils import timezone
+from django.utils.deprecation import MiddlewareMixin
+from django.utils.http import quote_etag
+
+from .caching import get_generation, USER
+
+# ==========================================
+# 内容接口响应缓存 (ETag / 304)
+# ==========================================
+#
+# 用 @content_cache(...) 标记的 GET 视图：响应体按 (地址, 相关数据的缓存代号) 存进缓存，
+# 重复请求直接从缓存返回，不执行视图、不查内容表；
+# ETag 取响应体的哈希，客户端带 If-None-Match 且未变化时返回 304。
+# 数据变化时代号会变 (见 signals)，缓存键随之更换。
+#
+# 缓存命中时视图不执行，登录检查也跳过，所以键里总带着登录身份 (未登录 / 学员 / 老师，
+# USER 范围再细到学员本人)，未登录的请求拿不到登录后的响应。
+# 只存成功的响应：200、JSON 的 status 不是 error、不设 Cookie；
+# 响应按 Cookie 以外的请求头变化 (Vary) 时键里区分不了，不存。
+
+RESPONSE_TIMEOUT = 10 * 60
+
+
+def content_cache(*scopes):
+    """
+    标记可缓存的视图。scopes 为响应依赖的缓存代号范围 (caching.CATALOG / CLASS / USER)，
+    包含 USER 时按登录学员和日期分别缓存。
+    """
+    def decorator(view_func):
+        view_func.content_cache_scopes = scopes
+        return view_func
+    return decorator
+
+
+def _content_etag(content):
+    return quote_etag(hashlib.md5(content).hexdigest())
+
+
+class ContentCacheMiddleware(MiddlewareMixin):
+    """需放在 AuthenticationMiddleware 之后 (按学员缓存时要读 request.user)"""
+
+    def _cache_key(self, request, scopes):
+        user = request.user
+        role = 'staff' if user.is_staff else 'user' if user.is_authenticated else 'anon'
+        parts = [request.get_host(), request.get_full_path(), role]
+        for scope in scopes:
+            if scope == USER:
+                user_id = request.user.pk if request.user.is_authenticated else None
+                parts += [f'u{user_id}', get_generation(USER, user_id) if user_id else '-']
+                # 学员相关内容 (如本周最佳录音) 按周 / 按天变化，跨天换键
+                parts.append(timezone.localdate())
+            else:
+                parts.append(get_generation(scope))
+        digest = hashlib.md5(':'.join(map(str, parts)).encode()).hexdigest()
+        return f'resp:{digest}'
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        scopes = getattr(view_func, 'content_cache_scopes', None)
+        if scopes is None or request.method not in ('GET', 'HEAD'):
+            return None
+
+        key = self._cache_key(request, scopes)
+        cached = cache.get(key)
+        if cached is None:
+            request._content_cache_key = key
+            return None
+
+        response = HttpResponse(cached['content'], content_type=cached['content_type'])
+        return self._finalize(request, response, cached['etag'])
+
+    def process_response(self, request, response):
+        key = getattr(request, '_content_cache_key', None)
+        if key is None or not self._cacheable(response):
+            return response
+        etag = _content_etag(response.content)
+        cache.set(key, {
+            'content': response.content,
+            'content_type': response['Content-Type'],
+            'etag': etag,
+        }, RESPONSE_TIMEOUT)
+        return self._finalize(request, response, etag)
+
+    def _cacheable(self, response):
+        if response.status_code != 200 or response.streaming or response.cookies:
+            return False
+        # 登录身份已经在键里，Vary: Cookie 不影响；其他请求头 (如 Accept-Language) 区分不了
+        vary = {header.lower() for header in cc_delim_re.split(response.get('Vary', '')) if header}
+        if vary - {'cookie'}:
+            return False
+        if response.get('Content-Type', '').startswith('application/json'):
+            try:
+                payload = json.loads(response.content)
+            except ValueError:
+                return False
+            # 接口的错误也是 200 + {"status": "error"} (如"练习不存在")，不缓存
+            if isinstance(payload, dict) and payload.get('status') == 'error':
+                return False
+        return True
+
+    def _finalize(self, request, response, etag):
+        response['ETag'] = etag
+        # 允许客户端保存，但每次使用前都要带 ETag 来验证
+        patch_cache_control(response, private=True, no_cache=True)
+        return get_conditional_response(request, etag=etag, response=response) or response
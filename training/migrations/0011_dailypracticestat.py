@@ -0,0 +1,35 @@
+# Generated by Django 5.2.9 on 2026-10-17 11:28
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('training', '0010_exercise_is_advanced'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyPracticeStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='日期')),
+                ('recordings', models.IntegerField(default=0, verbose_name='录音数')),
+                ('exercise_count', models.IntegerField(default=0, verbose_name='完成练习数')),
+                ('advanced_count', models.IntegerField(default=0, verbose_name='进阶练习数')),
+                ('is_submitted', models.BooleanField(default=False, verbose_name='是否已提交')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='更新时间')),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_stats', to=settings.AUTH_USER_MODEL, verbose_name='学员')),
+            ],
+            options={
+                'verbose_name': '每日练习汇总',
+                'verbose_name_plural': '每日练习汇总',
+                'indexes': [models.Index(fields=['date'], name='training_da_date_a0cd4a_idx')],
+                'unique_together': {('student', 'date')},
+            },
+        ),
+    ]
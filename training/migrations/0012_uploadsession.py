@@ -0,0 +1,35 @@
+# Generated by Django 5.2.9 on 2026-10-17 11:33
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('training', '0011_dailypracticestat'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UploadSession',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('filename', models.CharField(max_length=255, verbose_name='原始文件名')),
+                ('total_size', models.BigIntegerField(verbose_name='文件大小')),
+                ('received_ranges', models.JSONField(blank=True, default=list, verbose_name='已接收区间')),
+                ('is_finished', models.BooleanField(default=False, verbose_name='是否已完成')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='创建时间')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='更新时间')),
+                ('exercise', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='training.exercise', verbose_name='练习项目')),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='upload_sessions', to=settings.AUTH_USER_MODEL, verbose_name='学员')),
+            ],
+            options={
+                'verbose_name': '分片上传',
+                'verbose_name_plural': '分片上传',
+            },
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.9 on 2026-10-17 11:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('training', '0013_job'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='practicerecord',
+            name='audio_bitrate',
+            field=models.IntegerField(blank=True, null=True, verbose_name='码率'),
+        ),
+        migrations.AddField(
+            model_name='practicerecord',
+            name='audio_codec',
+            field=models.CharField(blank=True, default='', max_length=50, verbose_name='编码'),
+        ),
+        migrations.AddField(
+            model_name='practicerecord',
+            name='audio_duration',
+            field=models.FloatField(blank=True, null=True, verbose_name='时长(秒)'),
+        ),
+        migrations.AddField(
+            model_name='practicerecord',
+            name='playback_audio',
+            field=models.FileField(blank=True, null=True, upload_to='student_audios/playback/', verbose_name='播放版本'),
+        ),
+    ]
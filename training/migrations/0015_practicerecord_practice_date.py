@@ -0,0 +1,37 @@
+# Generated by Django 5.2.9 on 2026-10-17 11:42
+
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('training', '0014_practicerecord_audio_metadata'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='practicerecord',
+            name='practice_date',
+            field=models.DateField(default=django.utils.timezone.localdate, editable=False, verbose_name='练习日期'),
+        ),
+        migrations.AddIndex(
+            model_name='practicerecord',
+            index=models.Index(fields=['student', 'submitted_at'], name='training_pr_student_ffc968_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='practicerecord',
+            index=models.Index(fields=['student', 'exercise', 'submitted_at'], name='training_pr_student_2d425c_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='practicerecord',
+            index=models.Index(fields=['student', 'practice_date'], name='training_pr_student_fdfd40_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='practicerecord',
+            index=models.Index(fields=['submitted_at'], name='training_pr_submitt_5ddf75_idx'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+from django.db import migrations
+from django.db.models.functions import TruncDate
+
+
+def backfill_practice_date(apps, schema_editor):
+    """按提交时间回填练习日期 (TruncDate 按 settings.TIME_ZONE 换算成本地日期，一条 UPDATE 完成)"""
+    PracticeRecord = apps.get_model('training', 'PracticeRecord')
+    PracticeRecord.objects.update(practice_date=TruncDate('submitted_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('training', '0015_practicerecord_practice_date'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_practice_date, migrations.RunPython.noop),
+    ]
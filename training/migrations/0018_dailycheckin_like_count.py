@@ -0,0 +1,31 @@
+# Generated by Django 5.2.9 on 2026-10-17 12:08
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_like_count(apps, schema_editor):
+    """按关联表统计已有的点赞数 (一条 UPDATE 完成)"""
+    DailyCheckIn = apps.get_model('training', 'DailyCheckIn')
+    Like = DailyCheckIn.likes.through
+    counts = Like.objects.filter(dailycheckin=OuterRef('pk')).values('dailycheckin').annotate(
+        n=Count('id')
+    ).values('n')
+    DailyCheckIn.objects.update(like_count=Coalesce(Subquery(counts), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('training', '0017_exercise_announcement_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dailycheckin',
+            name='like_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='点赞数'),
+        ),
+        migrations.RunPython(backfill_like_count, migrations.RunPython.noop),
+    ]
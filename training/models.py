@@ -1,7 +1,11 @@
 from django.db import models
 from django.contrib.auth.models import User
+from django.utils import timezone
 from ckeditor_uploader.fields import RichTextUploadingField
 import datetime
+import uuid
+
+from .streaming import audio_url, peaks_url
 
 # 1. 练习内容模型
 class Exercise(models.Model):
@@ -11,6 +15,16 @@ class Exercise(models.Model):
     order = models.IntegerField("排序", default=1)
     is_advanced = models.BooleanField("进阶练习", default=False, 
         help_text="勾选后此练习不计入每日打卡，但仍给经验值")
+    # 内容修改时间 (接口的 ETag / Last-Modified 依据)
+    updated_at = models.DateTimeField("更新时间", auto_now=True)
+
+    @property
+    def demo_audio_url(self):
+        return audio_url('demo', self.id, self.demo_audio)
+
+    @property
+    def demo_peaks_url(self):
+        return peaks_url('demo', self.id, self.demo_audio)
 
     def __str__(self):
         prefix = "【进阶】" if self.is_advanced else ""
@@ -33,12 +47,22 @@ class DailyCheckIn(models.Model):
 
     # 新增：点赞功能 (多对多关联)
     likes = models.ManyToManyField(User, related_name='liked_checkins', blank=True, verbose_name="点赞用户")
+    # 点赞数冗余存一份，点赞 / 取消时随之更新 (见 likes.py 和 signals)，展示时不用再数关联表
+    like_count = models.PositiveIntegerField("点赞数", default=0, editable=False)
 
     created_at = models.DateTimeField("创建时间", auto_now_add=True)
 
     # 辅助方法：统计点赞数
     def total_likes(self):
-        return self.likes.count()
+        return self.like_count
+
+    @property
+    def teacher_audio_url(self):
+        return audio_url('summary', self.id, self.teacher_audio)
+
+    @property
+    def teacher_peaks_url(self):
+        return peaks_url('summary', self.id, self.teacher_audio)
 
     def __str__(self):
         status = "✅已提交" if self.is_submitted else "📝草稿中"
@@ -61,16 +85,65 @@ class PracticeRecord(models.Model):
     student_audio = models.FileField("学员录音", upload_to='student_audios/', blank=True, null=True)
 
     submitted_at = models.DateTimeField("提交时间", auto_now=True)
+    # 提交时间对应的本地日期，按天统计和分组时直接用它，不必在查询里做时区换算
+    practice_date = models.DateField("练习日期", default=timezone.localdate, editable=False)
 
     teacher_comment_text = models.TextField("单句点评", blank=True, null=True)
     teacher_comment_audio = models.FileField("语音点评", upload_to='teacher_audios/', blank=True, null=True)
 
+    # 录音参数与统一的播放版本 (由后台任务 process_audio 生成)
+    audio_duration = models.FloatField("时长(秒)", null=True, blank=True)
+    audio_codec = models.CharField("编码", max_length=50, blank=True, default="")
+    audio_bitrate = models.IntegerField("码率", null=True, blank=True)
+    playback_audio = models.FileField("播放版本", upload_to='student_audios/playback/', blank=True, null=True)
+
+    @property
+    def playback_file(self):
+        """播放和下载优先用转码后的版本，还没处理完时用原始录音"""
+        return self.playback_audio or self.student_audio
+
+    @property
+    def playback_url(self):
+        return audio_url('record', self.id, self.playback_file)
+
+    @property
+    def comment_audio_url(self):
+        return audio_url('comment', self.id, self.teacher_comment_audio)
+
+    @property
+    def audio_peaks_url(self):
+        # 峰值按原始录音生成 (见 peaks.PEAK_SOURCES)
+        return peaks_url('record', self.id, self.student_audio)
+
+    @property
+    def comment_peaks_url(self):
+        return peaks_url('comment', self.id, self.teacher_comment_audio)
+
+    def save(self, *args, **kwargs):
+        # submitted_at 是 auto_now，每次保存都会变成当前时间，练习日期跟着更新
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or 'submitted_at' in update_fields:
+            self.practice_date = timezone.localdate()
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'practice_date'}
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return f"{self.student.username} - {self.exercise.title}"
 
     class Meta:
         verbose_name = "单条录音"
         verbose_name_plural = "单条录音"
+        indexes = [
+            # 学员某段时间的录音 (今日 / 本周 / 历史)
+            models.Index(fields=['student', 'submitted_at']),
+            # 学员本周某个练习的最佳录音
+            models.Index(fields=['student', 'exercise', 'submitted_at']),
+            # 按天汇总
+            models.Index(fields=['student', 'practice_date']),
+            # 全班当天 / 本周的录音
+            models.Index(fields=['submitted_at']),
+        ]
 
 # 4. 公告与阅读记录模型
 class Announcement(models.Model):
@@ -78,8 +151,13 @@ class Announcement(models.Model):
     content = RichTextUploadingField("公告内容")
     audio_file = models.FileField("语音通知", upload_to='announcement_audios/%Y/%m/', blank=True, null=True)
     created_at = models.DateTimeField("发布时间", auto_now_add=True)
+    updated_at = models.DateTimeField("更新时间", auto_now=True)
     created_by = models.ForeignKey(User, on_delete=models.CASCADE, verbose_name="发布人")
 
+    @property
+    def audio_file_url(self):
+        return audio_url('announcement', self.id, self.audio_file)
+
     def __str__(self):
         return self.title
 
@@ -232,3 +310,101 @@ class Encouragement(models.Model):
         verbose_name_plural = "鼓励消息"
         ordering = ['-created_at']
 
+
+
+# ==========================================
+# 7. 统计汇总模型
+# ==========================================
+
+class DailyPracticeStat(models.Model):
+    """学员每日练习汇总 (由上传/删除/提交接口增量维护，可用 rebuild_practice_stats 命令重建)"""
+    student = models.ForeignKey(User, on_delete=models.CASCADE, related_name='daily_stats', verbose_name="学员")
+    date = models.DateField("日期")
+    recordings = models.IntegerField("录音数", default=0)
+    exercise_count = models.IntegerField("完成练习数", default=0)
+    advanced_count = models.IntegerField("进阶练习数", default=0)
+    is_submitted = models.BooleanField("是否已提交", default=False)
+    updated_at = models.DateTimeField("更新时间", auto_now=True)
+
+    @property
+    def normal_count(self):
+        """普通练习完成数"""
+        return self.exercise_count - self.advanced_count
+
+    def __str__(self):
+        return f"[{self.date}] {self.student.username} - {self.recordings} 条"
+
+    class Meta:
+        verbose_name = "每日练习汇总"
+        verbose_name_plural = "每日练习汇总"
+        unique_together = ('student', 'date')
+        indexes = [models.Index(fields=['date'])]
+
+
+# ==========================================
+# 8. 分片上传
+# ==========================================
+
+class UploadSession(models.Model):
+    """分片 / 断点续传上传会话"""
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    student = models.ForeignKey(User, on_delete=models.CASCADE, related_name='upload_sessions', verbose_name="学员")
+    exercise = models.ForeignKey(Exercise, on_delete=models.CASCADE, verbose_name="练习项目")
+    filename = models.CharField("原始文件名", max_length=255)
+    total_size = models.BigIntegerField("文件大小")
+    # 已收到的字节区间 [[start, end), ...]，按 start 排序且互不重叠
+    received_ranges = models.JSONField("已接收区间", default=list, blank=True)
+    is_finished = models.BooleanField("是否已完成", default=False)
+    created_at = models.DateTimeField("创建时间", auto_now_add=True)
+    updated_at = models.DateTimeField("更新时间", auto_now=True)
+
+    def received_bytes(self):
+        return sum(end - start for start, end in self.received_ranges)
+
+    def is_complete(self):
+        return self.received_ranges == [[0, self.total_size]]
+
+    def __str__(self):
+        return f"{self.student.username} - {self.filename} ({self.received_bytes()}/{self.total_size})"
+
+    class Meta:
+        verbose_name = "分片上传"
+        verbose_name_plural = "分片上传"
+
+
+# ==========================================
+# 9. 后台任务队列
+# ==========================================
+
+class Job(models.Model):
+    """后台任务 (由 run_jobs 命令的 worker 执行，失败自动重试)"""
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, '等待中'),
+        (RUNNING, '执行中'),
+        (DONE, '已完成'),
+        (FAILED, '失败'),
+    ]
+
+    kind = models.CharField("任务类型", max_length=50)
+    payload = models.JSONField("参数", default=dict, blank=True)
+    owner = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True, related_name='jobs', verbose_name="所属用户")
+    status = models.CharField("状态", max_length=20, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.IntegerField("已尝试次数", default=0)
+    max_attempts = models.IntegerField("最大尝试次数", default=3)
+    run_after = models.DateTimeField("最早执行时间", default=timezone.now)
+    result = models.JSONField("结果", null=True, blank=True)
+    last_error = models.TextField("最近错误", blank=True, default="")
+    created_at = models.DateTimeField("创建时间", auto_now_add=True)
+    updated_at = models.DateTimeField("更新时间", auto_now=True)
+
+    def __str__(self):
+        return f"#{self.id} {self.kind} ({self.get_status_display()})"
+
+    class Meta:
+        verbose_name = "后台任务"
+        verbose_name_plural = "后台任务"
+        indexes = [models.Index(fields=['status', 'run_after'])]
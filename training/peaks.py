@@ -0,0 +1,139 @@
+import json
+import subprocess
+import wave
+
+import numpy as np
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+
+from .audio import ffmpeg_binary, has_ffmpeg, AudioProcessingError, TIMEOUT
+from .models import PracticeRecord, DailyCheckIn, Exercise, Announcement
+
+# ==========================================
+# 波形峰值：音频 -> 降采样振幅包络 (JSON 旁路文件)
+# ==========================================
+
+PEAKS_VERSION = 1
+PEAKS_DIR = 'peaks'
+# 每秒 20 个峰值，3 分钟的录音约 3600 个点
+PEAKS_PER_SECOND = 20
+# 解码采样率：画波形不需要更高
+DECODE_RATE = 8000
+CACHE_TIMEOUT = 24 * 60 * 60
+
+# 可生成波形的音频: kind -> (模型, 文件字段)
+PEAK_SOURCES = {
+    'record': (PracticeRecord, 'student_audio'),
+    'comment': (PracticeRecord, 'teacher_comment_audio'),
+    'summary': (DailyCheckIn, 'teacher_audio'),
+    'demo': (Exercise, 'demo_audio'),
+    'announcement': (Announcement, 'audio_file'),
+}
+
+
+def source_file(kind, obj_id):
+    model, field_name = PEAK_SOURCES[kind]
+    obj = model.objects.filter(id=obj_id).first()
+    return getattr(obj, field_name) if obj else None
+
+
+def sidecar_name(field_file):
+    """峰值文件跟着音频文件名走：重新上传后文件名变了，旧的峰值自然失效"""
+    return f'{PEAKS_DIR}/{field_file.name}.json'
+
+
+def cache_key(name):
+    return f'peaks:v{PEAKS_VERSION}:{name}'
+
+
+def decode_pcm(path):
+    """解码为单声道 int16 采样，返回 (samples, sample_rate)"""
+    if has_ffmpeg():
+        try:
+            raw = subprocess.run(
+                [ffmpeg_binary(), '-v', 'error', '-i', path,
+                 '-ac', '1', '-ar', str(DECODE_RATE), '-f', 's16le', '-'],
+                capture_output=True, check=True, timeout=TIMEOUT,
+            ).stdout
+        except subprocess.SubprocessError as e:
+            raise AudioProcessingError(f"解码失败: {e}")
+        return np.frombuffer(raw, dtype='<i2'), DECODE_RATE
+
+    # 没有 ffmpeg 时只支持 16bit WAV
+    try:
+        with wave.open(path, 'rb') as wav:
+            if wav.getsampwidth() != 2:
+                raise AudioProcessingError("只支持 16bit WAV")
+            channels, rate = wav.getnchannels(), wav.getframerate()
+            samples = np.frombuffer(wav.readframes(wav.getnframes()), dtype='<i2')
+    except (wave.Error, EOFError) as e:
+        raise AudioProcessingError(f"未安装 ffmpeg，无法解码: {e}")
+    if channels > 1:
+        samples = samples.reshape(-1, channels).mean(axis=1).astype(np.int16)
+    return samples, rate
+
+
+def compute_peaks(samples, sample_rate, peaks_per_second=PEAKS_PER_SECOND):
+    """
+    按固定时间窗取最大振幅，缩放到 0-255。
+    整段数组一次 reshape + max，不在 Python 里逐个采样循环。
+    """
+    bucket = max(1, sample_rate // peaks_per_second)
+    if len(samples) == 0:
+        return np.zeros(0, dtype=np.uint8)
+    padded = np.zeros(-(-len(samples) // bucket) * bucket, dtype=np.int32)
+    padded[:len(samples)] = samples
+    # int16 的 -32768 取绝对值会溢出，先转 int32
+    envelope = np.abs(padded).reshape(-1, bucket).max(axis=1)
+    return np.minimum(envelope * 255 // 32767, 255).astype(np.uint8)
+
+
+def build_peaks(field_file):
+    samples, rate = decode_pcm(field_file.path)
+    peaks = compute_peaks(samples, rate)
+    return {
+        'version': PEAKS_VERSION,
+        'duration': round(len(samples) / rate, 3) if rate else 0,
+        'peaks_per_second': PEAKS_PER_SECOND,
+        'peaks': peaks.tolist(),
+    }
+
+
+def generate_peaks(field_file, force=False):
+    """计算并写入旁路文件，已存在时直接跳过 (force 重新生成)"""
+    name = sidecar_name(field_file)
+    if not force and default_storage.exists(name):
+        return name
+    data = build_peaks(field_file)
+    if default_storage.exists(name):
+        default_storage.delete(name)
+    default_storage.save(name, ContentFile(json.dumps(data, separators=(',', ':')).encode()))
+    cache.set(cache_key(name), data, CACHE_TIMEOUT)
+    return name
+
+
+def load_peaks(field_file):
+    """读取峰值：先查缓存，再读旁路文件；都没有返回 None"""
+    name = sidecar_name(field_file)
+    data = cache.get(cache_key(name))
+    if data is not None:
+        return data
+    if not default_storage.exists(name):
+        return None
+    with default_storage.open(name, 'rb') as fh:
+        data = json.loads(fh.read())
+    cache.set(cache_key(name), data, CACHE_TIMEOUT)
+    return data
+
+
+def generate_peaks_batch(field_files, force=False):
+    """批量生成，返回 (成功数, [(文件名, 错误)])"""
+    done, errors = 0, []
+    for field_file in field_files:
+        try:
+            generate_peaks(field_file, force=force)
+            done += 1
+        except (AudioProcessingError, OSError) as e:
+            errors.append((field_file.name, str(e)))
+    return done, errors
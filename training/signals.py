@@ -0,0 +1,106 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, m2m_changed
+from django.dispatch import receiver
+
+from .announcements import forget_announcement_ids
+from .caching import invalidate_student, invalidate_users, invalidate_class, invalidate_catalog
+from .images import needs_rewrite
+from .jobs import enqueue
+from .likes import refresh_like_counts
+from .models import (
+    PracticeRecord, DailyCheckIn, StudentAchievement, Encouragement, BuddyPair, Announcement,
+    DailyPracticeStat, Exercise
+)
+
+# ==========================================
+# 数据变化 -> 页面缓存失效
+# ==========================================
+# 注意 queryset.update() / bulk_create() 不发信号，这类写入要自己调用 caching 里的失效函数
+
+
+@receiver([post_save, post_delete], sender=PracticeRecord)
+def record_changed(sender, instance, **kwargs):
+    # 今日完成情况、伙伴进度，以及全班今日动态
+    invalidate_student(instance.student_id)
+    invalidate_class()
+
+
+@receiver([post_save, post_delete], sender=DailyPracticeStat)
+def daily_stat_changed(sender, instance, **kwargs):
+    # 汇总行在录音 / 打卡保存之后才刷新 (提交打卡、后台任务、全量重建)，
+    # 全班打卡人数和学员首页的完成数 / 提交状态都要等它写完再重算
+    invalidate_class()
+    invalidate_users(instance.student_id)
+
+
+@receiver([post_save, post_delete], sender=DailyCheckIn)
+def checkin_changed(sender, instance, created=False, **kwargs):
+    # 首页第一次打开时建的空打卡 (未提交) 不影响已缓存的内容，不必失效
+    if created and not instance.is_submitted:
+        return
+    invalidate_users(instance.student_id)
+
+
+@receiver([post_save, post_delete], sender=StudentAchievement)
+def achievement_changed(sender, instance, **kwargs):
+    invalidate_users(instance.student_id)
+
+
+@receiver([post_save, post_delete], sender=Encouragement)
+def encouragement_changed(sender, instance, **kwargs):
+    # 未读数显示在收信方首页，发送方和收信方都刷新
+    pair = BuddyPair.objects.filter(id=instance.pair_id).values_list('student_a_id', 'student_b_id').first()
+    if pair:
+        invalidate_users(*pair)
+
+
+@receiver([post_save, post_delete], sender=BuddyPair)
+def pair_changed(sender, instance, **kwargs):
+    invalidate_users(instance.student_a_id, instance.student_b_id)
+
+
+@receiver([post_save, post_delete], sender=Announcement)
+def announcement_changed(sender, instance, created=True, **kwargs):
+    invalidate_class()
+    # 新增 / 删除公告时学员的未读数跟着变 (post_delete 没有 created 参数)
+    if created:
+        forget_announcement_ids()
+
+
+@receiver([post_save, post_delete], sender=Exercise)
+def exercise_changed(sender, instance, **kwargs):
+    # 换新的目录版本号，所有进程的内存目录随之失效
+    invalidate_catalog()
+
+
+# ==========================================
+# 点赞关联表变化 -> 重算冗余的点赞数
+# ==========================================
+# toggle_like 直接操作关联表并自己更新计数，不经过这里；
+# 后台编辑或代码里 likes.add / remove / clear (包括从 user.liked_checkins 反向操作) 时在这里重算。
+
+@receiver(m2m_changed, sender=DailyCheckIn.likes.through)
+def likes_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if reverse:
+        # instance 是用户，pk_set 是打卡；clear 时先记下这个用户点过赞的打卡
+        if action == 'pre_clear':
+            instance._cleared_like_ids = list(instance.liked_checkins.values_list('id', flat=True))
+        elif action == 'post_clear':
+            refresh_like_counts(getattr(instance, '_cleared_like_ids', []))
+        elif action in ('post_add', 'post_remove'):
+            refresh_like_counts(pk_set)
+    elif action in ('post_add', 'post_remove', 'post_clear'):
+        refresh_like_counts([instance.pk])
+
+
+# ==========================================
+# 练习 / 公告正文里的新图片 -> 后台生成多尺寸版本
+# ==========================================
+
+@receiver(post_save, sender=Exercise)
+@receiver(post_save, sender=Announcement)
+def content_saved(sender, instance, raw=False, **kwargs):
+    # loaddata 导入 (raw) 时不排任务
+    if not raw and needs_rewrite(instance.content):
+        kind = 'exercise' if sender is Exercise else 'announcement'
+        transaction.on_commit(lambda: enqueue('optimize_content_images', {'kind': kind, 'obj_id': instance.id}))
@@ -0,0 +1,564 @@
+/* =========================================
+   练习详情页：录音、上传、横屏模式
+   依赖 recorder.js；页面参数来自模板里的 #exercise-config
+   ========================================= */
+
+// === 全局变量 ===
+const pageConfig = JSON.parse(document.getElementById('exercise-config').textContent);
+// 关闭所有自动音频处理，保留原始声音；设置高比特率
+const recorder = new AudioRecorder({
+    audio: { echoCancellation: false, noiseSuppression: false, autoGainControl: false, channelCount: 1 },
+    audioBitsPerSecond: 128000
+});
+let currentAudioBlob = null;
+let isRecording = false;
+
+// === 工具函数 ===
+function isWeChat() {
+    return /MicroMessenger/i.test(navigator.userAgent);
+}
+
+// 经验结算在后台任务里：上传接口只返回 job_id，轮询任务状态拿到结算结果。
+// 任务已同步执行完 (接口直接带了 exp_earned) 时不再轮询；超时或失败时返回 null
+const JOB_POLL_INTERVAL = 500;
+const JOB_POLL_LIMIT = 20;
+
+function waitForGamification(data) {
+    if (data.exp_earned !== undefined) return Promise.resolve(data);
+    if (!data.job_id) return Promise.resolve(null);
+    const url = pageConfig.jobStatusUrl.replace('{id}', data.job_id);
+    return new Promise(resolve => {
+        let tries = 0;
+        const poll = () => {
+            fetch(url, { credentials: 'same-origin' })
+                .then(response => response.json())
+                .then(res => {
+                    const state = res.status === 'success' ? res.job.state : 'failed';
+                    if (state === 'done') return resolve(res.job.result);
+                    if (state === 'failed' || ++tries >= JOB_POLL_LIMIT) return resolve(null);
+                    setTimeout(poll, JOB_POLL_INTERVAL);
+                })
+                .catch(() => resolve(null));
+        };
+        poll();
+    });
+}
+
+// 上传成功：等经验结算完显示 XP 和连续天数，然后回首页
+function finishUpload(data, msg) {
+    return waitForGamification(data).then(result => {
+        if (result && result.exp_earned) msg += ` (+${result.exp_earned} XP)`;
+        if (result && result.streak_days > 1) msg += ` 🔥 已连续 ${result.streak_days} 天`;
+        showToast(msg, "success");
+        setTimeout(() => {
+            window.location.href = pageConfig.dashboardUrl;
+        }, 1500);
+    });
+}
+
+// === 1. 初始化 ===
+document.addEventListener("DOMContentLoaded", function() {
+    setupLandscapeImages(); // 提取图片
+
+    // 样式清理
+    var container = document.querySelector('.exercise-content');
+    if (container) {
+        container.querySelectorAll('*').forEach(function(el) {
+            if (el.getAttribute('width')) el.removeAttribute('width');
+            if (el.style.width) el.style.width = 'auto';
+            if (el.tagName === 'IMG') { el.style.maxWidth = '100%'; el.style.height = 'auto'; }
+        });
+    }
+});
+
+// 提取横屏图片逻辑
+function setupLandscapeImages() {
+const originalContent = document.getElementById('original-content');
+const galleryContainer = document.getElementById('landscape-gallery-container');
+const images = originalContent ? originalContent.querySelectorAll('img') : [];
+
+if (!galleryContainer) return;
+
+if (images.length === 0) {
+    // 无图片时添加标记类，让录音区居中
+    document.body.classList.add('no-images');
+    galleryContainer.style.display = 'none';
+    return;
+}
+
+// 有图片时确保移除标记类
+document.body.classList.remove('no-images');
+
+galleryContainer.innerHTML = '';
+images.forEach(img => {
+    const slideDiv = document.createElement('div');
+    slideDiv.className = 'landscape-img-slide';
+    const newImg = img.cloneNode(true);
+    newImg.removeAttribute('width');
+    newImg.removeAttribute('height');
+    slideDiv.appendChild(newImg);
+    galleryContainer.appendChild(slideDiv);
+});
+}
+
+// === 2. 示范音频控制 ===
+function changeSpeed(speed) {
+    const audio = document.getElementById('demoAudioPlayer');
+    if (audio) {
+        audio.playbackRate = speed;
+        document.querySelectorAll('.speed-btn').forEach(btn => {
+            btn.classList.remove('active');
+            if (btn.innerText.includes(speed)) btn.classList.add('active');
+        });
+    }
+}
+
+// === 3. 录音逻辑 ===
+const mainBtn = document.getElementById('recordMainBtn');
+const btnIcon = document.getElementById('btnIcon');
+const btnLabel = document.getElementById('btnLabel');
+const statusText = document.getElementById('statusText');
+const reviewArea = document.getElementById('reviewArea');
+const demoContainer = document.getElementById('demoContainer');
+const recordBtnContainer = document.getElementById('recordBtnContainer');
+
+// 录音时长跟踪
+let recordingDuration = 0;
+let recordingTimer = null;
+const AUTO_UPLOAD_MIN_SECONDS = 10; // 超过10秒自动上传
+
+function toggleRecording() {
+    if (!isRecording) startRecording();
+    else stopRecording();
+}
+
+async function startRecording() {
+    try {
+        await recorder.start();
+        recordingDuration = 0;
+
+        // 更新录音时长显示
+        recordingTimer = setInterval(() => {
+            recordingDuration = recorder.elapsedSeconds;
+            const minutes = Math.floor(recordingDuration / 60);
+            const seconds = recordingDuration % 60;
+            const timeStr = `${minutes}:${seconds.toString().padStart(2, '0')}`;
+            statusText.innerText = `录音中... ${timeStr}`;
+        }, 1000);
+
+        isRecording = true;
+        mainBtn.className = 'record-btn recording';
+        btnIcon.innerText = '■';
+        btnLabel.innerText = '停止';
+        statusText.style.display = 'block';
+        statusText.innerText = "录音中... 0:00";
+        statusText.style.color = "#e74c3c";
+
+        // 同步旋转容器录音按钮状态
+        if (typeof updateWlRecordBtn === 'function') updateWlRecordBtn();
+
+        const demoAudio = document.getElementById('demoAudioPlayer');
+        if(demoAudio) demoAudio.pause();
+        reviewArea.style.display = 'none';
+    } catch (err) {
+        console.error(err);
+        showToast(micErrorMessage(err), "error");
+
+        // 重置按钮状态
+        isRecording = false;
+        mainBtn.className = 'record-btn start';
+        btnIcon.innerText = '🎙️';
+
+        // 同步旋转容器录音按钮状态
+        if (typeof updateWlRecordBtn === 'function') updateWlRecordBtn();
+        btnLabel.innerText = '开始录音';
+        statusText.style.display = 'none';
+    }
+}
+
+recorder.onstop = blob => {
+    // 停止计时
+    if (recordingTimer) {
+        clearInterval(recordingTimer);
+        recordingTimer = null;
+    }
+    recordingDuration = recorder.elapsedSeconds;
+
+    currentAudioBlob = blob;
+    const audioUrl = URL.createObjectURL(currentAudioBlob);
+
+    document.getElementById('audioPreview').src = audioUrl;
+
+    // === 同步更新横屏试听区 ===
+    const wlReviewArea = document.getElementById('wlReviewArea');
+    const wlAudioPreview = document.getElementById('wlAudioPreview');
+    const wlRecordBtnEl = document.getElementById('wlRecordBtn');
+    if (wlReviewArea && wlAudioPreview) {
+        wlAudioPreview.src = audioUrl;
+    }
+
+    // === 核心逻辑：录音超过10秒自动上传 ===
+    if (recordingDuration >= AUTO_UPLOAD_MIN_SECONDS) {
+        // 自动上传
+        showToast(`录音 ${recordingDuration} 秒，正在自动保存...`, "loading");
+        autoUploadRecording();
+    } else {
+        // 不足10秒，显示试听区让用户选择
+        if(demoContainer) demoContainer.style.display = 'none';
+        recordBtnContainer.style.display = 'none';
+        reviewArea.style.display = 'block';
+
+        if (wlReviewArea) {
+            wlReviewArea.style.display = 'block';
+            if (wlRecordBtnEl) wlRecordBtnEl.style.display = 'none';
+        }
+
+        showToast(`录音 ${recordingDuration} 秒，不足10秒，请重录或手动上传`, "error");
+    }
+};
+
+function stopRecording() {
+    if (recorder.isRecording) {
+        recorder.stop();
+        isRecording = false;
+        mainBtn.className = 'record-btn start';
+        btnIcon.innerText = '🎙️';
+        btnLabel.innerText = '重录';
+        
+        // 同步旋转容器录音按钮状态
+        if (typeof updateWlRecordBtn === 'function') updateWlRecordBtn();
+    }
+}
+
+function resetToRecordState() {
+    currentAudioBlob = null;
+    reviewArea.style.display = 'none';
+    if(demoContainer) demoContainer.style.display = 'block';
+    recordBtnContainer.style.display = 'block';
+    statusText.style.display = 'none';
+    statusText.innerText = "";
+    mainBtn.className = 'record-btn start';
+    btnIcon.innerText = '🎙️';
+    btnLabel.innerText = '开始录音';
+}
+
+// === 自动上传录音（录音超过10秒时触发）===
+function autoUploadRecording() {
+    if (!currentAudioBlob) return;
+
+    const formData = new FormData();
+    const timestamp = new Date().getTime();
+    formData.append('audio_file', currentAudioBlob, recorder.filename(`best_${timestamp}`));
+    formData.append('exercise_id', pageConfig.exerciseId);
+
+    fetch(pageConfig.uploadUrl, {
+        method: 'POST',
+        body: formData
+    })
+    .then(response => response.json())
+    .then(data => {
+        if (data.status === 'success') {
+            finishUpload(data, "✅ 练习完成！已自动保存");
+        } else {
+            showToast("自动保存失败: " + data.msg, "error");
+            // 显示试听区让用户手动操作
+            if(demoContainer) demoContainer.style.display = 'none';
+            recordBtnContainer.style.display = 'none';
+            reviewArea.style.display = 'block';
+        }
+    })
+    .catch(err => {
+        console.error('Error:', err);
+        showToast("网络错误，请手动上传", "error");
+        // 显示试听区让用户手动操作
+        if(demoContainer) demoContainer.style.display = 'none';
+        recordBtnContainer.style.display = 'none';
+        reviewArea.style.display = 'block';
+    });
+}
+
+// === 5. 上传录音到作业本 ===
+function uploadBest() {
+    if (!currentAudioBlob) return;
+    const btn = document.querySelector('.btn-upload'); 
+    const originalText = btn.innerText;
+    btn.disabled = true;
+    btn.innerText = "上传中...";
+
+    const formData = new FormData();
+    const timestamp = new Date().getTime();
+    formData.append('audio_file', currentAudioBlob, recorder.filename(`best_${timestamp}`));
+    formData.append('exercise_id', pageConfig.exerciseId);
+
+    fetch(pageConfig.uploadUrl, {
+        method: 'POST',
+        body: formData
+    })
+    .then(response => response.json())
+    .then(data => {
+        if (data.status === 'success') {
+            finishUpload(data, "🎉 " + data.msg);
+        } else {
+            showToast("上传失败: " + data.msg, "error");
+            btn.disabled = false;
+            btn.innerText = originalText;
+        }
+    })
+    .catch(err => {
+        showToast("网络错误，请重试", "error");
+        btn.disabled = false;
+        btn.innerText = originalText;
+    });
+}
+
+// 横屏时防止页面误滚动
+window.addEventListener('orientationchange', () => {
+setTimeout(() => {
+    if (window.matchMedia("(orientation: landscape)").matches) {
+        window.scrollTo(0, 0);
+    }
+}, 300);
+});
+function handleOrientationMode() {
+// 微信环境下，如果已经手动进入横屏模式，就不要自动处理
+if (isWeChat() && document.body.classList.contains('landscape-mode')) {
+    return;
+}
+
+const isLandscape = window.matchMedia("(orientation: landscape)").matches;
+const gallery = document.getElementById('landscape-gallery-container');
+
+if (!gallery) return;
+
+if (isLandscape) {
+    setupLandscapeImages();   // 横屏时重新生成谱子
+    gallery.style.display = 'flex';
+    if (!isWeChat()) {  // 微信环境下不自动添加class
+        document.body.classList.add('landscape-mode');
+    }
+} else {
+    if (!isWeChat()) {  // 微信环境下不自动移除class
+        gallery.style.display = 'none';
+        document.body.classList.remove('landscape-mode');
+    }
+}
+}
+
+// 页面加载 + 方向变化 都要跑（但微信环境下会跳过自动处理）
+window.addEventListener('load', handleOrientationMode);
+window.addEventListener('orientationchange', () => {
+setTimeout(handleOrientationMode, 300);
+});
+// 只在非微信环境下监听resize事件
+if (!isWeChat()) {
+window.addEventListener('resize', handleOrientationMode);
+}
+
+function isLandscapeBySize() {
+return window.innerWidth > window.innerHeight;
+}
+
+function enterLandscapeMode() {
+const wrapper = document.getElementById('wechatLandscapeWrapper');
+
+// 动态设置容器尺寸（解决移动端 vh/vw 不准确问题）
+if (wrapper) {
+    const screenWidth = window.innerWidth;
+    const screenHeight = window.innerHeight;
+    
+    // 旋转后：宽度=屏幕高度，高度=屏幕宽度，左偏移=屏幕宽度
+    wrapper.style.width = screenHeight + 'px';
+    wrapper.style.height = screenWidth + 'px';
+    wrapper.style.left = screenWidth + 'px';
+}
+
+// 获取乐谱图片
+const originalContent = document.getElementById('original-content');
+const wlSheetArea = document.getElementById('wlSheetArea');
+
+if (originalContent && wlSheetArea) {
+    const imgs = originalContent.querySelectorAll('img');
+    if (imgs.length > 0) {
+        // 有图片：复制第一张到旋转容器
+        wlSheetArea.innerHTML = '';
+        const img = document.createElement('img');
+        img.src = imgs[0].src;
+        img.alt = '乐谱';
+        wlSheetArea.appendChild(img);
+        
+        // 移除无乐谱标记
+        if (wrapper) wrapper.classList.remove('no-sheet');
+    } else {
+        // 无图片：显示提示
+        wlSheetArea.innerHTML = '<div class="no-sheet">暂无乐谱图片</div>';
+        if (wrapper) wrapper.classList.add('no-sheet');
+    }
+}
+
+// 添加 landscape-mode 类
+document.body.classList.add('landscape-mode');
+
+// 强制触发重排确保样式生效
+void document.body.offsetHeight;
+}
+
+function exitLandscapeMode() {
+document.body.classList.remove('landscape-mode');
+
+// 如果是微信环境，恢复按钮显示
+if (isWeChat()) {
+const btn = document.getElementById('wechatLandscapeBtn');
+if (btn) {
+    btn.style.display = 'block';
+}
+}
+}
+
+function handleLandscapeLogic() {
+const isLandscape = isLandscapeBySize();
+
+if (isWeChat()) {
+// 微信：不自动进入或退出，保持当前状态
+// 如果已经手动进入横屏模式，就不要自动退出
+return;
+} else {
+// 浏览器：自动
+if (isLandscape) {
+    enterLandscapeMode();
+} else {
+    exitLandscapeMode();
+}
+}
+}
+
+// 只在非微信环境下自动处理横屏
+if (!isWeChat()) {
+window.addEventListener('load', handleLandscapeLogic);
+window.addEventListener('resize', handleLandscapeLogic);
+}
+document.addEventListener('DOMContentLoaded', () => {
+// 微信横屏按钮
+const btn = document.getElementById('wechatLandscapeBtn');
+if (btn) {
+if (isWeChat()) {
+    btn.style.display = 'block';
+}
+btn.addEventListener('click', (e) => {
+    e.preventDefault();
+    e.stopPropagation();
+    enterLandscapeMode();
+});
+}
+
+// 旋转容器关闭按钮
+const closeBtn = document.getElementById('wlCloseBtn');
+if (closeBtn) {
+closeBtn.addEventListener('click', () => {
+    exitLandscapeMode();
+});
+}
+
+// 旋转容器速度控制
+const speedBtns = document.querySelectorAll('.wl-speed-btn');
+const wlDemoAudio = document.getElementById('wlDemoAudio');
+speedBtns.forEach(b => {
+b.addEventListener('click', () => {
+    const speed = parseFloat(b.dataset.speed);
+    if (wlDemoAudio) {
+        wlDemoAudio.playbackRate = speed;
+    }
+    speedBtns.forEach(x => x.classList.remove('active'));
+    b.classList.add('active');
+});
+});
+
+// 旋转容器录音按钮 - 与主录音按钮联动
+const wlRecordBtn = document.getElementById('wlRecordBtn');
+if (wlRecordBtn) {
+wlRecordBtn.addEventListener('click', () => {
+    toggleRecording();
+    // 更新按钮状态
+    updateWlRecordBtn();
+});
+}
+});
+
+// 更新旋转容器录音按钮状态
+function updateWlRecordBtn() {
+const wlRecordBtn = document.getElementById('wlRecordBtn');
+if (!wlRecordBtn) return;
+
+const icon = wlRecordBtn.querySelector('.icon');
+const label = wlRecordBtn.querySelector('.label');
+
+if (isRecording) {
+wlRecordBtn.classList.add('recording');
+if (icon) icon.textContent = '⏹️';
+if (label) label.textContent = '停止';
+} else {
+wlRecordBtn.classList.remove('recording');
+if (icon) icon.textContent = '🎙️';
+if (label) label.textContent = '开始录音';
+}
+}
+
+// 重置横屏录音界面到初始状态
+function resetWlToRecordState() {
+const wlRecordBtn = document.getElementById('wlRecordBtn');
+const wlReviewArea = document.getElementById('wlReviewArea');
+
+if (wlRecordBtn) wlRecordBtn.style.display = 'flex';
+if (wlReviewArea) wlReviewArea.style.display = 'none';
+
+// 同时重置竖屏界面
+resetToRecordState();
+}
+
+// 横屏模式上传录音
+function wlUploadBest() {
+if (!currentAudioBlob) return;
+
+const btn = document.getElementById('wlUploadBtn');
+if (!btn) return;
+
+const originalText = btn.innerText;
+btn.disabled = true;
+btn.innerText = "上传中...";
+
+const formData = new FormData();
+const timestamp = new Date().getTime();
+formData.append('audio_file', currentAudioBlob, recorder.filename(`best_${timestamp}`));
+formData.append('exercise_id', pageConfig.exerciseId);
+
+fetch(pageConfig.uploadUrl, { method: 'POST', body: formData })
+.then(response => response.json())
+.then(data => {
+    btn.disabled = false;
+    btn.innerText = originalText;
+    if (data.status === 'success') {
+        finishUpload(data, "✅ " + data.msg);
+    } else {
+        showToast("上传失败: " + data.msg, "error");
+    }
+})
+.catch(error => {
+    console.error('Error:', error);
+    btn.disabled = false;
+    btn.innerText = originalText;
+    showToast("网络错误，请稍后重试", "error");
+});
+}
+
+// 绑定横屏按钮事件
+document.addEventListener('DOMContentLoaded', function() {
+const wlRetryBtn = document.getElementById('wlRetryBtn');
+const wlUploadBtn = document.getElementById('wlUploadBtn');
+
+if (wlRetryBtn) {
+    wlRetryBtn.addEventListener('click', resetWlToRecordState);
+}
+
+if (wlUploadBtn) {
+    wlUploadBtn.addEventListener('click', wlUploadBest);
+}
+});
@@ -0,0 +1,128 @@
+/* =========================================
+   历史录音无限滚动 (学员 / 老师历史页共用)
+   首屏第一页由模板渲染，滚动到底部时按 next_cursor 从接口取下一页；
+   页面参数来自模板里的 #history-config
+   ========================================= */
+
+const historyConfig = JSON.parse(document.getElementById('history-config').textContent);
+let historyCursor = historyConfig.nextCursor;
+let historyLoading = false;
+let historyObserver = null;
+
+function createElement(tag, className, text) {
+    const el = document.createElement(tag);
+    if (className) el.className = className;
+    if (text !== undefined) el.textContent = text;
+    return el;
+}
+
+// 2025-01-05 -> 2025年01月05日
+function formatHistoryDate(isoDate) {
+    const [y, m, d] = isoDate.split('-');
+    return `${y}年${m}月${d}日`;
+}
+
+// 同一天的录音可能跨两页：已有这一天就接着往里加
+function getDaySection(day) {
+    const list = document.getElementById('history-list');
+    const existing = list.querySelector(`.date-section[data-date="${day.date}"]`);
+    if (existing) return existing.querySelector('.day-records');
+
+    const section = createElement('div', 'date-section');
+    section.dataset.date = day.date;
+    const header = createElement('div', 'date-header');
+    header.append(`📅 ${formatHistoryDate(day.date)} (`, createElement('span', 'day-count', day.count), ' 条)');
+    if (historyConfig.weekExportUrl) {
+        const link = createElement('a', '', '📦 下载该周');
+        link.href = `${historyConfig.weekExportUrl}?week=${day.date}`;
+        link.style.cssText = 'float: right; font-size: 0.85rem;';
+        header.appendChild(link);
+    }
+    const records = createElement('div', 'day-records');
+    section.append(header, records);
+    list.appendChild(section);
+    return records;
+}
+
+function createRecordCard(record) {
+    const card = createElement('div', 'record-card');
+    card.id = `record-${record.id}`;
+
+    const header = createElement('div', 'record-header');
+    const meta = createElement('div', 'record-meta');
+    meta.appendChild(createElement('span', 'record-time', record.time));
+    if (historyConfig.canDelete) {
+        const btn = createElement('button', 'btn-delete-sm', '🗑️ 删除');
+        btn.addEventListener('click', () => deleteRecord(record.id));
+        meta.appendChild(btn);
+    }
+    header.append(createElement('h5', 'exercise-title', record.exercise_title), meta);
+
+    const player = createElement('div', 'audio-player-wrapper');
+    const audio = createElement('audio');
+    audio.controls = true;
+    audio.preload = 'none';
+    audio.src = record.playback_url;
+    player.appendChild(audio);
+    if (record.peaks_url) {
+        const waveform = createElement('canvas', 'waveform');
+        waveform.dataset.peaksUrl = record.peaks_url;
+        waveform.hidden = true;
+        player.appendChild(waveform);
+    }
+
+    card.append(header, player);
+    return card;
+}
+
+async function loadMoreHistory() {
+    if (historyLoading || !historyCursor) return;
+    historyLoading = true;
+    const sentinel = document.getElementById('history-sentinel');
+    sentinel.textContent = '加载中...';
+    try {
+        const res = await fetch(`${historyConfig.apiUrl}?cursor=${encodeURIComponent(historyCursor)}`);
+        const data = await res.json();
+        if (data.status !== 'success') throw new Error(data.msg);
+        data.days.forEach(day => {
+            const records = getDaySection(day);
+            day.records.forEach(record => {
+                const card = createRecordCard(record);
+                records.appendChild(card);
+                // waveform.js：新加入的录音也画波形
+                if (typeof initWaveforms === 'function') initWaveforms(card);
+            });
+        });
+        historyCursor = data.next_cursor;
+        sentinel.textContent = historyCursor ? '' : '没有更多了';
+        // 这一页太短、底部仍在可视区时不会再触发，重新观察一次
+        if (historyObserver && historyCursor) {
+            historyObserver.unobserve(sentinel);
+            historyObserver.observe(sentinel);
+        }
+    } catch (err) {
+        console.error(err);
+        sentinel.textContent = '加载失败，点击重试';
+    } finally {
+        historyLoading = false;
+    }
+}
+
+document.addEventListener('DOMContentLoaded', () => {
+    const sentinel = document.getElementById('history-sentinel');
+    if (!sentinel) return;
+    if (!historyCursor) {
+        sentinel.style.display = 'none';
+        return;
+    }
+    sentinel.addEventListener('click', loadMoreHistory);
+    if ('IntersectionObserver' in window) {
+        // 距离底部 400px 时提前加载
+        historyObserver = new IntersectionObserver(entries => {
+            if (entries.some(entry => entry.isIntersecting)) loadMoreHistory();
+        }, { rootMargin: '400px' });
+        historyObserver.observe(sentinel);
+    } else {
+        sentinel.textContent = '点击加载更多';
+    }
+});
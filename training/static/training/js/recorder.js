@@ -0,0 +1,126 @@
+/* =========================================
+   公共录音模块 (练习页 / 作业点评 / 分享页点评 / 日报点评 / 老师总结 / 公告录音共用)
+   ========================================= */
+
+// 浏览器支持的录音格式：优先 MP4/AAC (苹果设备)，其次 WebM/Opus (安卓/Chrome)
+function detectRecordingFormat() {
+    if (typeof MediaRecorder === 'undefined') return { mimeType: '', extension: 'webm' };
+    if (MediaRecorder.isTypeSupported('audio/mp4')) {
+        return { mimeType: 'audio/mp4', extension: 'm4a' };
+    }
+    if (MediaRecorder.isTypeSupported('audio/webm;codecs=opus')) {
+        return { mimeType: 'audio/webm;codecs=opus', extension: 'webm' };
+    }
+    return { mimeType: 'audio/webm', extension: 'webm' };
+}
+
+// 麦克风错误 -> 提示文字
+function micErrorMessage(err) {
+    switch (err && err.name) {
+        case 'NotAllowedError':
+        case 'PermissionDeniedError':
+            return "请允许浏览器访问麦克风权限";
+        case 'NotFoundError':
+        case 'DevicesNotFoundError':
+            return "未找到麦克风设备";
+        case 'NotReadableError':
+        case 'TrackStartError':
+            return "麦克风被其他应用占用";
+        case 'OverconstrainedError':
+        case 'ConstraintNotSatisfiedError':
+            return "麦克风不支持所需设置";
+        case 'NotSupportedError':
+        case 'TypeError':
+            return "浏览器不支持录音功能，请使用 HTTPS 或 localhost";
+        default:
+            return "无法访问麦克风";
+    }
+}
+
+/**
+ * 一次录音：start() 打开麦克风开始录，stop() 结束并得到 Blob。
+ *
+ *   const recorder = new AudioRecorder({ audio: { echoCancellation: false }, audioBitsPerSecond: 128000 });
+ *   recorder.onstop = blob => { ... };
+ *   await recorder.start();   // 失败抛出 getUserMedia 的错误
+ *   recorder.stop();
+ */
+class AudioRecorder {
+    constructor(options = {}) {
+        this.constraints = options.audio || true;
+        this.audioBitsPerSecond = options.audioBitsPerSecond;
+        this.format = detectRecordingFormat();
+        this.blob = null;
+        this.startedAt = null;
+        this.onstop = null;
+        this._recorder = null;
+        this._chunks = [];
+    }
+
+    get isRecording() {
+        return !!this._recorder && this._recorder.state !== 'inactive';
+    }
+
+    // 已录时长 (秒)
+    get elapsedSeconds() {
+        return this.startedAt ? Math.floor((Date.now() - this.startedAt) / 1000) : 0;
+    }
+
+    // 上传用的文件名，后缀与实际格式一致
+    filename(base) {
+        return `${base}.${this.format.extension}`;
+    }
+
+    async start() {
+        const stream = await navigator.mediaDevices.getUserMedia({ audio: this.constraints });
+        const options = this.format.mimeType ? { mimeType: this.format.mimeType } : {};
+        try {
+            this._recorder = new MediaRecorder(stream,
+                this.audioBitsPerSecond ? { ...options, audioBitsPerSecond: this.audioBitsPerSecond } : options);
+        } catch (e) {
+            // 部分浏览器不接受码率参数
+            this._recorder = new MediaRecorder(stream, options);
+        }
+
+        this._chunks = [];
+        this.blob = null;
+        this._recorder.ondataavailable = event => {
+            if (event.data.size > 0) this._chunks.push(event.data);
+        };
+        this._recorder.onstop = () => {
+            this.blob = new Blob(this._chunks, { type: this.format.mimeType });
+            stream.getTracks().forEach(track => track.stop());
+            if (this.onstop) this.onstop(this.blob);
+        };
+        this._recorder.start();
+        this.startedAt = Date.now();
+    }
+
+    stop() {
+        if (this.isRecording) this._recorder.stop();
+    }
+
+    reset() {
+        this.blob = null;
+    }
+}
+
+// 页面底部的提示条 (#graceToast / #toastMsg，有 #toastIcon 时显示图标)
+function showToast(message, type = 'success') {
+    const toast = document.getElementById('graceToast');
+    if (!toast) return;
+    document.getElementById('toastMsg').innerText = message;
+    const icon = document.getElementById('toastIcon');
+    if (icon) icon.innerText = type === 'error' ? '⚠️' : '✨';
+    toast.classList.add('show');
+    setTimeout(() => toast.classList.remove('show'), 3000);
+}
+
+function getCookie(name) {
+    const prefix = name + '=';
+    for (const cookie of (document.cookie || '').split(';')) {
+        const trimmed = cookie.trim();
+        if (trimmed.startsWith(prefix)) return decodeURIComponent(trimmed.substring(prefix.length));
+    }
+    return null;
+}
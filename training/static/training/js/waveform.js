@@ -0,0 +1,103 @@
+/* =========================================
+   音频波形：按 api_audio_peaks 返回的峰值画在 canvas 上
+   用法：<canvas class="waveform" data-peaks-url="..." [data-audio="播放器 id"]>，
+   不写 data-audio 时对应紧挨在前面的 <audio>。
+   播放器滚动到可见区域时才取峰值 (历史页一页几十条录音)；峰值还没生成 (202) 时隔一会儿再取；
+   点击波形跳转到对应位置，播放时显示进度。动态加入的录音调用 initWaveforms(容器)
+   ========================================= */
+
+const PEAKS_POLL_INTERVAL = 2000;
+const PEAKS_POLL_LIMIT = 10;
+const WAVE_COLOR = 'rgba(44, 62, 80, 0.25)';
+const WAVE_PLAYED_COLOR = '#d4af37';
+
+function fetchPeaks(url) {
+    let tries = 0;
+    return new Promise(resolve => {
+        const poll = () => {
+            fetch(url, { credentials: 'same-origin' })
+                .then(response => {
+                    if (response.status === 202) {
+                        if (++tries >= PEAKS_POLL_LIMIT) return resolve(null);
+                        return setTimeout(poll, PEAKS_POLL_INTERVAL);
+                    }
+                    return response.ok ? response.json().then(resolve) : resolve(null);
+                })
+                .catch(() => resolve(null));
+        };
+        poll();
+    });
+}
+
+function drawWaveform(canvas, peaks, progress) {
+    const ratio = window.devicePixelRatio || 1;
+    const width = canvas.clientWidth, height = canvas.clientHeight;
+    if (canvas.width !== width * ratio) {
+        canvas.width = width * ratio;
+        canvas.height = height * ratio;
+    }
+    const ctx = canvas.getContext('2d');
+    ctx.setTransform(ratio, 0, 0, ratio, 0, 0);
+    ctx.clearRect(0, 0, width, height);
+
+    // 每 3px 一根竖条，取落在这一列里的最大峰值
+    const bars = Math.max(1, Math.floor(width / 3));
+    const perBar = peaks.length / bars;
+    for (let i = 0; i < bars; i++) {
+        const start = Math.floor(i * perBar);
+        const end = Math.max(start + 1, Math.floor((i + 1) * perBar));
+        let peak = 0;
+        for (let j = start; j < end && j < peaks.length; j++) peak = Math.max(peak, peaks[j]);
+        const barHeight = Math.max(1, peak / 255 * height);
+        ctx.fillStyle = i / bars < progress ? WAVE_PLAYED_COLOR : WAVE_COLOR;
+        ctx.fillRect(i * 3, (height - barHeight) / 2, 2, barHeight);
+    }
+}
+
+function waveformAudio(canvas) {
+    if (canvas.dataset.audio) return document.getElementById(canvas.dataset.audio);
+    const previous = canvas.previousElementSibling;
+    return previous && previous.tagName === 'AUDIO' ? previous : null;
+}
+
+function initWaveform(canvas, audio) {
+    fetchPeaks(canvas.dataset.peaksUrl).then(data => {
+        if (!data || !data.peaks.length) return;
+        canvas.hidden = false;
+        const duration = () => audio.duration || data.duration;
+        const redraw = () => drawWaveform(canvas, data.peaks, duration() ? audio.currentTime / duration() : 0);
+
+        redraw();
+        audio.addEventListener('timeupdate', redraw);
+        audio.addEventListener('seeked', redraw);
+        window.addEventListener('resize', redraw);
+        canvas.addEventListener('click', event => {
+            const rect = canvas.getBoundingClientRect();
+            audio.currentTime = (event.clientX - rect.left) / rect.width * duration();
+            redraw();
+        });
+    });
+}
+
+// 隐藏的 canvas 不会进入可见区域，所以观察的是播放器
+const pendingWaveforms = new Map();
+const waveformObserver = 'IntersectionObserver' in window ? new IntersectionObserver(entries => {
+    entries.filter(entry => entry.isIntersecting).forEach(entry => {
+        waveformObserver.unobserve(entry.target);
+        initWaveform(pendingWaveforms.get(entry.target), entry.target);
+        pendingWaveforms.delete(entry.target);
+    });
+}, { rootMargin: '200px' }) : null;
+
+function initWaveforms(root) {
+    root.querySelectorAll('canvas.waveform[data-peaks-url]').forEach(canvas => {
+        const audio = waveformAudio(canvas);
+        if (!audio || canvas.dataset.waveformReady) return;
+        canvas.dataset.waveformReady = '1';
+        if (!waveformObserver) return initWaveform(canvas, audio);
+        pendingWaveforms.set(audio, canvas);
+        waveformObserver.observe(audio);
+    });
+}
+
+document.addEventListener('DOMContentLoaded', () => initWaveforms(document));
@@ -0,0 +1,174 @@
+import datetime
+
+from django.db import transaction
+from django.db.models import Count, Sum, Q, OuterRef, Subquery
+from django.utils import timezone
+
+from .models import PracticeRecord, DailyCheckIn, DailyPracticeStat
+
+# ==========================================
+# 时间范围：按本地日期换算成半开的时间区间
+# ==========================================
+
+def local_day_start(date):
+    """本地日期的零点 (带时区)"""
+    return timezone.make_aware(datetime.datetime.combine(date, datetime.time.min))
+
+
+def submitted_between(start_date, end_date):
+    """
+    submitted_at 落在本地日期 [start_date, end_date) 内的过滤条件。
+    直接比较时间列 (而不是 submitted_at__date)，可以走 (student, submitted_at) 索引。
+    """
+    return {
+        'submitted_at__gte': local_day_start(start_date),
+        'submitted_at__lt': local_day_start(end_date),
+    }
+
+
+def submitted_on(date):
+    return submitted_between(date, date + datetime.timedelta(days=1))
+
+
+def submitted_since(date):
+    return {'submitted_at__gte': local_day_start(date)}
+
+
+# ==========================================
+# 每个练习的最新录音 (本周最佳)
+# ==========================================
+
+def latest_records(start_date, end_date=None, **filters):
+    """
+    每个 (学员, 练习) 在本地日期 [start_date, end_date) 内最新的一条录音；不给 end_date 表示至今。
+    filters 限定学员 / 练习等。一条查询：相关子查询按 (student, exercise, submitted_at) 索引
+    取每组最新一条的 id，不用把整段时间的录音取回 Python 去重。
+    """
+    period = submitted_between(start_date, end_date) if end_date else submitted_since(start_date)
+    newest = PracticeRecord.objects.filter(
+        student=OuterRef('student'),
+        exercise=OuterRef('exercise'),
+        **period,
+    ).order_by('-submitted_at', '-id').values('id')[:1]
+    return PracticeRecord.objects.filter(**filters, **period).filter(id=Subquery(newest))
+
+
+# ==========================================
+# 每日练习汇总表维护
+# ==========================================
+
+def _record_counts():
+    """录音数 / 完成练习数 / 进阶练习数 的聚合表达式"""
+    return {
+        'recordings': Count('id', filter=Q(student_audio__isnull=False)),
+        'exercise_count': Count('exercise_id', distinct=True),
+        'advanced_count': Count('exercise_id', distinct=True, filter=Q(exercise__is_advanced=True)),
+    }
+
+
+def refresh_daily_stats(student, *dates):
+    """
+    重新计算某个学员指定日期的汇总行。
+    录音是"本周最佳"，重新上传会把记录从旧日期挪到今天，所以两天都要刷新。
+    """
+    for date in set(dates):
+        counts = PracticeRecord.objects.filter(
+            student=student, practice_date=date
+        ).aggregate(**_record_counts())
+        is_submitted = DailyCheckIn.objects.filter(student=student, date=date, is_submitted=True).exists()
+
+        if not counts['exercise_count'] and not is_submitted:
+            DailyPracticeStat.objects.filter(student=student, date=date).delete()
+            continue
+
+        DailyPracticeStat.objects.update_or_create(
+            student=student, date=date,
+            defaults={**counts, 'is_submitted': is_submitted},
+        )
+
+
+def mark_daily_submitted(student, date):
+    """提交打卡后只需要更新提交标记"""
+    DailyPracticeStat.objects.update_or_create(
+        student=student, date=date, defaults={'is_submitted': True}
+    )
+
+
+def rebuild_daily_stats():
+    """从录音和打卡原始数据全量重建汇总表，返回写入的行数"""
+    rows = {}
+    record_rows = PracticeRecord.objects.values(
+        'student_id', 'practice_date'
+    ).annotate(**_record_counts()).order_by()
+    for row in record_rows:
+        rows[(row['student_id'], row['practice_date'])] = DailyPracticeStat(
+            student_id=row['student_id'], date=row['practice_date'],
+            recordings=row['recordings'],
+            exercise_count=row['exercise_count'],
+            advanced_count=row['advanced_count'],
+        )
+
+    submitted = DailyCheckIn.objects.filter(is_submitted=True).values_list('student_id', 'date')
+    for student_id, date in submitted:
+        stat = rows.get((student_id, date))
+        if stat is None:
+            stat = rows[(student_id, date)] = DailyPracticeStat(student_id=student_id, date=date)
+        stat.is_submitted = True
+
+    with transaction.atomic():
+        DailyPracticeStat.objects.all().delete()
+        DailyPracticeStat.objects.bulk_create(rows.values(), batch_size=500)
+    return len(rows)
+
+
+# ==========================================
+# 统计工具：按学员聚合 (固定查询次数)
+# ==========================================
+
+def get_student_stats(students, start_of_week, today):
+    """
+    计算老师仪表盘的学员统计数据。
+    无论学员多少，只用一条 GROUP BY student_id 的汇总表聚合查询，
+    返回的字典结构与原来逐个学员查询时完全一致。
+    """
+    students = list(students)
+    student_ids = [s.id for s in students]
+
+    stat_rows = DailyPracticeStat.objects.filter(
+        student_id__in=student_ids,
+    ).values('student_id').annotate(
+        week_checkins=Count('id', filter=Q(date__gte=start_of_week, is_submitted=True)),
+        today_checkins=Count('id', filter=Q(date=today, is_submitted=True)),
+        total_records=Sum('recordings'),
+        week_records=Sum('recordings', filter=Q(date__gte=start_of_week)),
+        today_records=Sum('recordings', filter=Q(date=today)),
+    ).order_by()
+    stat_map = {row['student_id']: row for row in stat_rows}
+
+    student_stats = []
+    for student in students:
+        row = stat_map.get(student.id, {})
+        student_stats.append({
+            'student': student,
+            'week_checkins': row.get('week_checkins') or 0,
+            'week_records': row.get('week_records') or 0,
+            'total_records': row.get('total_records') or 0,
+            'today_checkin': (row.get('today_checkins') or 0) > 0,
+            'today_records': row.get('today_records') or 0,
+        })
+    return student_stats
+
+
+def get_latest_submitted_checkins(start_of_week):
+    """本周每位学员最近一次已提交的打卡 (一条查询 + 录音预取)"""
+    latest_date = DailyCheckIn.objects.filter(
+        student=OuterRef('student'),
+        date__gte=start_of_week,
+        is_submitted=True,
+    ).order_by('-date').values('date')[:1]
+
+    return DailyCheckIn.objects.filter(
+        date__gte=start_of_week,
+        is_submitted=True,
+        date=Subquery(latest_date),
+    ).select_related('student').prefetch_related('records__exercise').order_by('-date')
@@ -0,0 +1,178 @@
+import mimetypes
+import os
+import re
+
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse, Http404
+from django.urls import reverse
+from django.utils.cache import get_conditional_response
+from django.utils.crypto import constant_time_compare, salted_hmac
+from django.utils.http import http_date, parse_http_date_safe, quote_etag, content_disposition_header
+
+# ==========================================
+# 文件流式下发 (支持 Range / ETag / Last-Modified)
+# ==========================================
+
+CHUNK_SIZE = 64 * 1024
+
+# 浏览器 MediaRecorder 和常见上传格式对应的 Content-Type
+AUDIO_CONTENT_TYPES = {
+    '.webm': 'audio/webm',
+    '.weba': 'audio/webm',
+    '.ogg': 'audio/ogg',
+    '.opus': 'audio/ogg',
+    '.mp4': 'audio/mp4',
+    '.m4a': 'audio/mp4',
+    '.aac': 'audio/aac',
+    '.mp3': 'audio/mpeg',
+    '.wav': 'audio/wav',
+}
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+def guess_audio_type(name):
+    """按文件扩展名判断音频类型"""
+    ext = os.path.splitext(name)[1].lower()
+    return AUDIO_CONTENT_TYPES.get(ext) or mimetypes.guess_type(name)[0] or 'application/octet-stream'
+
+
+def parse_range(header, size):
+    """
+    解析单段 Range 头，返回 (start, end)，end 包含在内。
+    格式不认识或多段请求返回 None (按整文件返回)，超出文件范围抛 RangeNotSatisfiable。
+    """
+    match = RANGE_RE.match(header.strip())
+    if not match:
+        return None
+    start, end = match.groups()
+    if not start and not end:
+        return None
+
+    if not start:
+        # bytes=-500 表示最后 500 字节
+        suffix = int(end)
+        if suffix == 0 or size == 0:
+            raise RangeNotSatisfiable
+        return max(size - suffix, 0), size - 1
+
+    start = int(start)
+    end = min(int(end), size - 1) if end else size - 1
+    if start >= size or start > end:
+        raise RangeNotSatisfiable
+    return start, end
+
+
+def _if_range_matches(request, etag, last_modified):
+    """If-Range 不匹配时忽略 Range，返回整个文件"""
+    if_range = request.headers.get('If-Range')
+    if not if_range:
+        return True
+    if if_range.startswith('"') or if_range.startswith('W/'):
+        return if_range == etag
+    return parse_http_date_safe(if_range) == last_modified
+
+
+def _iter_range(fh, start, length):
+    try:
+        fh.seek(start)
+        remaining = length
+        while remaining > 0:
+            chunk = fh.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+    finally:
+        fh.close()
+
+
+def serve_file(request, field_file, download_name=None, content_type=None):
+    """
+    以流的方式返回 FileField 对应的文件，不把整个文件读进内存。
+    支持 Range (206)、ETag / Last-Modified 条件请求 (304)。
+    传入 download_name 时作为附件下载，否则内嵌播放。
+    """
+    if not field_file:
+        raise Http404
+    try:
+        path = field_file.path
+        stat = os.stat(path)
+    except (OSError, NotImplementedError, ValueError):
+        raise Http404
+
+    size = stat.st_size
+    last_modified = int(stat.st_mtime)
+    etag = quote_etag(f"{size:x}-{last_modified:x}")
+
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        content_type = content_type or guess_audio_type(path)
+        byte_range = None
+        range_header = request.headers.get('Range')
+        if range_header and request.method in ('GET', 'HEAD') and _if_range_matches(request, etag, last_modified):
+            try:
+                byte_range = parse_range(range_header, size)
+            except RangeNotSatisfiable:
+                response = HttpResponse(status=416)
+                response['Content-Range'] = f'bytes */{size}'
+                return response
+
+        if byte_range is None:
+            response = FileResponse(
+                open(path, 'rb'), content_type=content_type,
+                as_attachment=bool(download_name), filename=download_name or '',
+            )
+        else:
+            start, end = byte_range
+            length = end - start + 1
+            response = StreamingHttpResponse(
+                _iter_range(open(path, 'rb'), start, length), status=206, content_type=content_type
+            )
+            response['Content-Length'] = str(length)
+            response['Content-Range'] = f'bytes {start}-{end}/{size}'
+            if download_name:
+                response['Content-Disposition'] = content_disposition_header(True, download_name)
+
+    response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    return response
+
+
+# ==========================================
+# 页面里的播放地址 (经 stream_audio 下发，可拖动、可缓存)
+# ==========================================
+#
+# 能看到页面的人就能播放页面上的录音 (分享页、日报不要求登录)，
+# 所以渲染页面时给地址带上签名：签名绑定 (类型, ID, 文件名)，stream_audio 验证通过就直接下发。
+# 文件重新上传后文件名变了，地址随之改变，浏览器不会用到旧缓存；没有签名时按登录用户检查权限。
+# 波形峰值接口 (api_audio_peaks) 用同样的签名，签的是生成峰值的那个文件。
+
+def audio_signature(kind, obj_id, field_file):
+    return salted_hmac('training.stream_audio', f'{kind}:{obj_id}:{field_file.name}').hexdigest()[:20]
+
+
+def audio_url(kind, obj_id, field_file):
+    """音频的播放地址；没有文件时返回空字符串"""
+    if not field_file:
+        return ''
+    url = reverse('stream_audio', args=[kind, obj_id])
+    return f'{url}?sig={audio_signature(kind, obj_id, field_file)}'
+
+
+def peaks_url(kind, obj_id, field_file):
+    """音频波形峰值的地址；没有文件时返回空字符串"""
+    if not field_file:
+        return ''
+    url = reverse('api_audio_peaks', args=[kind, obj_id])
+    return f'{url}?sig={audio_signature(kind, obj_id, field_file)}'
+
+
+def valid_audio_signature(signature, kind, obj_id, field_file):
+    return bool(signature and field_file) and constant_time_compare(
+        signature, audio_signature(kind, obj_id, field_file)
+    )
@@ -0,0 +1,82 @@
+import datetime
+
+from django.contrib.auth.models import User
+
+from .audio import process_record_audio, AudioProcessingError
+from .gamification import record_practice
+from .images import optimize_content_images
+from .jobs import job_handler
+from .catalog import get_exercise_catalog
+from .models import PracticeRecord
+from .peaks import generate_peaks, source_file
+
+# ==========================================
+# 后台任务处理函数
+# ==========================================
+
+PRACTICE_EXP = 10          # 每次录音基础经验
+ALL_DONE_BONUS_EXP = 30    # 完成当天所有练习额外奖励
+
+
+@job_handler('apply_gamification')
+def apply_gamification(user_id, date, new_recording=False):
+    """上传后的游戏化结算：经验、连续天数、录音数、成就"""
+    user = User.objects.get(id=user_id)
+    day = datetime.date.fromisoformat(date)
+
+    # 1. 基础经验：每次录音 +10 XP
+    exp_earned = PRACTICE_EXP
+
+    # 2. 检查是否完成当天所有练习（额外奖励）
+    total_exercises = get_exercise_catalog().count
+    day_records = PracticeRecord.objects.filter(
+        student=user,
+        practice_date=day
+    ).values('exercise_id').distinct().count()
+
+    if day_records >= total_exercises:
+        exp_earned += ALL_DONE_BONUS_EXP
+
+    # 3. 一次记账：经验值、录音数、连续天数 (连续奖励由数据库端算出)
+    profile, streak_bonus = record_practice(user, exp_earned, new_recording=new_recording, today=day)
+    exp_earned += streak_bonus
+
+    return {
+        'exp_earned': exp_earned,
+        'streak_days': profile.streak_days,
+        'level': profile.level,
+    }
+
+
+@job_handler('process_audio')
+def process_audio(record_id, audio_name=None):
+    """录音入库后探测参数、转码出播放版本并生成波形"""
+    record = PracticeRecord.objects.filter(id=record_id).first()
+    if record is None or not record.student_audio:
+        return None
+    # 排队期间录音又被替换了：交给新上传对应的任务处理
+    if audio_name and record.student_audio.name != audio_name:
+        return {'skipped': True}
+    result = process_record_audio(record)
+    # 波形生成失败 (例如没有 ffmpeg 解码 webm) 不影响录音本身
+    try:
+        generate_peaks(record.student_audio)
+        result['peaks'] = True
+    except (AudioProcessingError, OSError):
+        result['peaks'] = False
+    return result
+
+
+@job_handler('compute_peaks')
+def compute_peaks(kind, obj_id):
+    """按需生成某个音频的波形旁路文件"""
+    field_file = source_file(kind, obj_id)
+    if not field_file:
+        return None
+    return {'sidecar': generate_peaks(field_file)}
+
+
+@job_handler('optimize_content_images')
+def optimize_images(kind, obj_id):
+    """练习 / 公告保存后：为正文图片生成多尺寸版本并改写为 srcset"""
+    return {'rewritten': optimize_content_images(kind, obj_id)}
@@ -1,3 +1,1869 @@
-from django.test import TestCase
+import datetime
+import importlib.util
+import io
+import json
+import math
+import os
+import re
+import runpy
+import shutil
+import struct
+import subprocess
+import sys
+import tempfile
+import threading
+import wave
+import zipfile
+from unittest import skipUnless
+from unittest.mock import patch
 
-# Create your tests here.
+import numpy as np
+from PIL import Image
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser, User
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection, connections
+from django.db.utils import ConnectionDoesNotExist
+from django.http import JsonResponse
+from django.test import Client, RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from .models import (
+    Exercise, DailyCheckIn, PracticeRecord, DailyPracticeStat,
+    StudentProfile, Achievement, StudentAchievement, Announcement, ReadRecord, UploadSession, Job,
+    BuddyPair, Encouragement
+)
+from .gamification import check_achievements, record_practice
+from .middleware import ContentCacheMiddleware, content_cache
+from .streaming import parse_range, RangeNotSatisfiable
+from .uploads import merge_range, missing_ranges, temp_path
+from .jobs import enqueue, job_handler, run_pending, HANDLERS
+from .audio import probe_audio, process_record_audio, has_ffmpeg
+from .peaks import compute_peaks, load_peaks
+from .stats import (
+    get_student_stats, latest_records, local_day_start, mark_daily_submitted, rebuild_daily_stats,
+    refresh_daily_stats, submitted_on, submitted_since
+)
+from .exports import iter_zip
+from .feed import get_class_feed
+from .catalog import get_exercise_catalog
+from .caching import CATALOG, invalidate_catalog
+from .checks import check_shared_cache
+from .likes import liked_checkin_ids, with_liked
+from . import announcements
+from .announcements import flush_reads, get_read_counts, unread_announcement_count
+from .images import VARIANTS_DIR, derive_image, needs_rewrite, rewrite_content, variant_name
+
+TEST_MEDIA_ROOT = tempfile.mkdtemp()
+
+# 测试不运行 collectstatic，没有 manifest，模板里的 {% static %} 用不带哈希的存储；
+# 缓存换成进程内缓存，测试不需要 Redis，cache.clear() 也不会清掉开发 / 生产共用的缓存。
+# 练习目录按缓存里的版本号放在进程内存里，而 TestCase 不提交事务、版本号不会更新，
+# 建练习的测试要先 cache.clear() (PostgreSQL 回滚后不复用主键，旧目录对不上新练习)
+_test_settings = override_settings(
+    STORAGES={
+        **settings.STORAGES,
+        'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+    },
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+)
+
+
+def setUpModule():
+    _test_settings.enable()
+
+
+def tearDownModule():
+    _test_settings.disable()
+
+
+def make_student(username):
+    return User.objects.create(username=username)
+
+
+def make_wav(seconds=1.0, rate=8000, freq=440.0, amplitude=0.5):
+    """生成单声道 16bit 正弦波 WAV 测试音频"""
+    buf = io.BytesIO()
+    with wave.open(buf, 'wb') as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(rate)
+        frames = int(seconds * rate)
+        wav.writeframes(b''.join(
+            struct.pack('<h', int(amplitude * 32767 * math.sin(2 * math.pi * freq * i / rate)))
+            for i in range(frames)
+        ))
+    return buf.getvalue()
+
+
+def make_record(student, exercise, checkin=None, audio='student_audios/a.webm'):
+    return PracticeRecord.objects.create(
+        student=student, exercise=exercise, daily_checkin=checkin, student_audio=audio
+    )
+
+
+def backdate(records, days):
+    """把录音的提交时间往前挪 (update 不触发 auto_now，练习日期要一起改)"""
+    moment = timezone.now() - datetime.timedelta(days=days)
+    records.update(submitted_at=moment, practice_date=timezone.localtime(moment).date())
+
+
+class TeacherDashboardStatsTests(TestCase):
+    def setUp(self):
+        self.teacher = User.objects.create(username='teacher', is_staff=True)
+        self.exercises = [Exercise.objects.create(title=f'练习{i}', order=i) for i in range(3)]
+        self.today = timezone.localdate()
+        self.start_of_week = self.today - datetime.timedelta(days=self.today.weekday())
+
+    def add_students(self, count, offset=0):
+        for i in range(offset, offset + count):
+            student = make_student(f'student{i:03d}')
+            checkin = DailyCheckIn.objects.create(student=student, date=self.today, is_submitted=True)
+            for exercise in self.exercises:
+                make_record(student, exercise, checkin)
+
+    def dashboard_query_count(self):
+        self.client.force_login(self.teacher)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('teacher_dashboard'))
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries)
+
+    def test_query_count_is_flat_as_roster_grows(self):
+        self.add_students(3)
+        small = self.dashboard_query_count()
+        self.add_students(30, offset=3)
+        large = self.dashboard_query_count()
+        self.assertEqual(small, large)
+
+    def test_stats_match_per_student_values(self):
+        active = make_student('active')
+        idle = make_student('idle')
+        checkin = DailyCheckIn.objects.create(student=active, date=self.today, is_submitted=True)
+        make_record(active, self.exercises[0], checkin)
+        make_record(active, self.exercises[1])
+        backdate(PracticeRecord.objects.filter(exercise=self.exercises[1]), 8)
+        rebuild_daily_stats()
+
+        stats = {s['student'].username: s for s in get_student_stats(
+            [active, idle], self.start_of_week, self.today
+        )}
+        self.assertEqual(stats['active']['week_checkins'], 1)
+        self.assertEqual(stats['active']['week_records'], 1)
+        self.assertEqual(stats['active']['total_records'], 2)
+        self.assertEqual(stats['active']['today_records'], 1)
+        self.assertTrue(stats['active']['today_checkin'])
+        self.assertEqual(stats['idle']['week_checkins'], 0)
+        self.assertFalse(stats['idle']['today_checkin'])
+
+
+@override_settings(MEDIA_ROOT=TEST_MEDIA_ROOT)
+class DailyPracticeStatTests(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEST_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.student = make_student('student')
+        self.normal = Exercise.objects.create(title='普通', order=1)
+        self.advanced = Exercise.objects.create(title='进阶', order=2, is_advanced=True)
+        self.today = timezone.localdate()
+        self.client.force_login(self.student)
+
+    def upload(self, exercise):
+        audio = SimpleUploadedFile('take.webm', b'audio-bytes', content_type='audio/webm')
+        response = self.client.post(reverse('api_upload_practice'), {
+            'exercise_id': exercise.id, 'audio_file': audio,
+        })
+        self.assertEqual(response.json()['status'], 'success')
+
+    def today_stat(self):
+        return DailyPracticeStat.objects.get(student=self.student, date=self.today)
+
+    def test_upload_and_submit_update_stat(self):
+        self.upload(self.normal)
+        self.upload(self.advanced)
+        self.upload(self.normal)
+        stat = self.today_stat()
+        self.assertEqual((stat.recordings, stat.exercise_count, stat.advanced_count), (2, 2, 1))
+        self.assertFalse(stat.is_submitted)
+
+        self.client.post(reverse('submit_daily_checkin'))
+        self.assertTrue(self.today_stat().is_submitted)
+
+    def test_student_dashboard_reads_stat(self):
+        self.upload(self.normal)
+        self.upload(self.advanced)
+        response = self.client.get(reverse('student_dashboard'))
+        self.assertEqual(response.context['completed_count'], 1)
+        self.assertEqual(response.context['advanced_completed_count'], 1)
+        self.assertEqual(response.context['total_today_checkins'], 1)
+
+    def test_delete_updates_stat(self):
+        self.upload(self.normal)
+        record = PracticeRecord.objects.get(student=self.student)
+        self.client.post(reverse('api_delete_record', args=[record.id]))
+        self.assertFalse(DailyPracticeStat.objects.filter(student=self.student).exists())
+
+    def test_rebuild_command_matches_incremental_updates(self):
+        self.upload(self.normal)
+        self.upload(self.advanced)
+        self.client.post(reverse('submit_daily_checkin'))
+        before = list(DailyPracticeStat.objects.values(
+            'student_id', 'date', 'recordings', 'exercise_count', 'advanced_count', 'is_submitted'
+        ))
+        DailyPracticeStat.objects.all().delete()
+        call_command('rebuild_practice_stats', stdout=io.StringIO())
+        after = list(DailyPracticeStat.objects.values(
+            'student_id', 'date', 'recordings', 'exercise_count', 'advanced_count', 'is_submitted'
+        ))
+        self.assertEqual(before, after)
+
+    def test_teacher_comment_keeps_practice_date(self):
+        self.upload(self.normal)
+        record = PracticeRecord.objects.get(student=self.student)
+        backdate(PracticeRecord.objects.filter(id=record.id), 2)
+        rebuild_daily_stats()
+        old_date = PracticeRecord.objects.get(id=record.id).practice_date
+
+        teacher = User.objects.create(username='teacher', is_staff=True)
+        self.client.force_login(teacher)
+        self.client.post(reverse('review_submission', args=[record.id]), {'comment_text': '很好'})
+        self.client.post(reverse('shared_record_detail', args=[record.id]), {'comment_text': '再接再厉'})
+
+        record.refresh_from_db()
+        self.assertEqual((record.practice_date, record.teacher_comment_text), (old_date, '再接再厉'))
+        stat_fields = ('student_id', 'date', 'recordings', 'exercise_count', 'advanced_count', 'is_submitted')
+        before = list(DailyPracticeStat.objects.values(*stat_fields).order_by('date'))
+        rebuild_daily_stats()
+        self.assertEqual(before, list(DailyPracticeStat.objects.values(*stat_fields).order_by('date')))
+        self.assertEqual([row['date'] for row in before], [old_date])
+
+
+class AchievementEvaluatorTests(TestCase):
+    def setUp(self):
+        self.student = make_student('student')
+        self.profile = StudentProfile.objects.create(
+            user=self.student, streak_days=3, total_recordings=1, experience_points=40
+        )
+
+    def make_achievements(self, count):
+        for i in range(count):
+            Achievement.objects.create(
+                name=f'连续{i}', description='', condition_type='streak',
+                condition_value=i + 1, exp_reward=10, order=i,
+            )
+
+    def test_unlocks_reached_thresholds_once(self):
+        self.make_achievements(5)
+        first = Achievement.objects.create(
+            name='首次', description='', condition_type='first', condition_value=99, exp_reward=5
+        )
+        unlocked = check_achievements(self.student, self.profile)
+        self.assertEqual(len(unlocked), 4)
+        self.assertIn(first, unlocked)
+        self.profile.refresh_from_db()
+        self.assertEqual(self.profile.experience_points, 40 + 3 * 10 + 5)
+
+        self.assertEqual(check_achievements(self.student, self.profile), [])
+        self.assertEqual(StudentAchievement.objects.filter(student=self.student).count(), 4)
+
+    def test_concurrent_evaluation_credits_once(self):
+        self.make_achievements(3)
+        check_achievements(self.student, self.profile)
+        self.profile.refresh_from_db()
+        exp = self.profile.experience_points
+
+        # 另一个请求在写入前读的已获得集合还是空的：写入冲突被忽略，不重复加经验
+        with patch('training.gamification._earned_ids', return_value=set()):
+            self.assertEqual(check_achievements(self.student, self.profile), [])
+        self.profile.refresh_from_db()
+        self.assertEqual(self.profile.experience_points, exp)
+        self.assertEqual(StudentAchievement.objects.filter(student=self.student).count(), 3)
+
+    def test_reward_updates_level(self):
+        Achievement.objects.create(
+            name='大奖', description='', condition_type='streak', condition_value=1, exp_reward=400,
+        )
+        check_achievements(self.student, self.profile)
+        self.profile.refresh_from_db()
+        self.assertEqual(self.profile.experience_points, 440)
+        self.assertEqual(self.profile.level, self.profile.calculate_level())
+        self.assertEqual(self.profile.level, 3)
+
+    def test_query_count_is_independent_of_achievement_count(self):
+        self.make_achievements(3)
+        with CaptureQueriesContext(connection) as small:
+            check_achievements(self.student, self.profile)
+        StudentAchievement.objects.all().delete()
+        self.make_achievements(30)
+        with CaptureQueriesContext(connection) as large:
+            check_achievements(self.student, self.profile)
+        self.assertEqual(len(small.captured_queries), len(large.captured_queries))
+
+
+class ProfileLedgerTests(TestCase):
+    def setUp(self):
+        self.student = make_student('student')
+        self.today = timezone.localdate()
+
+    def test_first_practice_creates_profile(self):
+        profile, bonus = record_practice(self.student, 10, new_recording=True)
+        self.assertEqual(bonus, 5)
+        self.assertEqual((profile.streak_days, profile.total_practice_days, profile.total_recordings), (1, 1, 1))
+        self.assertEqual(profile.experience_points, 15)
+        self.assertEqual(profile.last_practice_date, self.today)
+
+    def test_streak_continues_resets_and_levels_up(self):
+        StudentProfile.objects.create(
+            user=self.student, streak_days=4, total_practice_days=9, experience_points=390,
+            last_practice_date=self.today - datetime.timedelta(days=1),
+        )
+        profile, bonus = record_practice(self.student, 10)
+        self.assertEqual((profile.streak_days, profile.total_practice_days), (5, 10))
+        self.assertEqual(bonus, 25)
+        self.assertEqual(profile.experience_points, 425)
+        self.assertEqual(profile.level, profile.calculate_level())
+
+        # 同一天再练习：天数不变
+        profile, _ = record_practice(self.student, 10)
+        self.assertEqual((profile.streak_days, profile.total_practice_days), (5, 10))
+
+        StudentProfile.objects.filter(user=self.student).update(
+            last_practice_date=self.today - datetime.timedelta(days=3)
+        )
+        profile, bonus = record_practice(self.student, 10)
+        self.assertEqual((profile.streak_days, profile.total_practice_days, bonus), (1, 11, 5))
+
+    def test_single_update_per_practice(self):
+        StudentProfile.objects.create(user=self.student)
+        with CaptureQueriesContext(connection) as ctx:
+            record_practice(self.student, 10, new_recording=True)
+        updates = [q for q in ctx.captured_queries if q['sql'].startswith('UPDATE')]
+        self.assertEqual(len(updates), 1)
+
+
+@override_settings(MEDIA_ROOT=TEST_MEDIA_ROOT, JOB_QUEUE_EAGER=True)
+class ProfileLedgerConcurrencyTests(TransactionTestCase):
+    def test_parallel_uploads_do_not_lose_increments(self):
+        student = make_student('student')
+        exercises = [Exercise.objects.create(title=f'练习{i}', order=i) for i in range(8)]
+        results, errors = [], []
+
+        def upload(batch):
+            client = Client()
+            client.force_login(student)
+            try:
+                for exercise in batch:
+                    audio = SimpleUploadedFile('take.webm', b'audio-bytes', content_type='audio/webm')
+                    data = client.post(reverse('api_upload_practice'), {
+                        'exercise_id': exercise.id, 'audio_file': audio,
+                    }).json()
+                    if data['status'] != 'success':
+                        errors.append(data['msg'])
+                    else:
+                        results.append(data['exp_earned'])
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=upload, args=(exercises[i::4],)) for i in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        self.assertEqual(errors, [])
+        profile = StudentProfile.objects.get(user=student)
+        self.assertEqual(profile.total_recordings, len(exercises))
+        self.assertEqual(profile.total_practice_days, 1)
+        self.assertEqual(profile.experience_points, sum(results))
+
+
+@override_settings(MEDIA_ROOT=TEST_MEDIA_ROOT)
+class AudioStreamingTests(TestCase):
+    def setUp(self):
+        self.student = make_student('student')
+        self.exercise = Exercise.objects.create(title='练习', order=1)
+        self.payload = bytes(range(256)) * 40
+        self.record = PracticeRecord.objects.create(
+            student=self.student, exercise=self.exercise,
+            student_audio=SimpleUploadedFile('take.webm', self.payload),
+        )
+        self.client.force_login(self.student)
+        self.url = reverse('stream_audio', args=['record', self.record.id])
+
+    def body(self, response):
+        return b''.join(response.streaming_content)
+
+    def test_parse_range(self):
+        self.assertEqual(parse_range('bytes=0-9', 100), (0, 9))
+        self.assertEqual(parse_range('bytes=90-', 100), (90, 99))
+        self.assertEqual(parse_range('bytes=-10', 100), (90, 99))
+        self.assertEqual(parse_range('bytes=50-500', 100), (50, 99))
+        self.assertIsNone(parse_range('bytes=0-1,5-6', 100))
+        with self.assertRaises(RangeNotSatisfiable):
+            parse_range('bytes=100-', 100)
+
+    def test_full_response_streams_with_content_type(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'audio/webm')
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertEqual(self.body(response), self.payload)
+
+    def test_range_request_returns_partial_content(self):
+        response = self.client.get(self.url, HTTP_RANGE='bytes=100-199')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], f'bytes 100-199/{len(self.payload)}')
+        self.assertEqual(self.body(response), self.payload[100:200])
+
+        response = self.client.get(self.url, HTTP_RANGE=f'bytes={len(self.payload)}-')
+        self.assertEqual(response.status_code, 416)
+
+    def test_conditional_requests(self):
+        etag = self.client.get(self.url)['ETag']
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        # If-Range 不匹配时返回整个文件
+        response = self.client.get(self.url, HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"stale"')
+        self.assertEqual(response.status_code, 200)
+
+    def test_download_uses_stored_extension(self):
+        response = self.client.get(reverse('download_record_audio', args=[self.record.id]))
+        self.assertEqual(response['Content-Type'], 'audio/webm')
+        self.assertIn(f'rec_{self.record.id}.webm', response['Content-Disposition'])
+
+    def test_other_students_cannot_stream_records(self):
+        self.client.force_login(make_student('other'))
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+        self.assertEqual(self.client.get(reverse('stream_audio', args=['bogus', 1])).status_code, 404)
+
+    def test_signed_page_url_streams_without_login(self):
+        # 分享页 / 日报不要求登录，页面上的地址带签名
+        self.client.logout()
+        response = self.client.get(self.record.playback_url, HTTP_RANGE='bytes=0-9')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(self.body(response), self.payload[:10])
+
+        self.assertEqual(self.client.get(self.url).status_code, 302)
+        self.client.force_login(make_student('other'))
+        self.assertEqual(self.client.get(self.url + '?sig=forged').status_code, 403)
+        # 签名只对这一个文件有效
+        comment_url = reverse('stream_audio', args=['comment', self.record.id])
+        sig = self.record.playback_url.split('sig=')[1]
+        self.assertEqual(self.client.get(f'{comment_url}?sig={sig}').status_code, 403)
+
+
+@override_settings(MEDIA_ROOT=TEST_MEDIA_ROOT)
+class ChunkedUploadTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.student = make_student('student')
+        self.exercise = Exercise.objects.create(title='练习', order=1)
+        self.payload = bytes(range(256)) * 12
+        self.chunks = [(offset, self.payload[offset:offset + 1000]) for offset in range(0, len(self.payload), 1000)]
+        self.client.force_login(self.student)
+
+    def init(self):
+        data = self.client.post(reverse('api_upload_init'), {
+            'exercise_id': self.exercise.id, 'total_size': len(self.payload), 'filename': 'take.webm',
+        }).json()
+        self.assertEqual(data['status'], 'success')
+        return data['upload_id']
+
+    def send(self, upload_id, offset, data):
+        url = reverse('api_upload_chunk', args=[upload_id]) + f'?offset={offset}'
+        return self.client.post(url, data=data, content_type='application/octet-stream').json()
+
+    def finalize(self, upload_id):
+        return self.client.post(reverse('api_upload_finalize', args=[upload_id])).json()
+
+    def test_range_helpers(self):
+        ranges = merge_range([], 10, 20)
+        ranges = merge_range(ranges, 0, 5)
+        ranges = merge_range(ranges, 15, 30)
+        self.assertEqual(ranges, [[0, 5], [10, 30]])
+        self.assertEqual(missing_ranges(ranges, 40), [[5, 10], [30, 40]])
+        self.assertEqual(merge_range(ranges, 5, 10), [[0, 30]])
+
+    def test_out_of_order_and_duplicate_chunks(self):
+        upload_id = self.init()
+        for offset, data in reversed(self.chunks):
+            self.send(upload_id, offset, data)
+        progress = self.send(upload_id, *self.chunks[0])
+        self.assertEqual(progress['received'], len(self.payload))
+        self.assertEqual(progress['missing'], [])
+
+        result = self.finalize(upload_id)
+        self.assertEqual(result['status'], 'success')
+        run_pending()
+        record = PracticeRecord.objects.get(student=self.student)
+        with record.student_audio.open('rb') as fh:
+            self.assertEqual(fh.read(), self.payload)
+        self.assertEqual(StudentProfile.objects.get(user=self.student).total_recordings, 1)
+        self.assertFalse(os.path.exists(temp_path(UploadSession.objects.get(id=upload_id))))
+
+        # 同一会话不能重复合成
+        self.assertEqual(self.finalize(upload_id)['status'], 'error')
+
+    def test_interrupted_upload_resumes_from_missing_ranges(self):
+        upload_id = self.init()
+        self.send(upload_id, *self.chunks[0])
+        # 中断：只传了半个分片
+        offset, data = self.chunks[1]
+        self.send(upload_id, offset, data[:400])
+
+        result = self.finalize(upload_id)
+        self.assertEqual(result['status'], 'error')
+        self.assertEqual(result['missing'][0], [offset + 400, len(self.payload)])
+
+        status = self.client.get(reverse('api_upload_status', args=[upload_id])).json()
+        for start, end in status['missing']:
+            self.send(upload_id, start, self.payload[start:end])
+        self.assertEqual(self.finalize(upload_id)['status'], 'success')
+
+    def test_rejects_chunks_outside_file_and_foreign_sessions(self):
+        upload_id = self.init()
+        self.assertEqual(self.send(upload_id, len(self.payload) - 10, b'x' * 20)['status'], 'error')
+        self.client.force_login(make_student('other'))
+        self.assertEqual(self.send(upload_id, 0, b'x')['status'], 'error')
+
+
+@override_settings(MEDIA_ROOT=TEST_MEDIA_ROOT)
+class JobQueueTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.student = make_student('student')
+        self.exercise = Exercise.objects.create(title='练习', order=1)
+        self.client.force_login(self.student)
+        self.calls = []
+
+        @job_handler('test_flaky')
+        def flaky(fail_times):
+            self.calls.append(1)
+            if len(self.calls) <= fail_times:
+                raise RuntimeError('boom')
+            return {'calls': len(self.calls)}
+        self.addCleanup(HANDLERS.pop, 'test_flaky')
+
+    def test_upload_returns_job_and_worker_applies_xp(self):
+        audio = SimpleUploadedFile('take.webm', b'audio-bytes', content_type='audio/webm')
+        data = self.client.post(reverse('api_upload_practice'), {
+            'exercise_id': self.exercise.id, 'audio_file': audio,
+        }).json()
+        self.assertEqual(data['status'], 'success')
+        self.assertNotIn('exp_earned', data)
+        self.assertFalse(StudentProfile.objects.filter(user=self.student, total_recordings=1).exists())
+
+        self.assertEqual(run_pending(), 2)
+        job = self.client.get(reverse('api_job_status', args=[data['job_id']])).json()['job']
+        self.assertEqual(job['state'], Job.DONE)
+        self.assertEqual(job['result']['exp_earned'], 10 + 30 + 5)
+        profile = StudentProfile.objects.get(user=self.student)
+        self.assertEqual((profile.total_recordings, profile.experience_points), (1, 45))
+
+        self.client.force_login(make_student('other'))
+        self.assertEqual(self.client.get(reverse('api_job_status', args=[data['job_id']])).json()['status'], 'error')
+
+    def test_failed_job_is_retried_with_backoff(self):
+        job = enqueue('test_flaky', {'fail_times': 1})
+        self.assertEqual(run_pending(), 1)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.PENDING, 1))
+        self.assertIn('boom', job.last_error)
+        # 退避时间未到，不会马上重试
+        self.assertEqual(run_pending(), 0)
+
+        Job.objects.filter(id=job.id).update(run_after=timezone.now())
+        run_pending()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.result), (Job.DONE, {'calls': 2}))
+
+    def test_job_fails_after_max_attempts(self):
+        job = enqueue('test_flaky', {'fail_times': 5}, max_attempts=2)
+        run_pending()
+        Job.objects.filter(id=job.id).update(run_after=timezone.now())
+        with self.assertLogs('training.jobs', level='ERROR'):
+            run_pending()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.FAILED, 2))
+
+    def test_upload_contract_for_recorder_js(self):
+        """exercise_detail.js 用 page_config.jobStatusUrl 和上传返回的 job_id 轮询经验结算结果"""
+        config = self.client.get(reverse('exercise_detail', args=[self.exercise.id])).context['page_config']
+        audio = SimpleUploadedFile('take.webm', b'audio-bytes', content_type='audio/webm')
+        data = self.client.post(config['uploadUrl'], {
+            'exercise_id': config['exerciseId'], 'audio_file': audio,
+        }).json()
+        self.assertEqual(data['status'], 'success')
+        self.assertTrue({'msg', 'record_id', 'job_id'} <= data.keys())
+
+        status_url = config['jobStatusUrl'].replace('{id}', str(data['job_id']))
+        self.assertEqual(self.client.get(status_url).json()['job']['state'], Job.PENDING)
+        run_pending()
+        job = self.client.get(status_url).json()['job']
+        self.assertEqual(job['state'], Job.DONE)
+        self.assertEqual((job['result']['exp_earned'], job['result']['streak_days']), (45, 1))
+
+    @override_settings(JOB_QUEUE_EAGER=True)
+    def test_eager_mode_includes_xp_in_upload_response(self):
+        audio = SimpleUploadedFile('take.webm', b'audio-bytes', content_type='audio/webm')
+        data = self.client.post(reverse('api_upload_practice'), {
+            'exercise_id': self.exercise.id, 'audio_file': audio,
+        }).json()
+        self.assertEqual(data['exp_earned'], 45)
+
+
+@override_settings(MEDIA_ROOT=TEST_MEDIA_ROOT)
+class AudioProcessingTests(TestCase):
+    def setUp(self):
+        self.student = make_student('student')
+        self.exercise = Exercise.objects.create(title='练习', order=1)
+        self.record = PracticeRecord.objects.create(
+            student=self.student, exercise=self.exercise,
+            student_audio=SimpleUploadedFile('take.wav', make_wav(seconds=2.0)),
+        )
+
+    @override_settings(AUDIO_FFPROBE_BINARY='missing-ffprobe', AUDIO_FFMPEG_BINARY='missing-ffmpeg')
+    def test_wav_probe_without_ffmpeg_records_metadata_only(self):
+        submitted_at = self.record.submitted_at
+        result = process_record_audio(self.record)
+        self.assertFalse(result['transcoded'])
+
+        self.record.refresh_from_db()
+        self.assertAlmostEqual(self.record.audio_duration, 2.0)
+        self.assertEqual(self.record.audio_codec, 'pcm_s16le')
+        self.assertEqual(self.record.audio_bitrate, 8000 * 16)
+        self.assertEqual(self.record.submitted_at, submitted_at)
+        self.assertTrue(self.record.playback_url.startswith(
+            reverse('stream_audio', args=['record', self.record.id]) + '?sig='
+        ))
+
+    @override_settings(AUDIO_FFPROBE_BINARY='missing-ffprobe')
+    def test_probe_returns_none_for_unknown_format_without_ffprobe(self):
+        path = os.path.join(TEST_MEDIA_ROOT, 'noise.webm')
+        with open(path, 'wb') as fh:
+            fh.write(b'not really audio')
+        self.assertIsNone(probe_audio(path))
+
+    def test_job_skips_replaced_audio(self):
+        job = enqueue('process_audio', {'record_id': self.record.id, 'audio_name': 'student_audios/old.webm'})
+        run_pending()
+        job.refresh_from_db()
+        self.assertEqual(job.result, {'skipped': True})
+
+    @skipUnless(has_ffmpeg(), 'ffmpeg 未安装')
+    def test_transcodes_to_compact_rendition(self):
+        result = process_record_audio(self.record)
+        self.assertTrue(result['transcoded'])
+        self.assertLess(result['playback_size'], result['original_size'])
+
+        self.record.refresh_from_db()
+        self.assertTrue(self.record.playback_audio.name.endswith('.m4a'))
+        self.client.force_login(self.student)
+        response = self.client.get(reverse('download_record_audio', args=[self.record.id]))
+        self.assertEqual(response['Content-Type'], 'audio/mp4')
+
+
+@override_settings(MEDIA_ROOT=TEST_MEDIA_ROOT)
+class WaveformPeaksTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.student = make_student('student')
+        self.exercise = Exercise.objects.create(
+            title='练习', order=1, demo_audio=SimpleUploadedFile('demo.wav', make_wav(seconds=1.0))
+        )
+        self.record = PracticeRecord.objects.create(
+            student=self.student, exercise=self.exercise,
+            student_audio=SimpleUploadedFile('take.wav', make_wav(seconds=2.0, amplitude=0.25)),
+        )
+        self.client.force_login(self.student)
+
+    def test_compute_peaks_takes_max_abs_per_window(self):
+        samples = np.array([0, 100, -32768, 5, 32767, 0, -10], dtype=np.int16)
+        peaks = compute_peaks(samples, sample_rate=4, peaks_per_second=2)
+        self.assertEqual(peaks.tolist(), [0, 255, 255, 0])
+        self.assertEqual(compute_peaks(np.array([], dtype=np.int16), 8000).tolist(), [])
+
+    def test_api_queues_then_serves_cached_peaks(self):
+        url = reverse('api_audio_peaks', args=['record', self.record.id])
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(Job.objects.filter(kind='compute_peaks').count(), 1)
+        # 未完成前重复请求不会重复排队
+        self.client.get(url)
+        self.assertEqual(Job.objects.filter(kind='compute_peaks').count(), 1)
+
+        run_pending()
+        response = self.client.get(url)
+        data = response.json()
+        self.assertEqual(data['duration'], 2.0)
+        self.assertEqual(len(data['peaks']), 40)
+        self.assertTrue(all(60 <= p <= 64 for p in data['peaks']))
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_command_generates_all_sources_in_batches(self):
+        call_command('compute_peaks', batch_size=1, stdout=io.StringIO(), stderr=io.StringIO())
+        self.assertIsNotNone(load_peaks(self.record.student_audio))
+        self.assertEqual(len(load_peaks(self.exercise.demo_audio)['peaks']), 20)
+
+    def waveform_urls(self, url):
+        """页面上 waveform.js 要取的峰值地址 (每个 canvas 紧跟在对应的 <audio> 后面，或用 data-audio 指定)"""
+        html = self.client.get(url).content.decode()
+        canvases = re.findall(r'<canvas class="waveform" data-peaks-url="([^"]+)"( data-audio="([^"]+)")?', html)
+        for _, _, audio_id in canvases:
+            if audio_id:
+                self.assertIn(f'<audio id="{audio_id}"', html)
+        return [peaks_url for peaks_url, _, _ in canvases]
+
+    def assert_peaks_served(self, urls):
+        for url in urls:
+            self.assertEqual(self.client.get(url).status_code, 202)
+        run_pending()
+        for url in urls:
+            self.assertTrue(self.client.get(url).json()['peaks'])
+
+    def test_exercise_page_draws_waveforms_from_api(self):
+        urls = self.waveform_urls(reverse('exercise_detail', args=[self.exercise.id]))
+        self.assertEqual([url.split('?')[0] for url in urls], [
+            reverse('api_audio_peaks', args=['demo', self.exercise.id]),
+            reverse('api_audio_peaks', args=['record', self.record.id]),
+        ])
+        self.assert_peaks_served(urls)
+
+    def test_review_and_history_pages_draw_student_and_comment_waveforms(self):
+        self.record.teacher_comment_audio = SimpleUploadedFile('comment.wav', make_wav(seconds=1.0))
+        self.record.save(update_fields=['teacher_comment_audio'])
+        self.client.force_login(User.objects.create(username='teacher', is_staff=True))
+
+        urls = self.waveform_urls(reverse('review_submission', args=[self.record.id]))
+        self.assertEqual(urls, [self.record.audio_peaks_url, self.record.comment_peaks_url])
+        history = self.waveform_urls(reverse('teacher_student_history', args=[self.student.id]))
+        self.assertEqual(history, [self.record.audio_peaks_url])
+        self.assert_peaks_served(urls)
+
+    def test_public_pages_fetch_peaks_with_signed_urls(self):
+        checkin = DailyCheckIn.objects.create(
+            student=self.student, date=timezone.localdate(), is_submitted=True,
+            teacher_audio=SimpleUploadedFile('summary.wav', make_wav(seconds=1.0)),
+        )
+        self.client.logout()
+        urls = self.waveform_urls(reverse('daily_report_view', args=[checkin.id]))
+        self.assertEqual(urls, [self.record.audio_peaks_url, checkin.teacher_peaks_url])
+        self.assertEqual(self.waveform_urls(reverse('shared_record_detail', args=[self.record.id])),
+                         [self.record.audio_peaks_url])
+        self.assert_peaks_served(urls)
+
+        # 没有签名要求登录，签名不能换到别的录音上用
+        unsigned = reverse('api_audio_peaks', args=['record', self.record.id])
+        self.assertEqual(self.client.get(unsigned).status_code, 302)
+        self.client.force_login(make_student('other'))
+        sig = self.record.audio_peaks_url.split('sig=')[1]
+        comment = reverse('api_audio_peaks', args=['comment', self.record.id])
+        self.assertEqual(self.client.get(f'{comment}?sig={sig}').status_code, 403)
+
+    def test_other_students_cannot_read_record_peaks(self):
+        self.client.force_login(make_student('other'))
+        response = self.client.get(reverse('api_audio_peaks', args=['record', self.record.id]))
+        self.assertEqual(response.status_code, 403)
+        response = self.client.get(reverse('api_audio_peaks', args=['demo', self.exercise.id]))
+        self.assertEqual(response.status_code, 202)
+
+
+@override_settings(MEDIA_ROOT=TEST_MEDIA_ROOT)
+class AudioExportTests(TestCase):
+    def setUp(self):
+        self.teacher = User.objects.create(username='teacher', is_staff=True)
+        self.student = make_student('小明')
+        self.exercise = Exercise.objects.create(title='绕口令: 四是四', order=1)
+        self.checkin = DailyCheckIn.objects.create(student=self.student, date=timezone.localdate(), is_submitted=True)
+        self.records = [
+            PracticeRecord.objects.create(
+                student=self.student, exercise=self.exercise, daily_checkin=self.checkin,
+                student_audio=SimpleUploadedFile(f'take{i}.webm', bytes([i]) * 1000),
+            )
+            for i in range(2)
+        ]
+
+    def read_zip(self, response):
+        self.assertEqual(response['Content-Type'], 'application/zip')
+        self.assertTrue(response.streaming)
+        return zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content)))
+
+    def test_iter_zip_streams_in_chunks(self):
+        path = self.records[0].student_audio.path
+        chunks = list(iter_zip([('a.webm', path), ('missing.webm', '/nonexistent')]))
+        self.assertGreater(len(chunks), 1)
+        archive = zipfile.ZipFile(io.BytesIO(b''.join(chunks)))
+        self.assertEqual(archive.namelist(), ['a.webm'])
+        self.assertEqual(archive.read('a.webm'), bytes([0]) * 1000)
+
+    def test_checkin_export_uses_readable_unique_names(self):
+        self.client.force_login(self.student)
+        archive = self.read_zip(self.client.get(reverse('export_checkin_audio', args=[self.checkin.id])))
+        date = timezone.localdate().isoformat()
+        self.assertEqual(archive.namelist(), [
+            f'小明/{date}_绕口令_ 四是四.webm',
+            f'小明/{date}_绕口令_ 四是四_2.webm',
+        ])
+        self.assertEqual(archive.read(archive.namelist()[1]), bytes([1]) * 1000)
+
+    def test_week_exports(self):
+        other = make_student('小红')
+        PracticeRecord.objects.create(
+            student=other, exercise=self.exercise, student_audio=SimpleUploadedFile('x.webm', b'x' * 10),
+        )
+        last_week = PracticeRecord.objects.create(
+            student=self.student, exercise=self.exercise, student_audio=SimpleUploadedFile('y.webm', b'y'),
+        )
+        backdate(PracticeRecord.objects.filter(id=last_week.id), 7)
+
+        self.client.force_login(self.teacher)
+        archive = self.read_zip(self.client.get(reverse('export_student_week_audio', args=[self.student.id])))
+        self.assertEqual(len(archive.namelist()), 2)
+
+        archive = self.read_zip(self.client.get(reverse('export_class_week_audio')))
+        self.assertEqual(sorted({name.split('/')[0] for name in archive.namelist()}), ['小明', '小红'])
+
+        week = (timezone.localdate() - datetime.timedelta(days=7)).isoformat()
+        archive = self.read_zip(self.client.get(reverse('export_student_week_audio', args=[self.student.id]), {'week': week}))
+        self.assertEqual(len(archive.namelist()), 1)
+
+    def test_students_cannot_export_others(self):
+        self.client.force_login(make_student('other'))
+        self.assertEqual(self.client.get(reverse('export_checkin_audio', args=[self.checkin.id])).status_code, 403)
+        self.assertEqual(self.client.get(reverse('export_student_week_audio', args=[self.student.id])).status_code, 403)
+        self.assertEqual(self.client.get(reverse('export_class_week_audio')).status_code, 403)
+
+
+class PracticeDateIndexTests(TestCase):
+    def setUp(self):
+        self.student = make_student('student')
+        self.exercise = Exercise.objects.create(title='练习', order=1)
+        self.today = timezone.localdate()
+
+    def index_name(self, fields):
+        for index in PracticeRecord._meta.indexes:
+            if index.fields == fields:
+                return index.name
+        self.fail(f"没有 {fields} 索引")
+
+    def test_practice_date_follows_local_submission_time(self):
+        record = make_record(self.student, self.exercise)
+        self.assertEqual(record.practice_date, self.today)
+        backdate(PracticeRecord.objects.filter(id=record.id), 3)
+        record.refresh_from_db()
+        record.save(update_fields=['submitted_at'])
+        record.refresh_from_db()
+        self.assertEqual(record.practice_date, self.today)
+
+    def test_half_open_ranges_match_local_days(self):
+        midnight = timezone.make_aware(datetime.datetime.combine(self.today, datetime.time.min))
+        inside = make_record(self.student, self.exercise)
+        before = make_record(self.student, self.exercise)
+        PracticeRecord.objects.filter(id=inside.id).update(submitted_at=midnight)
+        PracticeRecord.objects.filter(id=before.id).update(submitted_at=midnight - datetime.timedelta(microseconds=1))
+        today_ids = set(PracticeRecord.objects.filter(**submitted_on(self.today)).values_list('id', flat=True))
+        self.assertEqual(today_ids, {inside.id})
+
+    def test_time_filters_use_composite_indexes(self):
+        plans = {
+            ('student', 'submitted_at'): PracticeRecord.objects.filter(
+                student=self.student, **submitted_on(self.today)),
+            ('student', 'exercise', 'submitted_at'): PracticeRecord.objects.filter(
+                student=self.student, exercise=self.exercise, **submitted_since(self.today)),
+            ('student', 'practice_date'): PracticeRecord.objects.filter(
+                student=self.student, practice_date=self.today),
+        }
+        if connection.vendor == 'postgresql':
+            # PostgreSQL 按统计信息选索引：先造一批分散在不同学员、练习、日期上的录音再 ANALYZE，
+            # 表还是很小，关掉顺序扫描才能看出选的是哪个索引
+            students = [self.student, *(make_student(f'other{i}') for i in range(15))]
+            exercises = [self.exercise, *(Exercise.objects.create(title=f'练习{i}', order=i + 2) for i in range(3))]
+            records = PracticeRecord.objects.bulk_create([
+                PracticeRecord(student=student, exercise=exercise, student_audio='student_audios/a.webm')
+                for student in students for exercise in exercises for _ in range(5)
+            ])
+            for days in range(30):
+                backdate(PracticeRecord.objects.filter(id__in=[r.id for r in records[days::30]]), days)
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE training_practicerecord')
+                cursor.execute('SET LOCAL enable_seqscan = off')
+        for fields, queryset in plans.items():
+            plan = queryset.explain()
+            name = self.index_name(list(fields))
+            if connection.vendor == 'postgresql':
+                # "Index Scan using <name> on training_practicerecord" (或 Bitmap Index Scan on <name>)
+                self.assertRegex(plan, rf'Index (Only )?Scan (using|on) {name}\b')
+            else:
+                # SQLite: "SEARCH training_practicerecord USING INDEX <name> (student_id=? AND submitted_at>? ...)"
+                self.assertIn('SEARCH', plan)
+                self.assertIn(f'USING INDEX {name}', plan)
+
+
+@override_settings(MEDIA_ROOT=TEST_MEDIA_ROOT)
+class DashboardCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.student = make_student('student')
+        self.buddy = make_student('buddy')
+        self.pair = BuddyPair.objects.create(student_a=self.student, student_b=self.buddy)
+        self.teacher = User.objects.create(username='teacher', is_staff=True)
+        self.exercise = Exercise.objects.create(title='练习', order=1)
+        self.client.force_login(self.student)
+
+    def visit(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('student_dashboard'))
+        self.assertEqual(response.status_code, 200)
+        return response.context, len(ctx)
+
+    def test_warm_cache_skips_dashboard_queries(self):
+        _, cold = self.visit()
+        context, warm = self.visit()
+        # 会话 / 用户 + 普通练习 + 进阶练习
+        self.assertLessEqual(warm, 4)
+        self.assertLess(warm, cold)
+        self.assertEqual(context['total_count'], 1)
+        self.assertEqual(context['buddy_info']['buddy'], self.buddy)
+
+    def test_record_invalidates_student_buddy_and_class(self):
+        self.visit()
+        self.client.force_login(self.buddy)
+        self.visit()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            make_record(self.buddy, self.exercise)
+        context, _ = self.visit()
+        self.assertIn(self.exercise.id, context['completed_ids'])
+        self.assertEqual(len(context['latest_records']), 1)
+
+        self.client.force_login(self.student)
+        context, _ = self.visit()
+        self.assertEqual(len(context['latest_records']), 1)
+
+    def test_encouragement_and_announcement_invalidate(self):
+        self.visit()
+        with self.captureOnCommitCallbacks(execute=True):
+            Encouragement.objects.create(pair=self.pair, sender=self.buddy, message='加油')
+            Announcement.objects.create(title='通知', content='内容', created_by=self.teacher)
+        context, _ = self.visit()
+        self.assertEqual(context['buddy_info']['unread_encouragements'], 1)
+        self.assertEqual(context['latest_announcement'].title, '通知')
+
+    def test_stat_write_invalidates_dashboard(self):
+        make_record(self.student, self.exercise)
+        context, _ = self.visit()
+        self.assertEqual(context['completed_count'], 0)
+        self.assertFalse(context['is_submitted_to_teacher'])
+
+        # 汇总行晚于录音 / 打卡写入 (后台任务、提交接口)
+        with self.captureOnCommitCallbacks(execute=True):
+            refresh_daily_stats(self.student, timezone.localdate())
+        context, _ = self.visit()
+        self.assertEqual(context['completed_count'], 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            mark_daily_submitted(self.student, timezone.localdate())
+        context, _ = self.visit()
+        self.assertTrue(context['is_submitted_to_teacher'])
+
+    def test_profile_update_without_signal_invalidates(self):
+        self.visit()
+        with self.captureOnCommitCallbacks(execute=True):
+            record_practice(self.student, 10)
+        context, _ = self.visit()
+        self.assertEqual(context['profile'].experience_points, 15)
+
+
+class ClassFeedTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.exercise = Exercise.objects.create(title='练习', order=1)
+        self.students = [make_student(f's{i}') for i in range(3)]
+        self.today = timezone.localdate()
+
+    def feed_queries(self):
+        with CaptureQueriesContext(connection) as ctx:
+            feed = get_class_feed(self.today)
+        return feed, len(ctx)
+
+    def test_feed_shared_until_upload(self):
+        make_record(self.students[0], self.exercise)
+        rebuild_daily_stats()
+        feed, queries = self.feed_queries()
+        self.assertEqual(queries, 3)
+        self.assertEqual(len(feed['latest_records']), 1)
+
+        for student in self.students:
+            self.client.force_login(student)
+            self.client.get(reverse('student_dashboard'))
+        self.assertEqual(self.feed_queries()[1], 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            make_record(self.students[1], self.exercise)
+        feed, queries = self.feed_queries()
+        self.assertEqual(queries, 3)
+        self.assertEqual(len(feed['latest_records']), 2)
+
+    def test_stale_feed_served_while_another_request_rebuilds(self):
+        self.feed_queries()
+        with self.captureOnCommitCallbacks(execute=True):
+            make_record(self.students[0], self.exercise)
+        cache.add(f'class_feed:{self.today}:lock', 1)
+        feed, queries = self.feed_queries()
+        self.assertEqual(queries, 0)
+        self.assertEqual(feed['latest_records'], [])
+        cache.delete(f'class_feed:{self.today}:lock')
+        self.assertEqual(len(get_class_feed(self.today)['latest_records']), 1)
+
+    def test_first_build_waits_and_keeps_other_lock(self):
+        lock_key = f'class_feed:{self.today}:lock'
+        cache.add(lock_key, 'other-request')
+        # 没有上一份：等别的请求重算完 (这里它一直没写入)，再自己查，且不删别人的锁
+        with patch('training.feed.LOCK_WAIT', 0.1):
+            feed, queries = self.feed_queries()
+        self.assertEqual(queries, 3)
+        self.assertEqual(feed['latest_records'], [])
+        self.assertEqual(cache.get(lock_key), 'other-request')
+
+    def test_waiting_request_uses_feed_written_meanwhile(self):
+        cache.add(f'class_feed:{self.today}:lock', 'other-request')
+        written = {'data': {'latest_records': ['重算结果']}, 'generation': 0, 'computed_at': 0}
+        with patch('training.feed._wait_for_feed', return_value=written):
+            feed, queries = self.feed_queries()
+        self.assertEqual(feed['latest_records'], ['重算结果'])
+        self.assertEqual(queries, 0)
+
+    def test_rebuild_releases_only_own_lock(self):
+        lock_key = f'class_feed:{self.today}:lock'
+
+        def slow_build(day):
+            # 重算超过 LOCK_TIMEOUT，锁过期后被别的请求拿走
+            cache.set(lock_key, 'other-request')
+            return {'latest_records': []}
+
+        with patch('training.feed.build_class_feed', side_effect=slow_build):
+            get_class_feed(self.today)
+        self.assertEqual(cache.get(lock_key), 'other-request')
+
+    def test_daily_report_uses_feed_count(self):
+        checkin = DailyCheckIn.objects.create(student=self.students[0], date=self.today, is_submitted=True)
+        for student in self.students[:2]:
+            make_record(student, self.exercise, checkin if student == self.students[0] else None)
+        DailyCheckIn.objects.create(student=self.students[2], date=self.today)
+        rebuild_daily_stats()
+        response = self.client.get(reverse('daily_report_view', args=[checkin.id]))
+        self.assertEqual(response.context['total_today_checkins'], 2)
+
+
+
+class LatestRecordTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.student = make_student('student')
+        self.other = make_student('other')
+        self.exercises = [Exercise.objects.create(title=f'练习{i}', order=2 - i) for i in range(2)]
+        self.week_start = timezone.localdate() - datetime.timedelta(days=timezone.localdate().weekday())
+
+    def test_latest_per_student_and_exercise(self):
+        last_week = self.week_start - datetime.timedelta(days=7)
+        old = make_record(self.student, self.exercises[0])
+        PracticeRecord.objects.filter(id=old.id).update(
+            submitted_at=local_day_start(last_week + datetime.timedelta(days=3)),
+            practice_date=last_week + datetime.timedelta(days=3),
+        )
+        first = make_record(self.student, self.exercises[0])
+        newest = make_record(self.student, self.exercises[0])
+        other = make_record(self.other, self.exercises[0])
+        second = make_record(self.student, self.exercises[1])
+
+        self.assertEqual(
+            set(latest_records(self.week_start).values_list('id', flat=True)),
+            {newest.id, other.id, second.id},
+        )
+        self.assertEqual(
+            latest_records(self.week_start, student=self.student, exercise=self.exercises[0]).get(), newest
+        )
+        self.assertEqual(list(latest_records(last_week, self.week_start, student=self.student)), [old])
+        self.assertNotIn(first.id, latest_records(self.week_start).values_list('id', flat=True))
+
+    def test_daily_report_fixed_queries(self):
+        checkin = DailyCheckIn.objects.create(student=self.student, date=timezone.localdate(), is_submitted=True)
+        for exercise in self.exercises:
+            for _ in range(3):
+                make_record(self.student, exercise, checkin)
+        checkin.likes.add(self.other)
+        get_class_feed(checkin.date)
+
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('daily_report_view', args=[checkin.id]))
+        records = list(response.context['records'])
+        self.assertEqual([r.exercise for r in records], self.exercises[::-1])
+        self.assertEqual((response.context['total_likes'], response.context['is_liked']), (1, False))
+
+        self.client.force_login(self.other)
+        response = self.client.get(reverse('daily_report_view', args=[checkin.id]))
+        self.assertTrue(response.context['is_liked'])
+
+    def test_upload_replaces_latest_record(self):
+        make_record(self.student, self.exercises[0])
+        newest = make_record(self.student, self.exercises[0])
+        self.client.force_login(self.student)
+        with override_settings(MEDIA_ROOT=TEST_MEDIA_ROOT, JOB_QUEUE_EAGER=False):
+            data = self.client.post(reverse('api_upload_practice'), {
+                'exercise_id': self.exercises[0].id,
+                'audio_file': SimpleUploadedFile('a.webm', b'audio', content_type='audio/webm'),
+            }).json()
+        self.assertEqual(data['record_id'], newest.id)
+        response = self.client.get(reverse('exercise_detail', args=[self.exercises[0].id]))
+        self.assertEqual(response.context['record'], newest)
+
+
+class CheckinLikeTests(TestCase):
+    def setUp(self):
+        self.owner = make_student('owner')
+        self.fans = [make_student(f'fan{i}') for i in range(3)]
+        self.checkins = [
+            DailyCheckIn.objects.create(student=self.owner, date=timezone.localdate() - datetime.timedelta(days=i))
+            for i in range(3)
+        ]
+
+    def like_count(self, checkin):
+        return DailyCheckIn.objects.values_list('like_count', flat=True).get(id=checkin.id)
+
+    def test_toggle_like_view(self):
+        checkin = self.checkins[0]
+        self.client.force_login(self.fans[0])
+        url = reverse('toggle_like', args=[checkin.id])
+        self.assertEqual(self.client.post(url).json(), {'status': 'success', 'liked': True, 'count': 1})
+        self.client.force_login(self.fans[1])
+        self.assertEqual(self.client.post(url).json()['count'], 2)
+        self.assertEqual(self.client.post(url).json(), {'status': 'success', 'liked': False, 'count': 1})
+        self.assertEqual(list(checkin.likes.all()), [self.fans[0]])
+        self.assertEqual(self.client.post(reverse('toggle_like', args=[0])).status_code, 404)
+
+    def test_m2m_changes_keep_count(self):
+        checkin = self.checkins[0]
+        checkin.likes.add(*self.fans)
+        self.assertEqual(self.like_count(checkin), 3)
+        checkin.likes.remove(self.fans[0])
+        self.assertEqual(self.like_count(checkin), 2)
+
+        # 从用户一侧反向操作
+        self.fans[1].liked_checkins.add(*self.checkins[1:])
+        self.assertEqual([self.like_count(c) for c in self.checkins], [2, 1, 1])
+        self.fans[1].liked_checkins.clear()
+        self.assertEqual([self.like_count(c) for c in self.checkins], [1, 0, 0])
+        checkin.likes.clear()
+        self.assertEqual(self.like_count(checkin), 0)
+
+    def test_liked_state_in_one_query(self):
+        fan = self.fans[0]
+        fan.liked_checkins.add(self.checkins[0], self.checkins[2])
+        with self.assertNumQueries(1):
+            liked = liked_checkin_ids(fan, self.checkins)
+        self.assertEqual(liked, {self.checkins[0].id, self.checkins[2].id})
+
+        with self.assertNumQueries(1):
+            rows = [(c.id, c.is_liked, c.like_count) for c in with_liked(DailyCheckIn.objects.order_by('-date'), fan)]
+        self.assertEqual(rows, [(self.checkins[0].id, True, 1), (self.checkins[1].id, False, 0), (self.checkins[2].id, True, 1)])
+
+
+@patch('training.announcements.FLUSH_INTERVAL', 3600)
+class AnnouncementReadStatsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        # 缓冲的阅读事件在测试事务里写完，定时器随之取消
+        self.addCleanup(flush_reads)
+        self.teacher = User.objects.create(username='teacher', is_staff=True)
+        self.students = [make_student(f's{i}') for i in range(4)]
+        self.announcements = [
+            Announcement.objects.create(title=f'公告{i}', content='正文', created_by=self.teacher) for i in range(3)
+        ]
+
+    def read(self, student, announcement):
+        self.client.force_login(student)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.get(reverse('announcement_detail', args=[announcement.id]))
+
+    def test_stats_page_splits_read_and_unread(self):
+        ann = self.announcements[0]
+        for student in self.students[:2]:
+            self.read(student, ann)
+        self.read(self.teacher, ann)
+        self.client.force_login(self.teacher)
+        response = self.client.get(reverse('announcement_stats', args=[ann.id]))
+        self.assertEqual(response.context['read_list'], self.students[:2])
+        self.assertEqual(response.context['unread_list'], self.students[2:])
+        self.assertEqual((response.context['read_count'], response.context['total_count']), (2, 4))
+
+    def test_read_counts_cached_and_incremented(self):
+        ReadRecord.objects.create(announcement=self.announcements[1], student=self.students[0])
+        ids = [ann.id for ann in self.announcements]
+        with self.assertNumQueries(1):
+            self.assertEqual(get_read_counts(ids), {ids[0]: 0, ids[1]: 1, ids[2]: 0})
+        with self.assertNumQueries(0):
+            get_read_counts(ids)
+
+        self.read(self.students[1], self.announcements[1])
+        self.read(self.students[1], self.announcements[1])
+        self.read(self.students[2], self.announcements[2])
+        with self.assertNumQueries(0):
+            self.assertEqual(get_read_counts(ids), {ids[0]: 0, ids[1]: 2, ids[2]: 1})
+
+        self.client.force_login(self.teacher)
+        response = self.client.get(reverse('teacher_dashboard'))
+        rates = {ann.id: (ann.read_count, ann.read_rate) for ann in response.context['announcements']}
+        self.assertEqual(rates[ids[1]], (2, 50))
+
+
+@patch('training.announcements.FLUSH_INTERVAL', 3600)
+class AnnouncementReadTrackingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(flush_reads)
+        self.teacher = User.objects.create(username='teacher', is_staff=True)
+        self.students = [make_student(f's{i}') for i in range(3)]
+        self.announcements = [
+            Announcement.objects.create(title=f'公告{i}', content='正文', created_by=self.teacher) for i in range(3)
+        ]
+
+    def read_queries(self, student, announcement):
+        """打开公告，返回其中访问阅读记录表的 SQL"""
+        self.client.force_login(student)
+        with CaptureQueriesContext(connection) as ctx, self.captureOnCommitCallbacks(execute=True):
+            self.client.get(reverse('announcement_detail', args=[announcement.id]))
+        return [q['sql'] for q in ctx.captured_queries if 'training_readrecord' in q['sql']]
+
+    def test_reads_buffered_and_flushed_in_batch(self):
+        ann = self.announcements[0]
+        self.assertEqual(len(self.read_queries(self.students[0], ann)), 1)
+        self.assertEqual(self.read_queries(self.students[0], ann), [])
+        self.read_queries(self.students[1], ann)
+        self.read_queries(self.students[1], self.announcements[1])
+        self.assertFalse(ReadRecord.objects.exists())
+
+        # 已经写入过的记录再次出现时忽略冲突
+        ReadRecord.objects.create(announcement=ann, student=self.students[0])
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(flush_reads(), 3)
+        self.assertEqual(len([q for q in ctx.captured_queries if q['sql'].startswith('INSERT')]), 1)
+        self.assertEqual(ReadRecord.objects.count(), 3)
+        self.assertEqual(flush_reads(), 0)
+
+    def test_timer_scheduled_for_buffered_reads(self):
+        self.read_queries(self.students[0], self.announcements[0])
+        timer = announcements._timer
+        self.assertTrue(timer.is_alive())
+        self.assertEqual(flush_reads(), 1)
+        self.assertIsNone(announcements._timer)
+        timer.join(1)
+        self.assertFalse(timer.is_alive())
+
+    def test_rolled_back_read_not_buffered(self):
+        self.client.force_login(self.students[0])
+        self.client.get(reverse('announcement_detail', args=[self.announcements[0].id]))
+        self.assertEqual(flush_reads(), 0)
+
+    def test_flush_when_buffer_full(self):
+        with patch('training.announcements.FLUSH_SIZE', 2):
+            self.read_queries(self.students[0], self.announcements[0])
+            self.assertFalse(ReadRecord.objects.exists())
+            self.read_queries(self.students[1], self.announcements[0])
+        self.assertEqual(ReadRecord.objects.count(), 2)
+
+    def test_deleted_announcement_skipped(self):
+        self.read_queries(self.students[0], self.announcements[0])
+        self.read_queries(self.students[0], self.announcements[1])
+        self.announcements[1].delete()
+        self.assertEqual(flush_reads(), 1)
+
+    def test_read_count_rebuild_includes_buffered_reads(self):
+        ann = self.announcements[0]
+        # 计数还不在缓存里，这两次阅读只进了缓冲
+        self.read_queries(self.students[0], ann)
+        self.read_queries(self.students[1], ann)
+        self.assertFalse(ReadRecord.objects.exists())
+        self.assertEqual(get_read_counts([ann.id]), {ann.id: 2})
+        self.read_queries(self.students[2], ann)
+        self.assertEqual(get_read_counts([ann.id]), {ann.id: 3})
+
+    def test_unread_badge(self):
+        student = self.students[0]
+        self.client.force_login(student)
+        self.assertEqual(self.client.get(reverse('student_dashboard')).context['unread_announcements'], 3)
+        self.read_queries(student, self.announcements[0])
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(unread_announcement_count(student), 2)
+        self.assertEqual(len(ctx), 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Announcement.objects.create(title='新公告', content='正文', created_by=self.teacher)
+        self.assertEqual(unread_announcement_count(student), 3)
+        # 缓存丢失后从数据库和本进程缓冲恢复已读集合
+        cache.clear()
+        self.assertEqual(unread_announcement_count(student), 3)
+        flush_reads()
+        cache.clear()
+        self.assertEqual(unread_announcement_count(student), 3)
+
+
+@override_settings(MEDIA_ROOT=TEST_MEDIA_ROOT)
+class AsyncApiTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.student = make_student('student')
+        self.exercises = [Exercise.objects.create(title=f'练习{i}', order=i) for i in range(2)]
+
+    async def test_dashboard_and_exercise_detail(self):
+        await self.async_client.aforce_login(self.student)
+        data = (await self.async_client.get(reverse('api_v1_dashboard'))).json()
+        self.assertEqual((data['totalCount'], data['completedCount']), (2, 0))
+
+        exercise = self.exercises[0]
+        data = (await self.async_client.get(reverse('api_v1_exercise_detail', args=[exercise.id]))).json()
+        self.assertEqual(data['data']['title'], exercise.title)
+        self.assertFalse(data['data']['is_finished'])
+
+    async def test_requires_login(self):
+        data = (await self.async_client.get(reverse('api_v1_dashboard'))).json()
+        self.assertEqual(data['status'], 'error')
+
+    def test_unexpected_errors_keep_json_contract(self):
+        self.client.force_login(self.student)
+        with self.assertLogs('training.api_views', 'ERROR'), \
+                patch('training.api_views.save_practice_upload', side_effect=OSError('磁盘已满')):
+            response = self.client.post(reverse('api_v1_upload', args=[self.exercises[0].id]), {
+                'audio': SimpleUploadedFile('take.webm', b'audio', content_type='audio/webm'),
+            })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {'status': 'error', 'msg': '磁盘已满'})
+
+        make_record(self.student, self.exercises[0])
+        with self.assertLogs('training.api_views', 'ERROR'), \
+                patch('training.api_views.mark_daily_submitted', side_effect=RuntimeError('统计失败')):
+            data = self.client.post(reverse('api_v1_submit')).json()
+        self.assertEqual(data, {'status': 'error', 'msg': '统计失败'})
+
+    def test_upload_then_submit(self):
+        self.client.force_login(self.student)
+        data = self.client.post(reverse('api_v1_submit')).json()
+        self.assertEqual(data['status'], 'error')
+
+        exercise = self.exercises[1]
+        data = self.client.post(reverse('api_v1_upload', args=[exercise.id]), {
+            'audio': SimpleUploadedFile('take.webm', b'audio', content_type='audio/webm'),
+        }).json()
+        self.assertEqual(data['status'], 'success')
+        self.assertTrue(PracticeRecord.objects.filter(student=self.student, exercise=exercise).exists())
+
+        data = self.client.get(reverse('api_v1_dashboard')).json()
+        self.assertEqual(data['completedCount'], 1)
+        data = self.client.post(reverse('api_v1_submit')).json()
+        self.assertEqual(data['status'], 'success')
+        self.assertTrue(DailyCheckIn.objects.get(student=self.student).is_submitted)
+
+    def dashboard_query_count(self):
+        self.client.force_login(self.student)
+        self.client.get(reverse('api_v1_dashboard'))
+        with CaptureQueriesContext(connection) as ctx:
+            data = self.client.get(reverse('api_v1_dashboard')).json()
+        return data, len(ctx)
+
+    def test_dashboard_queries_independent_of_exercise_count(self):
+        _, few = self.dashboard_query_count()
+        with self.captureOnCommitCallbacks(execute=True):
+            for i in range(10):
+                Exercise.objects.create(title=f'进阶{i}', order=10 + i, is_advanced=i % 2 == 0)
+        data, many = self.dashboard_query_count()
+        # 会话 + 用户 + 打卡单 + 录音练习 ID
+        self.assertEqual(few, many)
+        self.assertEqual(many, 4)
+        self.assertEqual((data['totalCount'], data['advancedTotalCount']), (7, 5))
+        self.assertEqual(len(data['exercises']), 12)
+
+    def test_login(self):
+        user = User.objects.create_user('login_user', password='secret-pass')
+        response = self.client.post(reverse('api_v1_login'), {'username': 'login_user', 'password': 'secret-pass'},
+                                    content_type='application/json')
+        self.assertEqual(response.json()['user']['id'], user.id)
+        response = self.client.post(reverse('api_v1_login'), {'username': 'login_user', 'password': 'wrong'})
+        self.assertEqual(response.json()['status'], 'error')
+
+
+@skipUnless(importlib.util.find_spec('gunicorn') and importlib.util.find_spec('uvicorn'),
+            "需要安装 gunicorn 和 uvicorn")
+class ApiBenchmarkCommandTests(TransactionTestCase):
+    def test_benchmark_reports_both_servers(self):
+        # 服务器子进程读的是这个测试库 (TransactionTestCase 的数据已提交)
+        make_student('bench')
+        Exercise.objects.create(title='练习', order=1)
+        out = io.StringIO()
+        call_command('benchmark_api', username='bench', requests=4, concurrency=2, workers=1, threads=2, stdout=out)
+        lines = out.getvalue().splitlines()
+        self.assertEqual(len(lines), 5)
+        self.assertEqual(sum(' WSGI ' in line for line in lines), 2)
+        self.assertEqual(sum(' ASGI ' in line for line in lines), 2)
+
+
+class ExerciseCatalogTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.normal = Exercise.objects.create(title='普通', order=2, content='<p>很长的富文本</p>')
+        self.advanced = Exercise.objects.create(title='进阶', order=1, is_advanced=True)
+
+    def test_partitions_lookup_and_counts(self):
+        catalog = get_exercise_catalog()
+        self.assertEqual([ex.title for ex in catalog.exercises], ['进阶', '普通'])
+        self.assertEqual((catalog.count, catalog.normal_count, catalog.advanced_count), (2, 1, 1))
+        self.assertEqual(catalog.get(str(self.normal.id)).title, '普通')
+        self.assertIsNone(catalog.get('abc'))
+        # 富文本不常驻内存
+        self.assertIn('content', catalog.get(self.normal.id).get_deferred_fields())
+
+    def test_reused_until_version_changes(self):
+        catalog = get_exercise_catalog()
+        with self.assertNumQueries(0):
+            self.assertIs(get_exercise_catalog(), catalog)
+
+        self.normal.title = '改名'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.normal.save()
+        self.assertEqual(get_exercise_catalog().get(self.normal.id).title, '改名')
+
+    def test_other_process_change_is_seen(self):
+        get_exercise_catalog()
+        # 模拟另一个 worker 进程修改了练习：数据库变了，只有共享缓存里的版本号通知到本进程
+        Exercise.objects.filter(id=self.advanced.id).update(title='后台修改')
+        self.assertEqual(get_exercise_catalog().get(self.advanced.id).title, '进阶')
+        with self.captureOnCommitCallbacks(execute=True):
+            invalidate_catalog()
+        self.assertEqual(get_exercise_catalog().get(self.advanced.id).title, '后台修改')
+
+
+@override_settings(MEDIA_ROOT=TEST_MEDIA_ROOT)
+class ContentCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.student = make_student('student')
+        self.exercise = Exercise.objects.create(title='练习', order=1, content='<p>富文本</p>')
+        self.client.force_login(self.student)
+
+    def test_repeat_request_served_from_cache_with_304(self):
+        url = reverse('api_v1_exercise_detail', args=[self.exercise.id])
+        first = self.client.get(url)
+        etag = first['ETag']
+        self.assertIn('no-cache', first['Cache-Control'])
+
+        with CaptureQueriesContext(connection) as ctx:
+            second = self.client.get(url)
+        self.assertEqual(second.content, first.content)
+        self.assertFalse([q for q in ctx.captured_queries if 'training_exercise' in q['sql']])
+
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def test_exercise_change_invalidates(self):
+        url = reverse('api_v1_exercises')
+        etag = self.client.get(url)['ETag']
+        self.exercise.title = '改名'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.exercise.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['data'][0]['title'], '改名')
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_new_recording_invalidates_detail(self):
+        url = reverse('api_v1_exercise_detail', args=[self.exercise.id])
+        self.assertFalse(self.client.get(url).json()['data']['is_finished'])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('api_v1_upload', args=[self.exercise.id]), {
+                'audio': SimpleUploadedFile('take.webm', b'audio', content_type='audio/webm'),
+            })
+        self.assertTrue(self.client.get(url).json()['data']['is_finished'])
+
+    def test_announcement_conditional_get(self):
+        teacher = User.objects.create_user('teacher', password='x', is_staff=True)
+        announcement = Announcement.objects.create(title='通知', content='<p>内容</p>', created_by=teacher)
+        url = reverse('announcement_detail', args=[announcement.id])
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.has_header('Last-Modified'))
+
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+        announcement.title = '更正'
+        with self.captureOnCommitCallbacks(execute=True):
+            announcement.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, '更正')
+
+    def test_announcement_repeat_visit_skips_announcement_table(self):
+        teacher = User.objects.create_user('teacher', password='x', is_staff=True)
+        announcement = Announcement.objects.create(title='通知', content='<p>内容</p>', created_by=teacher)
+        url = reverse('announcement_detail', args=[announcement.id])
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertContains(response, '内容')
+        self.assertFalse([q for q in ctx.captured_queries if 'training_announcement' in q['sql']])
+
+    def serve(self, view, user, **headers):
+        """按请求处理的顺序走一遍中间件 (命中缓存时不执行视图)"""
+        request = RequestFactory().get('/api/probe/', **headers)
+        request.user = user
+        middleware = ContentCacheMiddleware(lambda request: None)
+        response = middleware.process_view(request, view, (), {}) or view(request)
+        return middleware.process_response(request, response)
+
+    def counting_view(self, make_response):
+        calls = []
+
+        @content_cache(CATALOG)
+        def view(request):
+            calls.append(request.user)
+            return make_response()
+        return view, calls
+
+    def test_cache_key_includes_login(self):
+        view, calls = self.counting_view(lambda: JsonResponse({'status': 'success'}))
+        self.serve(view, self.student)
+        self.serve(view, self.student)
+        self.assertEqual(len(calls), 1)
+        # 未登录的请求不会拿到登录后缓存的响应
+        self.serve(view, AnonymousUser())
+        self.assertEqual(len(calls), 2)
+
+    def test_error_payload_not_cached(self):
+        view, calls = self.counting_view(lambda: JsonResponse({'status': 'error', 'msg': '练习不存在'}))
+        self.serve(view, self.student)
+        response = self.serve(view, self.student)
+        self.assertEqual(len(calls), 2)
+        self.assertFalse(response.has_header('ETag'))
+
+    def test_vary_other_than_cookie_not_cached(self):
+        def make_response(vary):
+            response = JsonResponse({'status': 'success'})
+            response['Vary'] = vary
+            return response
+
+        view, calls = self.counting_view(lambda: make_response('Cookie'))
+        self.serve(view, self.student)
+        self.serve(view, self.student)
+        self.assertEqual(len(calls), 1)
+
+        cache.clear()
+        view, calls = self.counting_view(lambda: make_response('Cookie, Accept-Language'))
+        self.serve(view, self.student, HTTP_ACCEPT_LANGUAGE='en')
+        self.serve(view, self.student, HTTP_ACCEPT_LANGUAGE='zh-hans')
+        self.assertEqual(len(calls), 2)
+
+
+def save_upload_image(name, size=(2000, 1000), mode='RGB'):
+    buffer = io.BytesIO()
+    Image.new(mode, size, 'red').save(buffer, 'PNG')
+    default_storage.save(name, ContentFile(buffer.getvalue()))
+    return name
+
+
+@override_settings(MEDIA_ROOT=TEST_MEDIA_ROOT)
+class ContentImageTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.name = save_upload_image('uploads/2026/10/17/photo.png')
+        self.html = f'<p>图</p><img alt="" src="/media/{self.name}" style="width:500px" />'
+
+    def tearDown(self):
+        shutil.rmtree(os.path.join(TEST_MEDIA_ROOT, 'uploads'), ignore_errors=True)
+        shutil.rmtree(os.path.join(TEST_MEDIA_ROOT, VARIANTS_DIR), ignore_errors=True)
+
+    def test_derive_widths_and_formats(self):
+        self.assertEqual(derive_image(self.name), [480, 960, 1600])
+        with default_storage.open(variant_name(self.name, 480, 'webp'), 'rb') as fh:
+            image = Image.open(fh)
+            self.assertEqual((image.format, image.size), ('WEBP', (480, 240)))
+        self.assertTrue(default_storage.exists(variant_name(self.name, 1600, 'jpg')))
+
+        small = save_upload_image('uploads/2026/10/17/small.png', size=(600, 300), mode='RGBA')
+        self.assertEqual(derive_image(small), [480, 600])
+
+    def test_rewrite_is_idempotent_and_skips_external(self):
+        html, changed = rewrite_content(self.html + '<img src="https://example.com/a.png">')
+        self.assertEqual(changed, 1)
+        self.assertIn('<picture><source type="image/webp"', html)
+        self.assertIn('.w960.jpg 960w', html)
+        self.assertIn('<img src="https://example.com/a.png">', html)
+        self.assertEqual(rewrite_content(html), (html, 0))
+
+    def test_save_enqueues_rewrite(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            exercise = Exercise.objects.create(title='练习', order=1, content=self.html)
+        self.assertEqual(Job.objects.filter(kind='optimize_content_images').count(), 1)
+        run_pending()
+        exercise.refresh_from_db()
+        self.assertIn('srcset=', exercise.content)
+        self.assertFalse(needs_rewrite(exercise.content))
+
+
+@override_settings(MEDIA_ROOT=TEST_MEDIA_ROOT)
+class DeriveImagesCommandTests(TransactionTestCase):
+    def tearDown(self):
+        shutil.rmtree(os.path.join(TEST_MEDIA_ROOT, 'uploads'), ignore_errors=True)
+        shutil.rmtree(os.path.join(TEST_MEDIA_ROOT, VARIANTS_DIR), ignore_errors=True)
+
+    def test_backfill_with_process_pool(self):
+        names = [save_upload_image(f'uploads/2026/10/{day}/photo.png') for day in (1, 2, 3)]
+        teacher = User.objects.create_user('teacher', is_staff=True)
+        announcement = Announcement.objects.create(
+            title='通知', content=f'<img src="/media/{names[0]}">', created_by=teacher
+        )
+        out = io.StringIO()
+        call_command('derive_images', workers=2, stdout=out)
+        for name in names:
+            self.assertTrue(default_storage.exists(variant_name(name, 480, 'webp')))
+        announcement.refresh_from_db()
+        self.assertIn('srcset=', announcement.content)
+
+
+class StaticAssetTests(TestCase):
+    def setUp(self):
+        self.static_root = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.static_root, ignore_errors=True)
+
+    def test_collectstatic_fingerprints_and_compresses(self):
+        with override_settings(STATIC_ROOT=self.static_root, STORAGES={
+            **settings.STORAGES,
+            'staticfiles': {'BACKEND': 'whitenoise.storage.CompressedManifestStaticFilesStorage'},
+        }):
+            call_command('collectstatic', interactive=False, verbosity=0, ignore_patterns=['admin', 'ckeditor'])
+            with open(os.path.join(self.static_root, 'staticfiles.json')) as fh:
+                hashed = json.load(fh)['paths']['training/js/recorder.js']
+            self.assertRegex(hashed, r'^training/js/recorder\.[0-9a-f]{12}\.js$')
+            self.assertTrue(os.path.exists(os.path.join(self.static_root, hashed + '.gz')))
+
+            exercise = Exercise.objects.create(title='练习', order=1)
+            self.client.force_login(make_student('student'))
+            html = self.client.get(reverse('exercise_detail', args=[exercise.id])).content.decode()
+        self.assertIn(f'/static/{hashed}', html)
+        # 录音脚本和样式不再内联在页面里
+        self.assertNotIn('.landscape-img-slide', html)
+        self.assertNotIn('new MediaRecorder', html)
+
+    def test_recording_pages_share_recorder_js(self):
+        templates = os.path.join(settings.BASE_DIR, 'training', 'templates', 'training')
+        for name in os.listdir(templates):
+            with open(os.path.join(templates, name), encoding='utf-8') as fh:
+                source = fh.read()
+            self.assertNotIn('getUserMedia', source, name)
+            self.assertNotIn('MediaRecorder', source, name)
+
+        record = make_record(make_student('student'), Exercise.objects.create(title='练习', order=1))
+        self.client.force_login(User.objects.create(username='teacher', is_staff=True))
+        for url in (reverse('shared_record_detail', args=[record.id]), reverse('create_announcement')):
+            self.assertContains(self.client.get(url), 'training/js/recorder.js')
+
+
+class DatabaseProfileTests(TestCase):
+    @skipUnless(connection.vendor == 'sqlite', "SQLite 专用")
+    def test_sqlite_pragmas_applied_on_connect(self):
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode')
+            self.assertEqual(cursor.fetchone()[0], 'wal')
+            cursor.execute('PRAGMA synchronous')
+            # 1 = NORMAL
+            self.assertEqual(cursor.fetchone()[0], 1)
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0], 20000)
+
+    @skipUnless(connection.vendor == 'postgresql', "PostgreSQL 专用")
+    def test_postgres_connection_settings(self):
+        options = settings.DATABASES['default'].get('OPTIONS', {})
+        if 'pool' in options:
+            # DB_POOL=1：连接来自 psycopg 连接池，大小按 DB_POOL_MAX
+            self.assertIsNotNone(connection.pool)
+            self.assertEqual(connection.pool.max_size, options['pool']['max_size'])
+        else:
+            self.assertEqual(connection.settings_dict['CONN_MAX_AGE'], settings.DATABASES['default']['CONN_MAX_AGE'])
+        self.assertTrue(connection.settings_dict['CONN_HEALTH_CHECKS'])
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT 1')
+            self.assertEqual(cursor.fetchone()[0], 1)
+
+
+SETTINGS_ENV_VARS = (
+    'DB_ENGINE', 'DB_NAME', 'DB_USER', 'DB_PASSWORD', 'DB_HOST', 'DB_PORT',
+    'DB_POOL', 'DB_POOL_MAX', 'DB_CONN_MAX_AGE', 'CACHE_BACKEND', 'REDIS_URL',
+)
+
+
+def load_settings(**env):
+    """在给定的环境变量下重新执行 config/settings.py (其余相关变量视为未设置)，返回模块内容"""
+    with patch.dict(os.environ, env):
+        for name in SETTINGS_ENV_VARS:
+            if name not in env:
+                os.environ.pop(name, None)
+        return runpy.run_path(os.path.join(settings.BASE_DIR, 'config', 'settings.py'))
+
+
+class DatabaseSettingsTests(SimpleTestCase):
+    """config/settings.py 按环境变量选择数据库 (不连接数据库，只检查生成的 DATABASES)"""
+
+    def load_databases(self, **env):
+        return load_settings(**env)['DATABASES']
+
+    def test_postgres_with_pool(self):
+        db = self.load_databases(
+            DB_ENGINE='postgres', DB_NAME='school', DB_USER='app', DB_PASSWORD='secret',
+            DB_HOST='db.internal', DB_PORT='6432', DB_POOL_MAX='4',
+        )['default']
+        self.assertEqual(db, {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': 'school', 'USER': 'app', 'PASSWORD': 'secret',
+            'HOST': 'db.internal', 'PORT': '6432',
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {'pool': {'min_size': 1, 'max_size': 4, 'timeout': 10}},
+        })
+
+    def test_postgres_behind_external_pooler(self):
+        db = self.load_databases(DB_ENGINE='postgres', DB_POOL='0', DB_CONN_MAX_AGE='300')['default']
+        self.assertEqual(db['CONN_MAX_AGE'], 300)
+        self.assertNotIn('OPTIONS', db)
+        self.assertEqual((db['NAME'], db['HOST'], db['PORT']), ('training', '127.0.0.1', '5432'))
+
+    def test_sqlite_is_default(self):
+        db = self.load_databases()['default']
+        self.assertEqual(db['ENGINE'], 'django.db.backends.sqlite3')
+        self.assertEqual(db['TEST']['NAME'], settings.BASE_DIR / 'test_db.sqlite3')
+
+
+class CacheSettingsTests(SimpleTestCase):
+    def test_redis_is_default(self):
+        cache_settings = load_settings(REDIS_URL='redis://cache.internal:6379/2')['CACHES']['default']
+        self.assertEqual(cache_settings, {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': 'redis://cache.internal:6379/2',
+        })
+
+    def test_locmem_for_single_process_dev(self):
+        cache_settings = load_settings(CACHE_BACKEND='locmem')['CACHES']['default']
+        self.assertEqual(cache_settings['BACKEND'], 'django.core.cache.backends.locmem.LocMemCache')
+
+    def test_deploy_check_requires_shared_cache(self):
+        with override_settings(CACHES=load_settings(CACHE_BACKEND='locmem')['CACHES']):
+            self.assertEqual([e.id for e in check_shared_cache(None)], ['training.E001'])
+        with override_settings(CACHES=load_settings()['CACHES']):
+            self.assertEqual(check_shared_cache(None), [])
+
+
+class TransferDataCommandTests(TransactionTestCase):
+    def test_import_legacy_fixture(self):
+        fixture = os.path.join(settings.BASE_DIR, 'data.json')
+        with open(fixture) as fh:
+            legacy = json.load(fh)
+        expected_records = sum(1 for obj in legacy if obj['model'] == 'training.practicerecord')
+        first = next(obj for obj in legacy if obj['model'] == 'training.practicerecord')
+
+        out = io.StringIO()
+        call_command('transfer_data', from_fixture=fixture, stdout=out)
+        self.assertEqual(PracticeRecord.objects.count(), expected_records)
+        record = PracticeRecord.objects.get(pk=first['pk'])
+        # 旧数据没有练习日期：按提交时间的本地日期补齐
+        self.assertEqual(record.practice_date, timezone.localtime(record.submitted_at).date())
+        self.assertTrue(DailyPracticeStat.objects.exists())
+        with self.assertRaises(ConnectionDoesNotExist):
+            connections['transfer_source']
+
+    def test_refuses_non_empty_target(self):
+        make_student('existing')
+        with self.assertRaises(CommandError):
+            call_command('transfer_data', from_fixture=os.path.join(settings.BASE_DIR, 'data.json'))
+
+    def test_import_sqlite_file(self):
+        # 先在子进程里按默认的 SQLite 配置用 fixture 建一个旧库文件 (目标库可能是 PostgreSQL)，
+        # 再从这个文件导入目标库
+        fixture = os.path.join(settings.BASE_DIR, 'data.json')
+        with open(fixture) as fh:
+            users = sum(1 for obj in json.load(fh) if obj['model'] == 'auth.user')
+        legacy_dir = tempfile.mkdtemp()
+        try:
+            legacy_db = os.path.join(legacy_dir, 'db.sqlite3')
+            env = {name: value for name, value in os.environ.items() if name not in SETTINGS_ENV_VARS}
+            subprocess.run(
+                [sys.executable, 'manage.py', 'transfer_data', '--from-fixture', fixture],
+                env={**env, 'DB_NAME': legacy_db, 'CACHE_BACKEND': 'locmem'},
+                cwd=settings.BASE_DIR, check=True, capture_output=True,
+            )
+
+            call_command('transfer_data', from_sqlite=legacy_db, stdout=io.StringIO())
+            self.assertEqual(User.objects.count(), users)
+        finally:
+            shutil.rmtree(legacy_dir, ignore_errors=True)
+
+
+class HistoryPaginationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.student = make_student('student')
+        exercise = Exercise.objects.create(title='练习', order=1)
+        self.records = [make_record(self.student, exercise) for _ in range(5)]
+        # 两条在前一天；今天的三条提交时间相同，靠 id 区分先后
+        backdate(PracticeRecord.objects.filter(id__in=[r.id for r in self.records[:2]]), 1)
+        PracticeRecord.objects.filter(id__in=[r.id for r in self.records[2:]]).update(
+            submitted_at=timezone.now()
+        )
+
+    def walk(self, url):
+        ids, counts, cursor = [], {}, ''
+        while True:
+            data = self.client.get(url, {'cursor': cursor, 'limit': 2}).json()
+            self.assertEqual(data['status'], 'success')
+            for day in data['days']:
+                counts[day['date']] = day['count']
+                ids += [record['id'] for record in day['records']]
+            cursor = data['next_cursor']
+            if not cursor:
+                return ids, counts
+
+    def test_cursor_walks_every_record_once(self):
+        self.client.force_login(self.student)
+        ids, counts = self.walk(reverse('api_v1_history'))
+        expected = list(PracticeRecord.objects.order_by('-submitted_at', '-id').values_list('id', flat=True))
+        self.assertEqual(ids, expected)
+        # 一天的录音跨页时，条数仍是全天的
+        self.assertEqual(sorted(counts.values()), [2, 3])
+
+    def test_teacher_reads_student_history(self):
+        teacher = User.objects.create_user('teacher', is_staff=True)
+        url = reverse('api_v1_student_history', args=[self.student.id])
+        self.client.force_login(make_student('other'))
+        self.assertEqual(self.client.get(url).json()['status'], 'error')
+        self.client.force_login(teacher)
+        ids, _ = self.walk(url)
+        self.assertEqual(len(ids), 5)
+
+    def test_invalid_cursor(self):
+        self.client.force_login(self.student)
+        data = self.client.get(reverse('api_v1_history'), {'cursor': 'not-a-cursor'}).json()
+        self.assertEqual(data['status'], 'error')
+
+    @override_settings(MEDIA_ROOT=TEST_MEDIA_ROOT)
+    def test_page_renders_first_page_only(self):
+        self.client.force_login(self.student)
+        with patch('training.history.PAGE_SIZE', 3):
+            response = self.client.get(reverse('student_history'))
+        self.assertEqual(response.context['total_records'], 5)
+        self.assertEqual(sum(len(day['records']) for day in response.context['history_days']), 3)
+        self.assertIsNotNone(response.context['history_config']['nextCursor'])
@@ -0,0 +1,63 @@
+import os
+
+from django.conf import settings
+
+# ==========================================
+# 分片上传：临时文件与区间记录
+# ==========================================
+
+UPLOAD_TEMP_DIR = 'upload_tmp'
+# 低于 DATA_UPLOAD_MAX_MEMORY_SIZE (默认 2.5MB)，否则 request.body 会被拒绝
+MAX_CHUNK_SIZE = 2 * 1024 * 1024
+MAX_UPLOAD_SIZE = 200 * 1024 * 1024
+
+
+def temp_path(session):
+    """分片直接写入 MEDIA_ROOT 下的临时文件"""
+    return os.path.join(settings.MEDIA_ROOT, UPLOAD_TEMP_DIR, f'{session.id}.part')
+
+
+def create_temp_file(session):
+    """预先建好与最终大小一致的空文件，分片按偏移量写入即可乱序到达"""
+    path = temp_path(session)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as fh:
+        fh.truncate(session.total_size)
+    return path
+
+
+def write_chunk(session, offset, data):
+    with open(temp_path(session), 'r+b') as fh:
+        fh.seek(offset)
+        fh.write(data)
+
+
+def discard_temp_file(session):
+    try:
+        os.remove(temp_path(session))
+    except FileNotFoundError:
+        pass
+
+
+def merge_range(ranges, start, end):
+    """把 [start, end) 并入已接收区间，重复或重叠的分片自动合并"""
+    merged = []
+    for cur_start, cur_end in sorted(ranges + [[start, end]]):
+        if merged and cur_start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], cur_end)
+        else:
+            merged.append([cur_start, cur_end])
+    return merged
+
+
+def missing_ranges(ranges, total_size):
+    """还缺的区间，客户端据此续传"""
+    missing = []
+    position = 0
+    for start, end in ranges:
+        if start > position:
+            missing.append([position, start])
+        position = max(position, end)
+    if position < total_size:
+        missing.append([position, total_size])
+    return missing
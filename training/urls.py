@@ -1,9 +1,7 @@
 from django.urls import path
 from django.contrib.auth import views as auth_views
 from . import views
-
-# 如果您有 api_views.py 并且需要用，请取消下面这行的注释
-# from . import api_views
+from . import api_views
 
 urlpatterns = [
     # ==========================================
@@ -55,6 +53,16 @@ urlpatterns = [
     # 下载录音文件
     path('download/<int:record_id>/', views.download_record_audio, name='download_record_audio'),
 
+    # 打包下载录音 (ZIP)
+    path('export/checkin/<int:checkin_id>/', views.export_checkin_audio, name='export_checkin_audio'),
+    path('export/student/<int:student_id>/week/', views.export_student_week_audio, name='export_student_week_audio'),
+    path('export/class/week/', views.export_class_week_audio, name='export_class_week_audio'),
+
+    # 流式播放音频 (学员录音 / 老师点评 / 示范音频 / 公告语音)
+    path('audio/<str:kind>/<int:obj_id>/', views.stream_audio, name='stream_audio'),
+    # 音频波形峰值
+    path('api/peaks/<str:kind>/<int:obj_id>/', views.api_audio_peaks, name='api_audio_peaks'),
+
     # 学员历史录音
     path('history/', views.student_history, name='student_history'),
     
@@ -76,24 +84,33 @@ urlpatterns = [
     # ==========================================
 
     # 基础接口
-    path('api/test/', views.api_test, name='api_test'),
-    path('api/login/', views.api_login, name='api_login'),
+    path('api/test/', api_views.ping, name='api_test'),
+    path('api/login/', api_views.login_view, name='api_login'),
 
     # 练习数据
-    path('api/exercises/', views.api_exercise_list, name='api_exercise_list'),
-    path('api/exercise/<int:exercise_id>/', views.api_exercise_detail, name='api_exercise_detail'),
+    path('api/exercises/', api_views.exercise_list, name='api_exercise_list'),
+    path('api/exercise/<int:exercise_id>/', api_views.exercise_detail, name='api_exercise_detail'),
 
     # 🔥 核心业务接口 🔥
     # 1. 上传录音
-    path('api/upload_practice/', views.api_upload_practice, name='api_upload_practice'),
+    path('api/upload_practice/', api_views.upload_recording, name='api_upload_practice'),
+
+    # 1.1 分片上传 (断点续传): init -> chunk -> finalize
+    path('api/upload/init/', views.api_upload_init, name='api_upload_init'),
+    path('api/upload/<uuid:upload_id>/', views.api_upload_status, name='api_upload_status'),
+    path('api/upload/<uuid:upload_id>/chunk/', views.api_upload_chunk, name='api_upload_chunk'),
+    path('api/upload/<uuid:upload_id>/finalize/', views.api_upload_finalize, name='api_upload_finalize'),
+
+    # 1.2 后台任务状态 (上传后轮询经验结算结果)
+    path('api/jobs/<int:job_id>/', views.api_job_status, name='api_job_status'),
 
     # 2. 删除历史录音
     path('api/delete_record/<int:record_id>/', views.api_delete_practice_record, name='api_delete_record'),
 
     # 3. 提交日报
-    path('api/submit_daily/', views.submit_daily_checkin, name='submit_daily_checkin'),
+    path('api/submit_daily/', api_views.submit_daily, name='submit_daily_checkin'),
 
-    path('api/my_practices/', views.api_my_practice_list, name='api_my_practice_list'),
+    path('api/my_practices/', api_views.checkin_list, name='api_my_practice_list'),
 
     # 老师端 API (提交总评、获取列表)
     path('api/teacher/checkins/', views.api_teacher_checkins, name='api_teacher_checkins'),
@@ -117,12 +134,16 @@ urlpatterns = [
     path('api/encouragement/read/<int:msg_id>/', views.api_mark_encouragement_read, name='api_mark_encouragement_read'),
 
     # ==========================================
-    # 6. 小程序专用接口 (如果您还有 api_views.py)
+    # 6. JSON 接口 v1 (异步视图，网页和小程序共用；上面的旧地址指向同样的视图)
     # ==========================================
-    # 如果您确认现在的 views.py 已经够用，下面这些可以注释掉，或者确保导入了 api_views
-    # path('api/mp/dashboard/', api_views.dashboard_data, name='mp_dashboard'),
-    # path('api/mp/exercise/<int:exercise_id>/', api_views.exercise_detail, name='mp_exercise_detail'),
-    # path('api/mp/upload/<int:exercise_id>/', api_views.upload_recording, name='mp_upload'),
-    # path('api/mp/login/', api_views.mp_login, name='mp_login'),
+    path('api/v1/ping/', api_views.ping, name='api_v1_ping'),
+    path('api/v1/login/', api_views.login_view, name='api_v1_login'),
+    path('api/v1/dashboard/', api_views.dashboard, name='api_v1_dashboard'),
+    path('api/v1/exercises/', api_views.exercise_list, name='api_v1_exercises'),
+    path('api/v1/exercises/<int:exercise_id>/', api_views.exercise_detail, name='api_v1_exercise_detail'),
+    path('api/v1/exercises/<int:exercise_id>/recordings/', api_views.upload_recording, name='api_v1_upload'),
+    path('api/v1/checkins/', api_views.checkin_list, name='api_v1_checkins'),
+    path('api/v1/checkins/submit/', api_views.submit_daily, name='api_v1_submit'),
+    path('api/v1/history/', api_views.history, name='api_v1_history'),
+    path('api/v1/students/<int:student_id>/history/', api_views.history, name='api_v1_student_history'),
 ]
-
@@ -1,21 +1,49 @@
 from django.utils import timezone  # 核心引入
 import datetime
+import hashlib
 import json
 import os
 
 from django.contrib.auth.models import User
+from django.core.files import File
+from django.db import transaction
+from django.core.cache import cache
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import quote_etag, content_disposition_header, http_date
 from django.views.decorators.csrf import csrf_exempt
 from django.contrib.auth import login, logout, authenticate
 from .forms import ChineseUserCreationForm, AnnouncementForm
 from django.shortcuts import render, redirect, get_object_or_404
+from django.urls import reverse
 from django.contrib.auth.decorators import login_required
-from django.http import JsonResponse, HttpResponse, Http404
-from django.db.models import Max, Q
+from django.contrib.auth.views import redirect_to_login
+from django.http import JsonResponse, HttpResponse, Http404, StreamingHttpResponse
+from django.db.models import Q
 
 # 引入我们定义的数据模型
 from .models import (
-    Exercise, PracticeRecord, DailyCheckIn, Announcement, ReadRecord,
-    StudentProfile, Achievement, StudentAchievement, BuddyPair, Encouragement
+    Exercise, PracticeRecord, DailyCheckIn, Announcement,
+    StudentProfile, Achievement, StudentAchievement, BuddyPair, Encouragement,
+    DailyPracticeStat, UploadSession, Job
+)
+from .stats import (
+    get_student_stats, get_latest_submitted_checkins,
+    refresh_daily_stats,
+    submitted_on, latest_records
+)
+from .jobs import enqueue
+from .streaming import serve_file, valid_audio_signature
+from .caching import cached_context, CLASS
+from .feed import get_class_feed
+from .announcements import get_read_counts, read_status, record_read, unread_announcement_count
+from .history import history_page
+from .likes import toggle_like as toggle_checkin_like, with_liked
+from .catalog import get_exercise_catalog
+from .exports import iter_zip, record_entries, week_records, safe_name
+from .peaks import PEAK_SOURCES, load_peaks, sidecar_name as peaks_sidecar_name
+from .uploads import (
+    MAX_CHUNK_SIZE, MAX_UPLOAD_SIZE, create_temp_file, write_chunk, discard_temp_file,
+    merge_range, missing_ranges, temp_path as upload_temp_path
 )
 
 # ==========================================
@@ -31,83 +59,6 @@ def get_or_create_profile(user):
     profile, created = StudentProfile.objects.get_or_create(user=user)
     return profile
 
-def add_experience(user, exp_amount, reason="练习"):
-    """为用户增加经验值并检查成就"""
-    profile = get_or_create_profile(user)
-    profile.experience_points += exp_amount
-    profile.update_level()
-    profile.save()
-    
-    # 检查经验值相关成就
-    check_achievements(user, profile)
-    return profile
-
-def update_practice_streak(user):
-    """更新连续练习天数"""
-    profile = get_or_create_profile(user)
-    today = timezone.localdate()
-    
-    if profile.last_practice_date is None:
-        # 首次练习
-        profile.streak_days = 1
-        profile.total_practice_days = 1
-    elif profile.last_practice_date == today:
-        # 今天已经练习过，不重复计算
-        pass
-    elif profile.last_practice_date == today - datetime.timedelta(days=1):
-        # 连续练习
-        profile.streak_days += 1
-        profile.total_practice_days += 1
-    else:
-        # 断了，重新开始
-        profile.streak_days = 1
-        profile.total_practice_days += 1
-    
-    profile.last_practice_date = today
-    profile.save()
-    
-    # 计算连续天数奖励经验 (最高50)
-    streak_bonus = min(profile.streak_days * 5, 50)
-    
-    # 检查连续天数相关成就
-    check_achievements(user, profile)
-    
-    return profile, streak_bonus
-
-def check_achievements(user, profile):
-    """检查并解锁成就"""
-    unlocked = []
-    all_achievements = Achievement.objects.all()
-    
-    for achievement in all_achievements:
-        # 检查是否已获得
-        if StudentAchievement.objects.filter(student=user, achievement=achievement).exists():
-            continue
-        
-        # 根据条件类型检查
-        earned = False
-        if achievement.condition_type == 'streak' and profile.streak_days >= achievement.condition_value:
-            earned = True
-        elif achievement.condition_type == 'total_days' and profile.total_practice_days >= achievement.condition_value:
-            earned = True
-        elif achievement.condition_type == 'exp' and profile.experience_points >= achievement.condition_value:
-            earned = True
-        elif achievement.condition_type == 'recordings' and profile.total_recordings >= achievement.condition_value:
-            earned = True
-        elif achievement.condition_type == 'level' and profile.level >= achievement.condition_value:
-            earned = True
-        elif achievement.condition_type == 'first' and profile.total_recordings >= 1:
-            earned = True
-        
-        if earned:
-            StudentAchievement.objects.create(student=user, achievement=achievement)
-            # 成就奖励经验
-            profile.experience_points += achievement.exp_reward
-            profile.save()
-            unlocked.append(achievement)
-    
-    return unlocked
-
 def get_buddy_info(user):
     """获取伙伴信息"""
     pair = BuddyPair.objects.filter(
@@ -122,14 +73,12 @@ def get_buddy_info(user):
     if not buddy:
         return None
     
-    # 获取伙伴今日练习进度
+    # 获取伙伴今日练习进度 (读每日汇总)
     today = timezone.localdate()
-    buddy_records_today = PracticeRecord.objects.filter(
-        student=buddy,
-        submitted_at__date=today
-    ).count()
+    buddy_stat = DailyPracticeStat.objects.filter(student=buddy, date=today).first()
+    buddy_records_today = buddy_stat.exercise_count if buddy_stat else 0
     
-    total_exercises = Exercise.objects.count()
+    total_exercises = get_exercise_catalog().count
     
     # 获取伙伴的游戏档案
     buddy_profile = get_or_create_profile(buddy)
@@ -150,80 +99,144 @@ def get_buddy_info(user):
         'unread_encouragements': unread_count,
     }
 
+def save_practice_upload(user, exercise, audio_file):
+    """保存录音为本周最佳并排队结算经验，返回接口响应数据 (普通上传和分片上传共用)"""
+    today = timezone.localdate()
+    start_of_week = get_week_start()
+
+    daily_checkin_today, _ = DailyCheckIn.objects.get_or_create(
+        student=user, date=today, defaults={'is_submitted': False}
+    )
+
+    existing_record = latest_records(start_of_week, student=user, exercise=exercise).first()
+
+    is_new_recording = existing_record is None
+    stat_dates = [today]
+
+    if existing_record:
+        stat_dates.append(existing_record.practice_date)
+        record = existing_record
+        # 旧录音的播放版本和参数作废，等后台任务重新生成
+        if record.playback_audio:
+            record.playback_audio.delete(save=False)
+        record.audio_duration = record.audio_bitrate = None
+        record.audio_codec = ''
+        record.student_audio = audio_file
+        record.submitted_at = timezone.now()
+        record.daily_checkin = daily_checkin_today
+        record.save()
+        msg = '本周最佳作业已更新！'
+    else:
+        record = PracticeRecord.objects.create(
+            student=user,
+            exercise=exercise,
+            student_audio=audio_file,
+            daily_checkin=daily_checkin_today
+        )
+        msg = '上传成功，设为本周最佳！'
+
+    refresh_daily_stats(user, *stat_dates)
+
+    # 游戏化结算和音频处理交给后台任务，接口立即返回
+    gamification_job = enqueue('apply_gamification', {
+        'user_id': user.id,
+        'date': today.isoformat(),
+        'new_recording': is_new_recording,
+    }, owner=user)
+    enqueue('process_audio', {'record_id': record.id, 'audio_name': record.student_audio.name}, owner=user)
+
+    data = {
+        'status': 'success',
+        'msg': msg,
+        'record_id': record.id,
+        'job_id': gamification_job.id,
+    }
+    # 任务已同步执行完 (JOB_QUEUE_EAGER) 时直接带上经验结果
+    if gamification_job.status == Job.DONE:
+        data.update(gamification_job.result)
+    return data
+
+def save_teacher_comment(record, post, files):
+    """
+    保存老师的单句点评 (文字 / 语音)。只写点评字段：submitted_at 是 auto_now，
+    完整 save() 会把录音的提交时间和练习日期改成今天，与每日汇总对不上。
+    """
+    update_fields = []
+    if post.get('comment_text'):
+        record.teacher_comment_text = post.get('comment_text')
+        update_fields.append('teacher_comment_text')
+    if files.get('audio_data'):
+        record.teacher_comment_audio = files.get('audio_data')
+        update_fields.append('teacher_comment_audio')
+    if update_fields:
+        record.save(update_fields=update_fields)
+
 # ==========================================
 # 第一部分：电脑网页版视图
 # ==========================================
 
-@login_required
-def student_dashboard(request):
-    today = timezone.localdate()
-    start_of_week = get_week_start()
+@cached_context('dashboard')
+def dashboard_user_context(user, today):
+    """首页中学员本人的数据 (按学员缓存，录音 / 打卡 / 成就 / 鼓励消息变化时失效)"""
+    start_of_week = today - datetime.timedelta(days=today.weekday())
 
-    checkin, created = DailyCheckIn.objects.get_or_create(student=request.user, date=today)
-    
-    # 分开查询普通练习和进阶练习
-    normal_exercises = Exercise.objects.filter(is_advanced=False).order_by('order')
-    advanced_exercises = Exercise.objects.filter(is_advanced=True).order_by('order')
-    
-    # 打卡只计算普通练习
-    total_exercises = normal_exercises.count()
+    checkin, created = DailyCheckIn.objects.get_or_create(student=user, date=today)
 
-    daily_records = PracticeRecord.objects.filter(
-        student=request.user,
-        submitted_at__date=today
-    )
-    completed_ids = set(daily_records.values_list('exercise_id', flat=True))
-    
-    # 普通练习完成数
-    normal_completed_count = sum(1 for e in normal_exercises if e.id in completed_ids)
-    # 进阶练习完成数
-    advanced_completed_count = sum(1 for e in advanced_exercises if e.id in completed_ids)
+    completed_ids = set(PracticeRecord.objects.filter(
+        student=user,
+        **submitted_on(today)
+    ).values_list('exercise_id', flat=True))
 
-    all_done = normal_completed_count >= total_exercises and total_exercises > 0
+    # 完成数从每日汇总读取
+    today_stat = DailyPracticeStat.objects.filter(student=user, date=today).first()
 
-    is_submitted_to_teacher = DailyCheckIn.objects.filter(
-        student=request.user,
+    is_submitted_to_teacher = DailyPracticeStat.objects.filter(
+        student=user,
         date__gte=start_of_week,
         is_submitted=True
     ).exists()
 
-    total_today_checkins = PracticeRecord.objects.filter(
-        submitted_at__date=today
-    ).values('student').distinct().count()
-
-    latest_records = PracticeRecord.objects.filter(
-        submitted_at__date=today
-    ).select_related('student', 'exercise').order_by('-submitted_at')[:8]
-
     # 游戏化信息
-    profile = get_or_create_profile(request.user)
-    achievements_count = StudentAchievement.objects.filter(student=request.user).count()
-    
-    # 伙伴信息
-    buddy_info = get_buddy_info(request.user)
+    profile = get_or_create_profile(user)
 
-    context = {
-        'normal_exercises': normal_exercises,
-        'advanced_exercises': advanced_exercises,
+    return {
+        'checkin_id': checkin.id,
         'completed_ids': completed_ids,
-        'completed_count': normal_completed_count,
-        'total_count': total_exercises,
-        'advanced_completed_count': advanced_completed_count,
-        'advanced_total_count': advanced_exercises.count(),
-        'all_done': all_done,
+        # 普通练习完成数
+        'completed_count': today_stat.normal_count if today_stat else 0,
+        # 进阶练习完成数
+        'advanced_completed_count': today_stat.advanced_count if today_stat else 0,
         'is_submitted_to_teacher': is_submitted_to_teacher,
-        'checkin_id': checkin.id,
-        'total_today_checkins': total_today_checkins,
-        'latest_records': latest_records,
-        'latest_announcement': Announcement.objects.first(),
-        # 游戏化数据
         'profile': profile,
-        'achievements_count': achievements_count,
+        'achievements_count': StudentAchievement.objects.filter(student=user).count(),
         'exp_progress': profile.exp_progress(),
         'exp_for_next': profile.exp_for_next_level(),
-        # 伙伴数据
-        'buddy_info': buddy_info,
+        # 伙伴信息
+        'buddy_info': get_buddy_info(user),
     }
+
+@login_required
+def student_dashboard(request):
+    today = timezone.localdate()
+
+    # 普通练习和进阶练习 (来自练习目录，不查库)
+    catalog = get_exercise_catalog()
+
+    # 打卡只计算普通练习
+    total_exercises = catalog.normal_count
+
+    context = {
+        **dashboard_user_context(request.user, today),
+        # 全班今日动态 (所有学员共用一份)
+        **get_class_feed(today),
+        # 未读公告数 (全部公告 ID 和学员已读 ID 都在缓存里)
+        'unread_announcements': unread_announcement_count(request.user),
+        'normal_exercises': catalog.normal,
+        'advanced_exercises': catalog.advanced,
+        'total_count': total_exercises,
+        'advanced_total_count': catalog.advanced_count,
+    }
+    context['all_done'] = context['completed_count'] >= total_exercises and total_exercises > 0
     return render(request, 'training/dashboard.html', context)
 
 @login_required
@@ -231,13 +244,18 @@ def exercise_detail(request, exercise_id):
     exercise = get_object_or_404(Exercise, id=exercise_id)
     start_of_week = get_week_start()
 
-    record = PracticeRecord.objects.filter(
-        student=request.user,
-        exercise=exercise,
-        submitted_at__date__gte=start_of_week
-    ).order_by('-submitted_at').first()
+    record = latest_records(start_of_week, student=request.user, exercise=exercise).first()
 
-    return render(request, 'training/exercise_detail.html', {'exercise': exercise, 'record': record})
+    # 录音脚本在静态文件里，页面参数通过 json_script 传过去
+    page_config = {
+        'exerciseId': exercise.id,
+        'uploadUrl': reverse('api_upload_practice'),
+        'dashboardUrl': reverse('student_dashboard'),
+        'jobStatusUrl': reverse('api_job_status', args=[0]).replace('/0/', '/{id}/'),
+    }
+    return render(request, 'training/exercise_detail.html', {
+        'exercise': exercise, 'record': record, 'page_config': page_config,
+    })
 
 @login_required
 def teacher_dashboard(request):
@@ -248,73 +266,29 @@ def teacher_dashboard(request):
     # 获取所有学员
     all_students = User.objects.filter(is_staff=False).order_by('username')
     
-    # 获取本周已提交的打卡
-    recent_checkins = DailyCheckIn.objects.filter(
-        date__gte=start_of_week,
-        is_submitted=True
-    ).values('student').annotate(latest_date=Max('date'))
-
-    checkins = []
-    for item in recent_checkins:
-        ci = DailyCheckIn.objects.filter(student__id=item['student'], date=item['latest_date']).first()
-        if ci: checkins.append(ci)
-    checkins.sort(key=lambda x: x.date, reverse=True)
+    # 获取本周已提交的打卡 (每位学员最近一次)
+    checkins = list(get_latest_submitted_checkins(start_of_week))
     
-    # 统计每个学员的打卡和作业情况
-    student_stats = []
-    for student in all_students:
-        # 本周打卡次数
-        week_checkins = DailyCheckIn.objects.filter(
-            student=student,
-            date__gte=start_of_week,
-            is_submitted=True
-        ).count()
-        
-        # 本周练习记录数（有录音的）
-        week_records = PracticeRecord.objects.filter(
-            student=student,
-            submitted_at__date__gte=start_of_week,
-            student_audio__isnull=False
-        ).count()
-        
-        # 总历史录音数
-        total_records = PracticeRecord.objects.filter(
-            student=student,
-            student_audio__isnull=False
-        ).count()
-        
-        # 今日是否打卡
-        today_checkin = DailyCheckIn.objects.filter(
-            student=student,
-            date=today,
-            is_submitted=True
-        ).exists()
-        
-        # 今日练习数
-        today_records = PracticeRecord.objects.filter(
-            student=student,
-            submitted_at__date=today,
-            student_audio__isnull=False
-        ).count()
-        
-        student_stats.append({
-            'student': student,
-            'week_checkins': week_checkins,
-            'week_records': week_records,
-            'total_records': total_records,
-            'today_checkin': today_checkin,
-            'today_records': today_records,
-        })
+    # 统计每个学员的打卡和作业情况 (条件聚合，查询次数与学员数无关)
+    student_stats = get_student_stats(all_students, start_of_week, today)
     
     # 按本周打卡次数排序
     student_stats.sort(key=lambda x: (x['week_checkins'], x['week_records']), reverse=True)
     
+    # 最近的公告和各自的已读人数 (计数来自缓存)
+    announcements = list(Announcement.objects.select_related('created_by').order_by('-created_at')[:10])
+    read_counts = get_read_counts([ann.id for ann in announcements])
+    for ann in announcements:
+        ann.read_count = read_counts[ann.id]
+        ann.read_rate = round(ann.read_count * 100 / len(student_stats)) if student_stats else 0
+
     return render(request, 'training/teacher_dashboard.html', {
         'checkins': checkins,
         'student_stats': student_stats,
         'start_of_week': start_of_week,
         'today': today,
-        'announcements': Announcement.objects.all().order_by('-created_at')[:10],
+        'announcements': announcements,
+        'student_count': len(student_stats),
     })
 
 @login_required
@@ -333,9 +307,8 @@ def review_submission(request, record_id):
     if not request.user.is_staff: return redirect('student_dashboard')
     record = get_object_or_404(PracticeRecord, id=record_id)
     if request.method == "POST":
-        if request.POST.get('comment_text'): record.teacher_comment_text = request.POST.get('comment_text')
-        if request.FILES.get('audio_data'): record.teacher_comment_audio = request.FILES.get('audio_data')
-        record.save(); return JsonResponse({'status': 'success'})
+        save_teacher_comment(record, request.POST, request.FILES)
+        return JsonResponse({'status': 'success'})
     return render(request, 'training/review_detail.html', {'record': record})
 
 def register(request):
@@ -370,9 +343,8 @@ def shared_record_detail(request, record_id):
     record = get_object_or_404(PracticeRecord, id=record_id)
     if request.method == "POST":
         if not request.user.is_staff: return JsonResponse({'status': 'error', 'msg': '无权操作'})
-        if request.POST.get('comment_text'): record.teacher_comment_text = request.POST.get('comment_text')
-        if request.FILES.get('audio_data'): record.teacher_comment_audio = request.FILES.get('audio_data')
-        record.save(); return JsonResponse({'status': 'success'})
+        save_teacher_comment(record, request.POST, request.FILES)
+        return JsonResponse({'status': 'success'})
     return render(request, 'training/shared_record.html', {'record': record, 'exercise': record.exercise})
 
 @login_required
@@ -380,47 +352,130 @@ def download_record_audio(request, record_id):
     try: record = PracticeRecord.objects.get(id=record_id)
     except: raise Http404
     if record.student != request.user and not request.user.is_staff: return HttpResponse(status=403)
-    if record.student_audio and os.path.exists(record.student_audio.path):
-        with open(record.student_audio.path, 'rb') as fh:
-            response = HttpResponse(fh.read(), content_type="audio/mpeg")
-            response['Content-Disposition'] = f'attachment; filename="rec_{record.id}.webm"'
-            return response
-    raise Http404
-
-# 🔥🔥🔥 修改后的核心函数：只展示本周每个练习的最新提交 🔥🔥🔥
-def daily_report_view(request, checkin_id):
-    checkin = get_object_or_404(DailyCheckIn, id=checkin_id)
+    audio = record.playback_file
+    ext = os.path.splitext(audio.name)[1] if audio else ''
+    return serve_file(request, audio, download_name=f"rec_{record.id}{ext or '.webm'}")
 
-    # 1. 计算本周起始时间 (基于打卡日期所在的周一)
-    start_of_week = checkin.date - datetime.timedelta(days=checkin.date.weekday())
+# ==========================================
+# 录音打包下载 (ZIP 流式生成)
+# ==========================================
 
-    # 2. 获取本周该学生的所有练习记录（按提交时间正序排列：旧 -> 新）
-    # 使用 select_related 优化查询
-    week_records = PracticeRecord.objects.filter(
-        student=checkin.student,
-        submitted_at__date__gte=start_of_week
-    ).select_related('exercise').order_by('submitted_at')
+def _zip_response(records, filename):
+    response = StreamingHttpResponse(iter_zip(record_entries(records)), content_type='application/zip')
+    response['Content-Disposition'] = content_disposition_header(True, filename)
+    return response
 
-    # 3. 【核心逻辑】使用字典去重，只保留每个练习的最后一条（最新）记录
-    # 原理：字典的 key 是唯一的，后遍历到的记录会覆盖先遍历到的
-    latest_record_map = {}
-    for record in week_records:
-        latest_record_map[record.exercise.id] = record
+def _export_week_start(request):
+    """?week=YYYY-MM-DD 取该日期所在的一周，默认本周"""
+    try:
+        day = datetime.date.fromisoformat(request.GET.get('week', ''))
+    except ValueError:
+        return get_week_start()
+    return day - datetime.timedelta(days=day.weekday())
 
-    # 4. 将去重后的记录转回列表，并按练习的顺序 (exercise.order) 排序用于展示
-    # 注意：这里假设 Exercise 模型有 order 字段
-    records = sorted(latest_record_map.values(), key=lambda r: r.exercise.order)
+@login_required
+def export_checkin_audio(request, checkin_id):
+    """打包下载一次打卡的全部录音"""
+    checkin = get_object_or_404(DailyCheckIn.objects.select_related('student'), id=checkin_id)
+    if checkin.student != request.user and not request.user.is_staff: return HttpResponse(status=403)
+    records = checkin.records.exclude(student_audio='').select_related('student', 'exercise').order_by('submitted_at')
+    return _zip_response(records, f"{safe_name(checkin.student.username)}_{checkin.date}.zip")
 
-    is_liked = request.user.is_authenticated and checkin.likes.filter(id=request.user.id).exists()
+@login_required
+def export_student_week_audio(request, student_id):
+    """打包下载某学员一周的录音"""
+    student = get_object_or_404(User, id=student_id)
+    if student != request.user and not request.user.is_staff: return HttpResponse(status=403)
+    start_of_week = _export_week_start(request)
+    return _zip_response(week_records(start_of_week, student), f"{safe_name(student.username)}_{start_of_week}周.zip")
+
+@login_required
+def export_class_week_audio(request):
+    """打包下载全班一周的录音 (仅老师)"""
+    if not request.user.is_staff: return HttpResponse(status=403)
+    start_of_week = _export_week_start(request)
+    return _zip_response(week_records(start_of_week), f"全班录音_{start_of_week}周.zip")
+
+# 可流式播放的音频来源: kind -> (模型, 文件字段, 是否仅本人和老师可听)
+AUDIO_SOURCES = {
+    'record': (PracticeRecord, 'playback_file', True),
+    'comment': (PracticeRecord, 'teacher_comment_audio', True),
+    'summary': (DailyCheckIn, 'teacher_audio', True),
+    'demo': (Exercise, 'demo_audio', False),
+    'announcement': (Announcement, 'audio_file', False),
+}
+
+def stream_audio(request, kind, obj_id):
+    """
+    流式播放音频 (支持拖动进度条的 Range 请求和浏览器缓存)。
+    页面里的地址带签名 (见 streaming.audio_url)，分享页等未登录也能播放；
+    没有有效签名时要求登录，学员录音只有本人和老师能听。
+    """
+    if kind not in AUDIO_SOURCES: raise Http404
+    model, field_name, owner_only = AUDIO_SOURCES[kind]
+    obj = get_object_or_404(model, id=obj_id)
+    field_file = getattr(obj, field_name)
+    if not valid_audio_signature(request.GET.get('sig'), kind, obj.id, field_file):
+        if not request.user.is_authenticated:
+            return redirect_to_login(request.get_full_path())
+        if owner_only and obj.student != request.user and not request.user.is_staff:
+            return HttpResponse(status=403)
+    return serve_file(request, field_file)
+
+def api_audio_peaks(request, kind, obj_id):
+    """
+    音频波形峰值 (页面先画波形、可跳转，再按需加载音频)；还没生成时排队生成。
+    权限同 stream_audio：页面上的地址带签名 (见 streaming.peaks_url)，没有签名时按登录用户检查。
+    """
+    if kind not in PEAK_SOURCES: raise Http404
+    obj = get_object_or_404(PEAK_SOURCES[kind][0], id=obj_id)
+    field_file = getattr(obj, PEAK_SOURCES[kind][1])
+    if not valid_audio_signature(request.GET.get('sig'), kind, obj.id, field_file):
+        if not request.user.is_authenticated:
+            return redirect_to_login(request.get_full_path())
+        if AUDIO_SOURCES[kind][2] and obj.student != request.user and not request.user.is_staff:
+            return HttpResponse(status=403)
+    if not field_file: raise Http404
+
+    name = peaks_sidecar_name(field_file)
+    data = load_peaks(field_file)
+    if data is None:
+        # 同一个文件只排队一次
+        if cache.add(f'peaks:pending:{name}', True, 300):
+            owner = request.user if request.user.is_authenticated else None
+            enqueue('compute_peaks', {'kind': kind, 'obj_id': obj.id}, owner=owner)
+        return JsonResponse({'status': 'pending'}, status=202)
+
+    # 峰值文件名随音频文件变化，内容不变，用文件名做 ETag
+    etag = quote_etag(hashlib.md5(name.encode()).hexdigest())
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = JsonResponse({'status': 'success', **data})
+    response['ETag'] = etag
+    patch_cache_control(response, private=True, max_age=300)
+    return response
+
+# 🔥🔥🔥 核心函数：只展示本周每个练习的最新提交 🔥🔥🔥
+def daily_report_view(request, checkin_id):
+    # 1. 打卡单连同学员、当前用户是否点过赞一条查询取回 (点赞数是打卡上的冗余字段)
+    checkin = get_object_or_404(
+        with_liked(DailyCheckIn.objects.select_related('student'), request.user), id=checkin_id
+    )
+
+    # 2. 打卡日期所在这一周 (周一起 7 天) 每个练习的最新一条录音，按练习顺序展示
+    start_of_week = checkin.date - datetime.timedelta(days=checkin.date.weekday())
+    records = latest_records(
+        start_of_week, start_of_week + datetime.timedelta(days=7), student=checkin.student_id
+    ).select_related('exercise').order_by('exercise__order', 'exercise_id')
 
     context = {
         'checkin': checkin,
         'records': records,
-        'is_liked': is_liked,
-        'total_likes': checkin.total_likes(),
+        'is_liked': checkin.is_liked,
+        'total_likes': checkin.like_count,
         'is_teacher': request.user.is_staff if request.user.is_authenticated else False,
         'is_me': request.user == checkin.student,
-        'total_today_checkins': DailyCheckIn.objects.filter(date=checkin.date).count(),
+        'total_today_checkins': get_class_feed(checkin.date)['total_today_checkins'],
     }
     return render(request, 'training/daily_report.html', context)
 
@@ -438,79 +493,52 @@ def submit_teacher_summary(request, checkin_id):
 @csrf_exempt
 @login_required
 def toggle_like(request, checkin_id):
-    checkin = get_object_or_404(DailyCheckIn, id=checkin_id)
-    if checkin.likes.filter(id=request.user.id).exists(): checkin.likes.remove(request.user); liked=False
-    else: checkin.likes.add(request.user); liked=True
-    return JsonResponse({"status": "success", "liked": liked, "count": checkin.total_likes()})
+    if not DailyCheckIn.objects.filter(id=checkin_id).exists(): raise Http404
+    liked, count = toggle_checkin_like(checkin_id, request.user)
+    return JsonResponse({"status": "success", "liked": liked, "count": count})
 
 @login_required
 def daily_share_poster(request):
     today = timezone.localdate()
-    records = PracticeRecord.objects.filter(student=request.user, submitted_at__date=today)
+    records = PracticeRecord.objects.filter(student=request.user, **submitted_on(today))
     return render(request, 'training/daily_share.html', {'today_count': records.count(), 'username': request.user.username, 'date': today})
 
+def _render_history(request, student, template, **extra):
+    """学员 / 老师的历史录音页共用：首屏只渲染第一页，后面的由页面滚动到底时从接口加载"""
+    page = history_page(student)
+    api_url = reverse('api_v1_history') if student == request.user else reverse('api_v1_student_history', args=[student.id])
+    return render(request, template, {
+        'student': student,
+        'history_days': page['days'],
+        'total_records': page['total'],
+        'history_config': {
+            'apiUrl': api_url,
+            'nextCursor': page['next_cursor'],
+            'canDelete': student == request.user,
+            'weekExportUrl': reverse('export_student_week_audio', args=[student.id]) if request.user.is_staff else '',
+        },
+        **extra,
+    })
+
+
 @login_required
 def student_history(request):
     """学员查看历史录音"""
-    # 获取所有有录音的练习记录，按时间倒序
-    records = PracticeRecord.objects.filter(
-        student=request.user,
-        student_audio__isnull=False
-    ).select_related('exercise').order_by('-submitted_at')
-    
-    # 按日期分组
-    records_by_date = {}
-    for record in records:
-        date_key = record.submitted_at.date()
-        if date_key not in records_by_date:
-            records_by_date[date_key] = []
-        records_by_date[date_key].append(record)
-    
-    # 转换为列表并按日期倒序
-    history_list = sorted(records_by_date.items(), key=lambda x: x[0], reverse=True)
-    
-    return render(request, 'training/student_history.html', {
-        'history_list': history_list,
-        'total_records': records.count()
-    })
+    return _render_history(request, request.user, 'training/student_history.html')
+
 
 @login_required
 def teacher_student_history(request, student_id):
     """老师查看指定学员的历史录音"""
     if not request.user.is_staff: return redirect('student_dashboard')
-    
     student = get_object_or_404(User, id=student_id, is_staff=False)
-    
-    # 获取所有有录音的练习记录，按时间倒序
-    records = PracticeRecord.objects.filter(
-        student=student,
-        student_audio__isnull=False
-    ).select_related('exercise').order_by('-submitted_at')
-    
-    # 按日期分组
-    records_by_date = {}
-    for record in records:
-        date_key = record.submitted_at.date()
-        if date_key not in records_by_date:
-            records_by_date[date_key] = []
-        records_by_date[date_key].append(record)
-    
-    # 转换为列表并按日期倒序
-    history_list = sorted(records_by_date.items(), key=lambda x: x[0], reverse=True)
-    
-    return render(request, 'training/teacher_student_history.html', {
-        'student': student,
-        'history_list': history_list,
-        'total_records': records.count()
-    })
+    return _render_history(request, student, 'training/teacher_student_history.html')
 
 
 # ==========================================
 # API 接口 (Core API)
 # ==========================================
 
-def api_test(request): return JsonResponse({'status': 'success'})
-
 # 删除历史录音记录
 @csrf_exempt
 @login_required
@@ -519,10 +547,14 @@ def api_delete_practice_record(request, record_id):
     if request.method == 'POST':
         try:
             record = PracticeRecord.objects.get(id=record_id, student=request.user)
+            record_date = record.practice_date
             # 删除关联的音频文件
             if record.student_audio:
                 record.student_audio.delete(save=False)
+            if record.playback_audio:
+                record.playback_audio.delete(save=False)
             record.delete()
+            refresh_daily_stats(request.user, record_date)
             return JsonResponse({'status': 'success', 'msg': '录音已删除'})
         except PracticeRecord.DoesNotExist:
             return JsonResponse({'status': 'error', 'msg': '记录不存在'})
@@ -530,137 +562,110 @@ def api_delete_practice_record(request, record_id):
             return JsonResponse({'status': 'error', 'msg': str(e)})
     return JsonResponse({'status': 'error', 'msg': 'POST only'})
 
-@csrf_exempt
-def api_upload_practice(request):
-    if request.method == 'POST':
-        try:
-            audio_file = request.FILES.get('audio_file')
-            exercise_id = request.POST.get('exercise_id')
-            user = request.user if request.user.is_authenticated else None
-
-            if not user and request.POST.get('user_id'):
-                 try: user = User.objects.get(id=request.POST.get('user_id'))
-                 except: return JsonResponse({'status': 'error', 'msg': '用户不存在'})
-            if not user: return JsonResponse({'status': 'error', 'msg': '未登录'})
-            if not audio_file or not exercise_id: return JsonResponse({'status': 'error', 'msg': '参数缺失'})
-
-            exercise = Exercise.objects.get(id=exercise_id)
-            today = timezone.localdate()
-            start_of_week = get_week_start()
-
-            daily_checkin_today, _ = DailyCheckIn.objects.get_or_create(
-                student=user, date=today, defaults={'is_submitted': False}
-            )
+# ==========================================
+# 分片上传 API (断点续传)
+# 流程: init -> 按偏移量上传分片 (可乱序/重复) -> 查询缺失区间续传 -> finalize
+# ==========================================
 
-            existing_record = PracticeRecord.objects.filter(
-                student=user,
-                exercise=exercise,
-                submitted_at__date__gte=start_of_week
-            ).first()
+def _get_upload_session(request, upload_id, lock=False):
+    sessions = UploadSession.objects.filter(student=request.user, is_finished=False)
+    if lock: sessions = sessions.select_for_update()
+    return sessions.select_related('exercise').filter(id=upload_id).first()
 
-            is_new_recording = existing_record is None
-
-            if existing_record:
-                existing_record.student_audio = audio_file
-                existing_record.submitted_at = timezone.now()
-                existing_record.daily_checkin = daily_checkin_today
-                existing_record.save()
-                msg = '本周最佳作业已更新！'
-            else:
-                PracticeRecord.objects.create(
-                    student=user,
-                    exercise=exercise,
-                    student_audio=audio_file,
-                    daily_checkin=daily_checkin_today
-                )
-                msg = '上传成功，设为本周最佳！'
-
-            # ==========================================
-            # 游戏化逻辑
-            # ==========================================
-            profile = get_or_create_profile(user)
-            exp_earned = 0
-            
-            # 1. 基础经验：每次录音 +10 XP
-            exp_earned += 10
-            
-            # 2. 更新连续练习天数并获取奖励
-            profile, streak_bonus = update_practice_streak(user)
-            exp_earned += streak_bonus
-            
-            # 3. 新录音增加录音计数
-            if is_new_recording:
-                profile.total_recordings += 1
-                profile.save()
-            
-            # 4. 检查是否完成今日所有练习（额外奖励）
-            total_exercises = Exercise.objects.count()
-            today_records = PracticeRecord.objects.filter(
-                student=user,
-                submitted_at__date=today
-            ).values('exercise_id').distinct().count()
-            
-            if today_records >= total_exercises:
-                exp_earned += 30  # 完成所有练习额外奖励
-            
-            # 5. 添加经验值
-            add_experience(user, exp_earned)
-            
-            # 返回带经验值信息的响应
-            return JsonResponse({
-                'status': 'success', 
-                'msg': msg,
-                'exp_earned': exp_earned,
-                'streak_days': profile.streak_days
-            })
-        except Exception as e: return JsonResponse({'status': 'error', 'msg': str(e)})
-    return JsonResponse({'status': 'error'})
+def _upload_progress(session):
+    return {
+        'upload_id': str(session.id),
+        'total_size': session.total_size,
+        'received': session.received_bytes(),
+        'missing': missing_ranges(session.received_ranges, session.total_size),
+    }
 
 @csrf_exempt
 @login_required
-def submit_daily_checkin(request):
-    if request.method == 'POST':
-        try:
-            today = timezone.localdate()
-            start_of_week = get_week_start()
-            daily_checkin, _ = DailyCheckIn.objects.get_or_create(student=request.user, date=today)
-
-            count = PracticeRecord.objects.filter(student=request.user, submitted_at__date__gte=start_of_week).count()
-            if count == 0:
-                return JsonResponse({"status": "error", "msg": "本周还没有上传任何练习哦"})
-
-            daily_checkin.is_submitted = True
-            daily_checkin.save()
-            return JsonResponse({"status": "success", "msg": "本周作业已同步给老师！"})
-        except Exception as e: return JsonResponse({"status": "error", "msg": str(e)})
-    return JsonResponse({"status": "error"})
+def api_upload_init(request):
+    """创建分片上传会话"""
+    if request.method != 'POST': return JsonResponse({'status': 'error', 'msg': 'POST only'})
+    exercise = get_exercise_catalog().get(request.POST.get('exercise_id'))
+    try:
+        total_size = int(request.POST.get('total_size', 0))
+    except (ValueError, TypeError):
+        total_size = 0
+    if exercise is None or not total_size:
+        return JsonResponse({'status': 'error', 'msg': '参数缺失'})
+    if total_size <= 0 or total_size > MAX_UPLOAD_SIZE:
+        return JsonResponse({'status': 'error', 'msg': '文件大小不合法'})
+
+    filename = os.path.basename(request.POST.get('filename') or '')[:100] or 'recording.webm'
+    session = UploadSession.objects.create(
+        student=request.user, exercise=exercise, filename=filename, total_size=total_size
+    )
+    create_temp_file(session)
+    return JsonResponse({'status': 'success', 'chunk_size': MAX_CHUNK_SIZE, **_upload_progress(session)})
 
-def api_exercise_list(request):
-    exercises = Exercise.objects.all().order_by('order')
-    data = [{'id': ex.id, 'title': ex.title, 'demo_audio': request.build_absolute_uri(ex.demo_audio.url) if ex.demo_audio else ''} for ex in exercises]
-    return JsonResponse({'status': 'success', 'data': data})
+@csrf_exempt
+@login_required
+def api_upload_chunk(request, upload_id):
+    """上传一个分片：请求体为原始字节，?offset= 指定写入位置"""
+    if request.method != 'POST': return JsonResponse({'status': 'error', 'msg': 'POST only'})
+    try: offset = int(request.GET.get('offset', ''))
+    except ValueError: return JsonResponse({'status': 'error', 'msg': '缺少 offset'})
+    data = request.body
+    if not data or len(data) > MAX_CHUNK_SIZE:
+        return JsonResponse({'status': 'error', 'msg': '分片大小不合法'})
+
+    with transaction.atomic():
+        session = _get_upload_session(request, upload_id, lock=True)
+        if not session: return JsonResponse({'status': 'error', 'msg': '上传会话不存在'})
+        if offset < 0 or offset + len(data) > session.total_size:
+            return JsonResponse({'status': 'error', 'msg': '分片超出文件范围'})
+        write_chunk(session, offset, data)
+        session.received_ranges = merge_range(session.received_ranges, offset, offset + len(data))
+        session.save(update_fields=['received_ranges', 'updated_at'])
+    return JsonResponse({'status': 'success', **_upload_progress(session)})
 
-def api_exercise_detail(request, exercise_id):
-    exercise = get_object_or_404(Exercise, id=exercise_id)
-    return JsonResponse({'status': 'success', 'data': {'id': exercise.id, 'title': exercise.title, 'content': exercise.content, 'demo_audio': request.build_absolute_uri(exercise.demo_audio.url) if exercise.demo_audio else ''}})
+@login_required
+def api_upload_status(request, upload_id):
+    """查询已接收区间，网络中断后据此续传"""
+    session = _get_upload_session(request, upload_id)
+    if not session: return JsonResponse({'status': 'error', 'msg': '上传会话不存在'})
+    return JsonResponse({'status': 'success', **_upload_progress(session)})
 
 @csrf_exempt
-def api_login(request):
-    if request.method != 'POST': return JsonResponse({'status': 'error'})
-    try: data = json.loads(request.body)
-    except: return JsonResponse({'status': 'error'})
-    if 'username' in data:
-        user = authenticate(username=data['username'], password=data['password'])
-        if user: login(request, user); return JsonResponse({'status': 'success', 'msg': 'OK', 'is_staff': user.is_staff})
-        return JsonResponse({'status': 'error', 'msg': 'Fail'})
-    return JsonResponse({'status': 'error'})
-
-def api_my_practice_list(request):
-    user = request.user if request.user.is_authenticated else None
-    if not user: return JsonResponse({'status': 'error'})
-    checkins = DailyCheckIn.objects.filter(student=user).order_by('-date')
-    data = [{'date': ci.date, 'is_submitted': ci.is_submitted} for ci in checkins]
-    return JsonResponse({'status': 'success', 'data': data})
+@login_required
+def api_upload_finalize(request, upload_id):
+    """所有分片到齐后合成录音，走与普通上传相同的保存和经验逻辑"""
+    if request.method != 'POST': return JsonResponse({'status': 'error', 'msg': 'POST only'})
+    try:
+        with transaction.atomic():
+            session = _get_upload_session(request, upload_id, lock=True)
+            if not session: return JsonResponse({'status': 'error', 'msg': '上传会话不存在'})
+            if not session.is_complete():
+                return JsonResponse({'status': 'error', 'msg': '分片未传完', **_upload_progress(session)})
+
+            with open(upload_temp_path(session), 'rb') as fh:
+                result = save_practice_upload(request.user, session.exercise, File(fh, name=session.filename))
+            session.is_finished = True
+            session.save(update_fields=['is_finished', 'updated_at'])
+        discard_temp_file(session)
+        return JsonResponse(result)
+    except Exception as e: return JsonResponse({'status': 'error', 'msg': str(e)})
+
+@login_required
+def api_job_status(request, job_id):
+    """查询后台任务状态 (上传后轮询经验结算结果)"""
+    job = Job.objects.filter(id=job_id).first()
+    if not job or (job.owner_id != request.user.id and not request.user.is_staff):
+        return JsonResponse({'status': 'error', 'msg': '任务不存在'})
+    return JsonResponse({
+        'status': 'success',
+        'job': {
+            'id': job.id,
+            'kind': job.kind,
+            'state': job.status,
+            'attempts': job.attempts,
+            'result': job.result,
+        }
+    })
 
 @login_required
 def api_teacher_checkins(request):
@@ -676,7 +681,7 @@ def get_report_audio_urls(request, report_id):
         checkin = DailyCheckIn.objects.get(id=report_id)
         records = checkin.records.all()
         # 🔥 修改：增加判断，防止空音频报错
-        audio_list = [{'url': r.student_audio.url, 'name': r.student_audio.name} for r in records if r.student_audio]
+        audio_list = [{'url': r.playback_url, 'name': r.playback_file.name} for r in records if r.student_audio]
         return JsonResponse({'status': 'success', 'files': audio_list})
     except Exception as e: return JsonResponse({'status': 'error', 'message': str(e)})
 
@@ -720,27 +725,47 @@ def delete_announcement(request, announcement_id):
         return redirect('teacher_dashboard')
     return redirect('teacher_dashboard')
 
+@cached_context('announcement', scope=CLASS)
+def announcement_context(announcement_id):
+    """公告 (连同发布人) 按全班缓存，公告新增 / 修改 / 删除时失效"""
+    announcement = Announcement.objects.select_related('created_by').filter(id=announcement_id).first()
+    return {'announcement': announcement}
+
 @login_required
 def announcement_detail(request, announcement_id):
-    announcement = get_object_or_404(Announcement, id=announcement_id)
+    # 每次打开都要记阅读、页面按老师 / 学员不同，不走 ContentCacheMiddleware (它命中时不执行视图)；
+    # 公告本身从缓存取，重复打开不查公告表，ETag 未变化时直接 304
+    announcement = announcement_context(announcement_id)['announcement']
+    if announcement is None:
+        raise Http404("公告不存在")
     if not request.user.is_staff:
-        ReadRecord.objects.get_or_create(announcement=announcement, student=request.user)
-    return render(request, 'training/announcement_detail.html', {'announcement': announcement})
+        record_read(announcement_id, request.user)
+
+    # 页面按老师 / 学员显示不同按钮，ETag 带上当前用户
+    updated_at = announcement.updated_at
+    etag = quote_etag(hashlib.md5(
+        f'{announcement_id}:{updated_at.isoformat()}:{request.user.pk}:{request.user.is_staff}'.encode()
+    ).hexdigest())
+    last_modified = updated_at.timestamp()
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        response = render(request, 'training/announcement_detail.html', {'announcement': announcement})
+        response['Last-Modified'] = http_date(last_modified)
+    response['ETag'] = etag
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
 
 @login_required
 def announcement_stats(request, announcement_id):
     if not request.user.is_staff: return redirect('student_dashboard')
     announcement = get_object_or_404(Announcement, id=announcement_id)
-    all_students = User.objects.filter(is_staff=False)
-    read_records = ReadRecord.objects.filter(announcement=announcement).values_list('student_id', flat=True)
-    read_list = [s for s in all_students if s.id in read_records]
-    unread_list = [s for s in all_students if s.id not in read_records]
+    read_list, unread_list = read_status(announcement)
     return render(request, 'training/announcement_stats.html', {
         'announcement': announcement,
         'read_list': read_list,
         'unread_list': unread_list,
         'read_count': len(read_list),
-        'total_count': all_students.count()
+        'total_count': len(read_list) + len(unread_list)
     })
 
 